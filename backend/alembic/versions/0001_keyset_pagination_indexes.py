@@ -0,0 +1,39 @@
+"""Составные индексы (сортировка, id) для keyset-пагинации (app.core.pagination)
+
+ix_audit_logs_created_at заменяется на ix_audit_logs_created_at_id: его префикс (created_at)
+обслуживает те же запросы.
+
+Индексы строятся CONCURRENTLY — без блокировки записи в растущие таблицы, поэтому вне
+транзакции миграции. IF [NOT] EXISTS — базы, созданные create_all, уже могут их содержать.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    ("ix_articles_created_at_id", "articles", "created_at, id"),
+    ("ix_articles_views_count_id", "articles", "views_count, id"),
+    ("ix_case_studies_created_at_id", "case_studies", "created_at, id"),
+    ("ix_audit_logs_created_at_id", "audit_logs", "created_at, id"),
+)
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns})")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_audit_logs_created_at")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_audit_logs_created_at ON audit_logs (created_at)")
+        for name, _, _ in INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
@@ -0,0 +1,33 @@
+"""Полнотекстовый поиск статей: генерируемая колонка articles.search_vector и GIN-индекс
+
+Выражение колонки — то же, что в Article.search_vector. ADD COLUMN ... STORED переписывает
+таблицу articles под эксклюзивной блокировкой (значения вычисляются для всех строк сразу);
+индекс затем строится CONCURRENTLY, вне транзакции миграции.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('russian'::regconfig, coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('russian'::regconfig, coalesce(content, '')), 'B')"
+)
+
+
+def upgrade() -> None:
+    op.execute(f"ALTER TABLE articles ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ({SEARCH_VECTOR}) STORED")
+    with op.get_context().autocommit_block():
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_articles_search_vector ON articles USING gin (search_vector)")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_articles_search_vector")
+    op.execute("ALTER TABLE articles DROP COLUMN IF EXISTS search_vector")
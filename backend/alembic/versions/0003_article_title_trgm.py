@@ -0,0 +1,27 @@
+"""Триграммный индекс заголовков статей для подсказок (/search/suggest)
+
+gin_trgm_ops из расширения pg_trgm: оно создаётся до индекса. CREATE EXTENSION требует прав
+владельца базы (или суперпользователя, если pg_trgm не помечено trusted); расширение при
+откате не удаляется — им могут пользоваться и другие объекты.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    with op.get_context().autocommit_block():
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_articles_title_trgm ON articles USING gin (title gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_articles_title_trgm")
@@ -10,29 +10,29 @@
 """
 from fastapi import APIRouter
 from app.admin.adminjs_bridge import AdminJS, Resource, AdminJSFastAPI
-from app.core.database import get_db
+from app.core.database import get_admin_db
 from app.models import Article, Country, Service, Lead, UserConsent, AuditLog, CaseStudy
 
 # Определяем ресурсы и свойства (метаданные используются на фронте AdminJS)
 resources = [
-    Resource(Article, get_db, properties={
+    Resource(Article, get_admin_db, properties={
         'content': {'type': 'richtext'},
     }, actions={'edit': {'before': 'audit_action'}}),
-    Resource(Country, get_db),
-    Resource(Service, get_db),
-    Resource(CaseStudy, get_db, properties={
+    Resource(Country, get_admin_db),
+    Resource(Service, get_admin_db),
+    Resource(CaseStudy, get_admin_db, properties={
         'content': {'type': 'richtext'},
         'images': {'type': 'array'},
     }),
-    Resource(Lead, get_db, properties={
+    Resource(Lead, get_admin_db, properties={
         'encrypted_data': {
             'components': {
                 'show': 'DecryptedDataComponent',
             }
         }
     }, actions={'show': {'before': 'audit_view_lead'}}),
-    Resource(UserConsent, get_db),
-    Resource(AuditLog, get_db, actions={
+    Resource(UserConsent, get_admin_db),
+    Resource(AuditLog, get_admin_db, actions={
         'delete': {'isAccessible': False},
         'edit': {'isAccessible': False},
     }),
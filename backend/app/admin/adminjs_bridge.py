@@ -16,22 +16,26 @@ from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, Request, status
 from pydantic import BaseModel
-from sqlalchemy import select, update, delete, and_, desc
+from sqlalchemy import select, update, delete, and_
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
-from app.core.database import get_db
+from app.core.database import AUDIT, get_admin_db, get_read_db, read_router, session_for
+from app.core.pagination import datetime_keyset, page_of, paginate
 from app.models import Article, Country, Service, Lead, UserConsent, AuditLog, SEOMetadata
 from app.models.article import ArticleStatus
-from app.tasks.article_generator import generate_article_task
-from app.core.cache import cache_get, cache_set
+from app.tasks.dispatch import GENERATE_ARTICLE, send_task
+from app.core.cache import cache_get, cache_set, cache_stats
+from app.core.cache_bus import invalidation_listener
+from app.core.response_cache import compression_stats, conditional_stats
+from app.services import cache_warmer, suggest
+from app.services.cache_invalidation import invalidate_article
 from app.services.encryption_service import decrypt_personal_data
 from app.services.gdpr_service import export_user_data, delete_user_data
 
-try:
-    import pyotp
-except Exception:
-    pyotp = None
+
+# Порядок журнала аудита для курсоров (индекс ix_audit_logs_created_at_id)
+AUDIT_LOG_ORDER = datetime_keyset("created_at", AuditLog.created_at, AuditLog.id)
 
 
 # ------------------------- Конфигурация/Admin -------------------------
@@ -64,16 +68,22 @@ class CurrentAdmin(BaseModel):
 
 
 # ------------------------- RBAC и аутентификация -------------------------
+def _totp() -> Any:
+    # pyotp нужен только при включённой 2FA: импорт при первой проверке кода, а не при старте воркера
+    try:
+        import pyotp
+    except Exception:
+        raise HTTPException(status_code=500, detail="2FA is enabled but pyotp not installed")
+    return pyotp.TOTP(settings.ADMIN_TOTP_SECRET)
+
+
 async def authenticate_admin(email: str, password: str, otp: Optional[str]) -> CurrentAdmin:
     # Базовая проверка по конфигу
     # Admin
     if email == settings.ADMIN_USERNAME and password == settings.ADMIN_PASSWORD:
         # 2FA, если включено
         if settings.ADMIN_TOTP_SECRET:
-            if pyotp is None:
-                raise HTTPException(status_code=500, detail="2FA is enabled but pyotp not installed")
-            totp = pyotp.TOTP(settings.ADMIN_TOTP_SECRET)
-            if not otp or not totp.verify(otp, valid_window=1):
+            if not otp or not _totp().verify(otp, valid_window=1):
                 raise HTTPException(status_code=401, detail="Invalid 2FA code")
         return CurrentAdmin(email=email, role="admin")
     # Manager
@@ -134,6 +144,16 @@ async def _audit(db: AsyncSession, user: CurrentAdmin, action: str, entity_type:
         pass
 
 
+async def _audit_separately(user: CurrentAdmin, action: str, entity_type: str, entity_id: Optional[str], details: Dict[str, Any], request: Request) -> None:
+    """Аудит для обработчиков, которые только читают (get_read_db): короткая сессия из пула audit.
+
+    Без реплик get_read_db берёт соединение из пула admin; вторая сессия admin на тот же запрос
+    удваивала бы его расход, и несколько одновременных просмотров исчерпали бы пул.
+    """
+    async with session_for(AUDIT) as session:
+        await _audit(session, user, action=action, entity_type=entity_type, entity_id=entity_id, details=details, request=request)
+
+
 # ------------------------- Генерация роутера -------------------------
 def AdminJSFastAPI(admin: AdminJS) -> APIRouter:
     router = APIRouter()
@@ -145,7 +165,7 @@ def AdminJSFastAPI(admin: AdminJS) -> APIRouter:
 
     # ---- auth ----
     @router.post(f"{admin.root_path}/auth/login")
-    async def login(payload: AdminLoginPayload, request: Request, db: AsyncSession = Depends(get_db)) -> Dict[str, Any]:
+    async def login(payload: AdminLoginPayload, request: Request, db: AsyncSession = Depends(get_admin_db)) -> Dict[str, Any]:
         admin_user = await authenticate_admin(payload.email, payload.password, payload.otp)
         request.session.update({
             "email": admin_user.email,
@@ -156,7 +176,7 @@ def AdminJSFastAPI(admin: AdminJS) -> APIRouter:
         return {"email": admin_user.email, "role": admin_user.role}
 
     @router.post(f"{admin.root_path}/auth/logout")
-    async def logout(request: Request, db: AsyncSession = Depends(get_db), admin_user: CurrentAdmin = Depends(require_admin("viewer"))) -> Dict[str, Any]:
+    async def logout(request: Request, db: AsyncSession = Depends(get_admin_db), admin_user: CurrentAdmin = Depends(require_admin("viewer"))) -> Dict[str, Any]:
         await _audit(db, admin_user, action="admin_logout", entity_type="auth", entity_id=None, details={}, request=request)
         request.session.clear()
         return {"ok": True}
@@ -173,33 +193,34 @@ def AdminJSFastAPI(admin: AdminJS) -> APIRouter:
 
         # list
         @router.get(f"{admin.root_path}/resources/{name}", name=f"list_{name}")
-        async def list_items(request: Request, user: CurrentAdmin = Depends(require_admin("viewer")), db: AsyncSession = Depends(get_db)):
+        async def list_items(request: Request, user: CurrentAdmin = Depends(require_admin("viewer")), read_db: AsyncSession = Depends(get_read_db)):
+            # Чтение — с реплики (если настроена), запись аудита — через пул audit
             model = res.model
             stmt = select(model).order_by(getattr(model, "created_at")) if hasattr(model, "created_at") else select(model)
-            rows = (await db.execute(stmt)).scalars().all()
+            rows = (await read_db.execute(stmt)).scalars().all()
             data = [getattr(r, "to_dict", lambda: r.__dict__)() for r in rows]
-            await _audit(db, user, action=f"admin_list_{name}", entity_type=name, entity_id=None, details={"count": len(data)}, request=request)
+            await _audit_separately(user, action=f"admin_list_{name}", entity_type=name, entity_id=None, details={"count": len(data)}, request=request)
             return {"items": data}
 
         # detail
         @router.get(f"{admin.root_path}/resources/{name}/{{item_id}}", name=f"detail_{name}")
-        async def get_item(item_id: str, request: Request, user: CurrentAdmin = Depends(require_admin("viewer")), db: AsyncSession = Depends(get_db)):
+        async def get_item(item_id: str, request: Request, user: CurrentAdmin = Depends(require_admin("viewer")), read_db: AsyncSession = Depends(get_read_db)):
             model = res.model
             try:
                 stmt = select(model).where(getattr(model, "id") == UUID(item_id))
             except Exception:
                 raise HTTPException(status_code=400, detail="Invalid id")
-            row = (await db.execute(stmt)).scalars().first()
+            row = (await read_db.execute(stmt)).scalars().first()
             if not row:
                 raise HTTPException(status_code=404, detail="Not found")
             data = getattr(row, "to_dict", lambda: row.__dict__)()
-            await _audit(db, user, action=f"admin_view_{name}", entity_type=name, entity_id=item_id, details={}, request=request)
+            await _audit_separately(user, action=f"admin_view_{name}", entity_type=name, entity_id=item_id, details={}, request=request)
             return data
 
         # limited update (Article only as example)
         if res.model is Article:
             @router.put(f"{admin.root_path}/resources/{name}/{{item_id}}", name=f"update_{name}")
-            async def update_article(item_id: str, payload: Dict[str, Any], request: Request, user: CurrentAdmin = Depends(require_admin("manager")), db: AsyncSession = Depends(get_db)):
+            async def update_article(item_id: str, payload: Dict[str, Any], request: Request, user: CurrentAdmin = Depends(require_admin("manager")), db: AsyncSession = Depends(get_admin_db)):
                 # разрешаем обновлять title/content/seo_* статус
                 allowed = {"title", "content", "seo_title", "seo_description", "seo_keywords", "status"}
                 updates = {k: v for k, v in payload.items() if k in allowed}
@@ -211,20 +232,19 @@ def AdminJSFastAPI(admin: AdminJS) -> APIRouter:
                     raise HTTPException(status_code=400, detail="Invalid id")
                 await db.execute(stmt)
                 await db.commit()
+                country_id = (await db.execute(select(Article.country_id).where(Article.id == UUID(item_id)))).scalar()
+                await invalidate_article(item_id, country_id)
                 await _audit(db, user, action="admin_update_article", entity_type="article", entity_id=item_id, details={"updates": list(updates.keys())}, request=request)
                 return {"id": item_id, "updated": list(updates.keys())}
 
     # ---- custom components ----
     # 1) DecryptedDataComponent: безопасный просмотр ПД лида
     @router.post(f"{admin.root_path}/leads/{{lead_id}}/decrypt")
-    async def decrypt_lead(lead_id: str, request: Request, user: CurrentAdmin = Depends(require_admin("manager")), db: AsyncSession = Depends(get_db)) -> Dict[str, Any]:
+    async def decrypt_lead(lead_id: str, request: Request, user: CurrentAdmin = Depends(require_admin("manager")), db: AsyncSession = Depends(get_admin_db)) -> Dict[str, Any]:
         # Доп. 2FA при доступе к ПД (если включено), код передаётся в заголовке X-OTP
         if settings.ADMIN_TOTP_SECRET:
-            if pyotp is None:
-                raise HTTPException(status_code=500, detail="2FA is enabled but pyotp not installed")
             otp = request.headers.get("x-otp")
-            totp = pyotp.TOTP(settings.ADMIN_TOTP_SECRET)
-            if not otp or not totp.verify(otp, valid_window=1):
+            if not otp or not _totp().verify(otp, valid_window=1):
                 raise HTTPException(status_code=401, detail="Invalid 2FA code")
         # Найти лид и расшифровать
         row = (await db.execute(select(Lead).where(Lead.id == UUID(lead_id)))).scalars().first()
@@ -250,28 +270,41 @@ def AdminJSFastAPI(admin: AdminJS) -> APIRouter:
             await cache_set("auto_publish:settings", settings_cache, ttl_seconds=24 * 3600)
         # Celery задача
         try:
-            generate_article_task.delay(payload.country_code, payload.article_type)
+            send_task(GENERATE_ARTICLE, args=[payload.country_code, payload.article_type])
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Task dispatch failed: {e}")
         return {"queued": True}
 
     # 3) SEODashboardComponent: метрики SEO
     @router.get(f"{admin.root_path}/seo/metrics")
-    async def seo_metrics(request: Request, user: CurrentAdmin = Depends(require_admin("viewer")), db: AsyncSession = Depends(get_db)) -> Dict[str, Any]:
+    async def seo_metrics(request: Request, user: CurrentAdmin = Depends(require_admin("viewer")), read_db: AsyncSession = Depends(get_read_db)) -> Dict[str, Any]:
         # Кол-во опубликованных
-        published_articles = (await db.execute(select(Article).where(Article.status == ArticleStatus.published))).scalars().all()
+        published_articles = (await read_db.execute(select(Article).where(Article.status == ArticleStatus.published))).scalars().all()
         # Топ по просмотрам
-        top_articles = (await db.execute(select(Article).order_by(Article.views_count.desc()).limit(10))).scalars().all()
+        top_articles = (await read_db.execute(select(Article).order_by(Article.views_count.desc()).limit(10))).scalars().all()
         top = [{"id": str(a.id), "slug": a.slug, "title": a.title, "views": a.views_count} for a in top_articles]
         # Очередь автогенерации
         queue: List[Dict[str, Any]] = await cache_get("auto_publish:queue") or []
-        await _audit(db, user, action="admin_view_seo_metrics", entity_type="seo", entity_id=None, details={"top_count": len(top), "queue_len": len(queue)}, request=request)
+        await _audit_separately(user, action="admin_view_seo_metrics", entity_type="seo", entity_id=None, details={"top_count": len(top), "queue_len": len(queue)}, request=request)
         return {
             "published_articles": len(published_articles),
             "top_by_views": top,
             "auto_publish_queue": queue,
         }
 
+    # 4) Метрики кэша воркера: попадания по префиксам, задержки Redis, размеры записей, сжатие
+    @router.get(f"{admin.root_path}/cache/stats")
+    async def cache_stats_view(user: CurrentAdmin = Depends(require_admin("viewer"))) -> Dict[str, Any]:
+        return {
+            "cache": cache_stats(),
+            "bus": invalidation_listener.stats(),
+            "compression": compression_stats(),
+            "conditional": conditional_stats(),
+            "warmup": cache_warmer.last_report,
+            "db_read": read_router.stats(),
+            "suggest_catalog": suggest.catalog.stats(),
+        }
+
     # Доп. страницы: проксируем к существующим API или реализуем краткие операции
     @router.get(f"{admin.root_path}/auto-publish/settings")
     async def get_auto_publish_settings(user: CurrentAdmin = Depends(require_admin("manager"))):
@@ -279,19 +312,19 @@ def AdminJSFastAPI(admin: AdminJS) -> APIRouter:
         return settings_cache or {}
 
     @router.put(f"{admin.root_path}/auto-publish/settings")
-    async def set_auto_publish_settings(payload: Dict[str, Any], request: Request, user: CurrentAdmin = Depends(require_admin("manager")), db: AsyncSession = Depends(get_db)):
+    async def set_auto_publish_settings(payload: Dict[str, Any], request: Request, user: CurrentAdmin = Depends(require_admin("manager")), db: AsyncSession = Depends(get_admin_db)):
         await cache_set("auto_publish:settings", payload, ttl_seconds=24 * 3600)
         await _audit(db, user, action="admin_update_auto_publish_settings", entity_type="auto_publish", entity_id=None, details={"keys": list(payload.keys())}, request=request)
         return {"ok": True}
 
     @router.get(f"{admin.root_path}/auto-publish/queue")
-    async def get_auto_publish_queue(request: Request, user: CurrentAdmin = Depends(require_admin("manager")), db: AsyncSession = Depends(get_db)):
+    async def get_auto_publish_queue(request: Request, user: CurrentAdmin = Depends(require_admin("manager")), db: AsyncSession = Depends(get_admin_db)):
         queue: List[Dict[str, Any]] = await cache_get("auto_publish:queue") or []
         await _audit(db, user, action="admin_view_auto_publish_queue", entity_type="auto_publish", entity_id=None, details={"queue_len": len(queue)}, request=request)
         return {"items": queue}
 
     @router.post(f"{admin.root_path}/auto-publish/schedule")
-    async def schedule_auto_publish(payload: SchedulePayload, request: Request, user: CurrentAdmin = Depends(require_admin("manager")), db: AsyncSession = Depends(get_db)):
+    async def schedule_auto_publish(payload: SchedulePayload, request: Request, user: CurrentAdmin = Depends(require_admin("manager")), db: AsyncSession = Depends(get_admin_db)):
         queue: List[Dict[str, Any]] = await cache_get("auto_publish:queue") or []
         item = {
             "country_code": payload.country_code,
@@ -305,28 +338,28 @@ def AdminJSFastAPI(admin: AdminJS) -> APIRouter:
         return {"queued": True, "size": len(queue)}
 
     @router.post(f"{admin.root_path}/auto-publish/generate-now")
-    async def auto_publish_generate_now(payload: GeneratePayload, request: Request, user: CurrentAdmin = Depends(require_admin("manager")), db: AsyncSession = Depends(get_db)):
+    async def auto_publish_generate_now(payload: GeneratePayload, request: Request, user: CurrentAdmin = Depends(require_admin("manager")), db: AsyncSession = Depends(get_admin_db)):
         try:
-            generate_article_task.delay(payload.country_code, payload.article_type)
+            send_task(GENERATE_ARTICLE, args=[payload.country_code, payload.article_type])
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Task dispatch failed: {e}")
         await _audit(db, user, action="admin_generate_now", entity_type="auto_publish", entity_id=None, details={"country": payload.country_code, "article_type": payload.article_type}, request=request)
         return {"queued": True}
 
     @router.get(f"{admin.root_path}/gdpr/consents")
-    async def gdpr_consents(user_hash: str, request: Request, user: CurrentAdmin = Depends(require_admin("manager")), db: AsyncSession = Depends(get_db)):
+    async def gdpr_consents(user_hash: str, request: Request, user: CurrentAdmin = Depends(require_admin("manager")), db: AsyncSession = Depends(get_admin_db)):
         rows = (await db.execute(select(UserConsent).where(UserConsent.user_hash == user_hash))).scalars().all()
         await _audit(db, user, action="admin_view_consents", entity_type="gdpr", entity_id=None, details={"user_hash": user_hash, "count": len(rows)}, request=request)
         return {"items": [r.to_dict() for r in rows]}
 
     @router.post(f"{admin.root_path}/gdpr/export")
-    async def gdpr_export(payload: GDPRPayload, request: Request, user: CurrentAdmin = Depends(require_admin("manager")), db: AsyncSession = Depends(get_db)):
+    async def gdpr_export(payload: GDPRPayload, request: Request, user: CurrentAdmin = Depends(require_admin("manager")), db: AsyncSession = Depends(get_admin_db)):
         result = await export_user_data(db, user_hash=payload.user_hash)
         await _audit(db, user, action="admin_export_user_data", entity_type="gdpr", entity_id=None, details={"user_hash": payload.user_hash, "lead_count": len(result.get("leads", []))}, request=request)
         return result
 
     @router.post(f"{admin.root_path}/gdpr/delete")
-    async def gdpr_delete(payload: GDPRPayload, request: Request, user: CurrentAdmin = Depends(require_admin("admin")), db: AsyncSession = Depends(get_db)):
+    async def gdpr_delete(payload: GDPRPayload, request: Request, user: CurrentAdmin = Depends(require_admin("admin")), db: AsyncSession = Depends(get_admin_db)):
         deleted = await delete_user_data(db, user_hash=payload.user_hash)
         await _audit(db, user, action="admin_delete_user_data", entity_type="gdpr", entity_id=None, details={"user_hash": payload.user_hash, "deleted_leads": deleted}, request=request)
         return {"deleted_leads": deleted}
@@ -335,14 +368,17 @@ def AdminJSFastAPI(admin: AdminJS) -> APIRouter:
     async def admin_audit_logs(
         request: Request,
         user: CurrentAdmin = Depends(require_admin("manager")),
-        db: AsyncSession = Depends(get_db),
+        db: AsyncSession = Depends(get_admin_db),
         date_from: Optional[str] = None,
         date_to: Optional[str] = None,
         action: Optional[str] = None,
         entity_type: Optional[str] = None,
         page: int = 1,
         size: int = 50,
+        cursor: Optional[str] = None,
     ):
+        # cursor (next_cursor предыдущего ответа) — keyset по (created_at, id); page — для совместимости
+        size = max(1, min(size, 200))
         conds = []
         if action:
             conds.append(AuditLog.action == action)
@@ -360,9 +396,9 @@ def AdminJSFastAPI(admin: AdminJS) -> APIRouter:
         stmt = select(AuditLog)
         if conds:
             stmt = stmt.where(and_(*conds))
-        stmt = stmt.order_by(desc(AuditLog.created_at)).offset(max(0, (page - 1) * size)).limit(size)
-        rows = (await db.execute(stmt)).scalars().all()
-        await _audit(db, user, action="admin_view_audit_logs", entity_type="audit", entity_id=None, details={"count": len(rows)}, request=request)
-        return {"items": [r.to_dict() for r in rows], "page": page, "size": size}
+        stmt = paginate(stmt, AUDIT_LOG_ORDER, size, cursor=cursor, offset=max(0, (page - 1) * size))
+        result = page_of((await db.execute(stmt)).scalars().all(), AUDIT_LOG_ORDER, size)
+        await _audit(db, user, action="admin_view_audit_logs", entity_type="audit", entity_id=None, details={"count": len(result.items)}, request=request)
+        return {"items": [r.to_dict() for r in result.items], "page": page, "size": size, "next_cursor": result.next_cursor}
 
     return router
\ No newline at end of file
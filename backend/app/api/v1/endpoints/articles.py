@@ -2,23 +2,43 @@ from __future__ import annotations
 
 import logging
 from datetime import datetime
-from typing import Optional
+from typing import Dict, List, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
-from sqlalchemy import select, func, or_, desc
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db
-from app.core.cache import cache_get, cache_set
+from app.core.database import get_admin_db, with_session
+from app.core.pagination import datetime_keyset, int_keyset, page_of, paginate
+from app.core.response_cache import cached_json_batch, cached_json_response
+from app.core.config import settings
 from app.dependencies.auth import get_current_user, CurrentUser
+from app.dependencies.batch import parse_batch_param
 from app.models.article import Article, ArticleStatus
 from app.models.audit_log import AuditLog
-from app.schemas.article import ArticleCreate, ArticleUpdate, ArticleOut, PaginatedArticles, SitemapItem
+from app.schemas.article import (
+    ArticleBatch,
+    ArticleCreate,
+    ArticleOut,
+    ArticleSearchHit,
+    ArticleSearchResults,
+    ArticleUpdate,
+    PaginatedArticles,
+    SitemapItem,
+)
+from app.services import article_search
+from app.services.cache_invalidation import ARTICLES_LIST, ARTICLES_SITEMAP, article_tag, invalidate_article
+from app.services.cache_warmer import schedule_warmup, warm_after_publish
 
 logger = logging.getLogger("api.articles")
 router = APIRouter()
 
+ARTICLE_ORDERS = {
+    "created_at": datetime_keyset("created_at", Article.created_at, Article.id),
+    "views_count": int_keyset("views_count", Article.views_count, Article.id),
+}
+
 
 @router.get("/", response_model=PaginatedArticles, response_model_exclude_none=True)
 async def list_articles(
@@ -26,80 +46,128 @@ async def list_articles(
     status_filter: Optional[str] = Query(None, description="draft/published"),
     country_id: Optional[UUID] = Query(None),
     limit: int = Query(20, ge=1, le=100),
-    offset: int = Query(0, ge=0),
-    search: Optional[str] = Query(None, description="Поиск по title/content"),
+    offset: int = Query(0, ge=0, description="Устаревшее: вместо offset передавайте next_cursor"),
+    cursor: Optional[str] = Query(None, description="next_cursor предыдущей страницы"),
+    search: Optional[str] = Query(None, description="Поиск по title/content (полнотекстовый; с рангом и сниппетами — /search)"),
     order_by: str = Query("created_at", pattern="^(created_at|views_count)$"),
-    db: AsyncSession = Depends(get_db),
-) -> PaginatedArticles:
-    logger.info("List articles: status=%s country=%s search=%s order_by=%s", status_filter, country_id, search, order_by)
-    cache_key = f"articles:list:{status_filter}:{country_id}:{limit}:{offset}:{search}:{order_by}"
-    cached = await cache_get(cache_key)
-    if cached:
-        return PaginatedArticles(**cached)
-
-    query = select(Article)
-
-    if status_filter:
-        try:
-            status_enum = ArticleStatus(status_filter)
-            query = query.where(Article.status == status_enum)
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Invalid status filter")
-
-    if country_id:
-        query = query.where(Article.country_id == country_id)
-
-    if search:
-        pattern = f"%{search}%"
-        query = query.where(or_(Article.title.ilike(pattern), Article.content.ilike(pattern)))
-
-    if order_by == "views_count":
-        query = query.order_by(desc(Article.views_count))
-    else:
-        query = query.order_by(desc(Article.created_at))
-
-    total_q = select(func.count()).select_from(Article)
-    if status_filter:
-        total_q = total_q.where(Article.status == ArticleStatus(status_filter))
-    if country_id:
-        total_q = total_q.where(Article.country_id == country_id)
-    if search:
-        pattern = f"%{search}%"
-        total_q = total_q.where(or_(Article.title.ilike(pattern), Article.content.ilike(pattern)))
-
-    query = query.limit(limit).offset(offset)
-
-    items_res = await db.execute(query)
-    items = items_res.scalars().all()
-
-    total_res = await db.execute(total_q)
-    total = int(total_res.scalar() or 0)
-
-    payload = PaginatedArticles(
-        items=[ArticleOut.model_validate(i, from_attributes=True) for i in items],
-        total=total,
-        limit=limit,
-        offset=offset,
+) -> Response:
+    logger.debug("List articles: status=%s country=%s search=%s order_by=%s", status_filter, country_id, search, order_by)
+    search = article_search.normalize_query(search) if search else None
+    cache_key = f"articles:list:{status_filter}:{country_id}:{limit}:{offset}:{search}:{order_by}:{cursor}"
+    keyset = ARTICLE_ORDERS[order_by]
+
+    async def load(db: AsyncSession) -> PaginatedArticles:
+        query = select(Article)
+
+        if status_filter:
+            try:
+                status_enum = ArticleStatus(status_filter)
+                query = query.where(Article.status == status_enum)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid status filter")
+
+        if country_id:
+            query = query.where(Article.country_id == country_id)
+
+        if search:
+            query = query.where(article_search.matches(article_search.ts_query(search)))
+
+        total_q = select(func.count()).select_from(Article)
+        if status_filter:
+            total_q = total_q.where(Article.status == ArticleStatus(status_filter))
+        if country_id:
+            total_q = total_q.where(Article.country_id == country_id)
+        if search:
+            total_q = total_q.where(article_search.matches(article_search.ts_query(search)))
+
+        query = paginate(query, keyset, limit, cursor=cursor, offset=offset)
+
+        items_res = await db.execute(query)
+        page = page_of(items_res.scalars().all(), keyset, limit)
+
+        total_res = await db.execute(total_q)
+        total = int(total_res.scalar() or 0)
+
+        return PaginatedArticles(
+            items=[ArticleOut.model_validate(i, from_attributes=True) for i in page.items],
+            total=total,
+            limit=limit,
+            offset=0 if cursor else offset,
+            next_cursor=page.next_cursor,
+        )
+
+    return await cached_json_response(cache_key, with_session(load, read=True), PaginatedArticles, ttl_seconds=settings.CACHE_CONTENT_TTL_SECONDS, tags=[ARTICLES_LIST])
+
+
+# Объявлен до /{slug}, иначе "search" будет принят за slug
+@router.get("/search", response_model=ArticleSearchResults, response_model_exclude_none=True)
+async def search_articles(
+    q: str = Query(..., min_length=1, description="Запрос: слова, \"фраза\", or, -исключение"),
+    country_id: Optional[UUID] = Query(None),
+    limit: int = Query(10, ge=1, le=50),
+    offset: int = Query(0, ge=0, le=1000),
+) -> Response:
+    """Полнотекстовый поиск по опубликованным статьям: по рангу, со сниппетами."""
+    query = article_search.normalize_query(q)
+    if not query:
+        raise HTTPException(status_code=422, detail="Empty search query")
+    logger.debug("Search articles: %r country=%s", query, country_id)
+
+    async def load(db: AsyncSession) -> ArticleSearchResults:
+        page_q, total_q = article_search.search_statements(query, country_id, limit, offset)
+        rows = (await db.execute(page_q)).mappings().all()
+        total = int((await db.execute(total_q)).scalar() or 0)
+        return ArticleSearchResults(
+            query=query,
+            items=[ArticleSearchHit.model_validate(dict(row)) for row in rows],
+            total=total,
+            limit=limit,
+            offset=offset,
+        )
+
+    return await cached_json_response(
+        article_search.cache_key(query, country_id, limit, offset),
+        with_session(load, read=True),
+        ArticleSearchResults,
+        ttl_seconds=settings.CACHE_SEARCH_TTL_SECONDS,
+        tags=[ARTICLES_LIST],
+    )
+
+
+# Объявлен до /{slug}, иначе "batch" будет принят за slug
+@router.get("/batch", response_model=ArticleBatch, response_model_exclude_none=True)
+async def get_articles_batch(slugs: str = Query(..., description="slug'и через запятую")) -> Response:
+    """Несколько статей за запрос: попадания — одним MGET, промахи — одним SELECT ... WHERE slug IN."""
+    idents = parse_batch_param(slugs)
+    logger.debug("Get articles batch: %d slugs", len(idents))
+
+    async def load(missing: List[str]) -> Dict[str, ArticleOut]:
+        async def query(db: AsyncSession) -> Dict[str, ArticleOut]:
+            res = await db.execute(select(Article).where(Article.slug.in_(missing)))
+            return {a.slug: ArticleOut.model_validate(a, from_attributes=True) for a in res.scalars().all()}
+
+        return await with_session(query, read=True)()
+
+    return await cached_json_batch(
+        idents, lambda slug: f"articles:slug:{slug}", load, ArticleOut, ttl_seconds=settings.CACHE_CONTENT_TTL_SECONDS, tags=lambda a: [article_tag(a.id)]
     )
-    await cache_set(cache_key, payload.model_dump())
-    return payload
 
 
 @router.get("/{slug}", response_model=ArticleOut, response_model_exclude_none=True)
-async def get_article(slug: str, db: AsyncSession = Depends(get_db)) -> ArticleOut:
-    logger.info("Get article by slug: %s", slug)
+async def get_article(slug: str) -> Response:
+    logger.debug("Get article by slug: %s", slug)
     cache_key = f"articles:slug:{slug}"
-    cached = await cache_get(cache_key)
-    if cached:
-        return ArticleOut(**cached)
 
-    res = await db.execute(select(Article).where(Article.slug == slug))
-    article = res.scalars().first()
-    if not article:
-        raise HTTPException(status_code=404, detail="Article not found")
-    out = ArticleOut.model_validate(article, from_attributes=True)
-    await cache_set(cache_key, out.model_dump())
-    return out
+    async def load(db: AsyncSession) -> ArticleOut:
+        res = await db.execute(select(Article).where(Article.slug == slug))
+        article = res.scalars().first()
+        if not article:
+            raise HTTPException(status_code=404, detail="Article not found")
+        return ArticleOut.model_validate(article, from_attributes=True)
+
+    return await cached_json_response(
+        cache_key, with_session(load, read=True), ArticleOut, ttl_seconds=settings.CACHE_CONTENT_TTL_SECONDS, tags=lambda a: [article_tag(a.id)]
+    )
 
 
 @router.post("/", response_model=ArticleOut, response_model_exclude_none=True, status_code=status.HTTP_201_CREATED)
@@ -107,7 +175,7 @@ async def create_article(
     payload: ArticleCreate,
     request: Request,
     user: CurrentUser = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_admin_db),
 ) -> ArticleOut:
     logger.info("Create article by %s slug=%s", user.email, payload.slug)
 
@@ -131,6 +199,7 @@ async def create_article(
     db.add(article)
     await db.commit()
     await db.refresh(article)
+    await invalidate_article(article.id, article.country_id)
 
     # Audit
     ip_addr = request.headers.get("x-forwarded-for") or (request.client.host if request.client else None)
@@ -157,7 +226,7 @@ async def update_article(
     payload: ArticleUpdate,
     request: Request,
     user: CurrentUser = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_admin_db),
 ) -> ArticleOut:
     logger.info("Update article %s by %s", id, user.email)
     res = await db.execute(select(Article).where(Article.id == id))
@@ -171,11 +240,13 @@ async def update_article(
         if existing.scalars().first():
             raise HTTPException(status_code=400, detail="Slug already exists")
 
+    old_country_id = article.country_id
     for field, value in payload.model_dump(exclude_unset=True).items():
         setattr(article, field, value)
 
     await db.commit()
     await db.refresh(article)
+    await invalidate_article(article.id, old_country_id, article.country_id)
 
     ip_addr = request.headers.get("x-forwarded-for") or (request.client.host if request.client else None)
     ua = request.headers.get("user-agent")
@@ -200,7 +271,7 @@ async def delete_article(
     id: UUID,
     request: Request,
     user: CurrentUser = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_admin_db),
 ) -> None:
     logger.info("Delete article %s by %s", id, user.email)
     res = await db.execute(select(Article).where(Article.id == id))
@@ -210,6 +281,7 @@ async def delete_article(
 
     await db.delete(article)
     await db.commit()
+    await invalidate_article(id, article.country_id)
 
     ip_addr = request.headers.get("x-forwarded-for") or (request.client.host if request.client else None)
     ua = request.headers.get("user-agent")
@@ -232,7 +304,7 @@ async def publish_article(
     id: UUID,
     request: Request,
     user: CurrentUser = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_admin_db),
 ) -> ArticleOut:
     logger.info("Publish article %s by %s", id, user.email)
     res = await db.execute(select(Article).where(Article.id == id))
@@ -244,6 +316,8 @@ async def publish_article(
     article.published_at = datetime.utcnow()
     await db.commit()
     await db.refresh(article)
+    await invalidate_article(article.id, article.country_id)
+    schedule_warmup(warm_after_publish(article.slug, article.country_id))
 
     ip_addr = request.headers.get("x-forwarded-for") or (request.client.host if request.client else None)
     ua = request.headers.get("user-agent")
@@ -264,23 +338,20 @@ async def publish_article(
 
 
 @router.get("/sitemap", response_model=list[SitemapItem], response_model_exclude_none=True)
-async def articles_sitemap(db: AsyncSession = Depends(get_db)) -> list[SitemapItem]:
-    logger.info("Generate articles sitemap")
+async def articles_sitemap() -> Response:
+    logger.debug("Generate articles sitemap")
     cache_key = "articles:sitemap"
-    cached = await cache_get(cache_key)
-    if cached:
-        return [SitemapItem(**i) for i in cached]
-
-    res = await db.execute(select(Article.slug, Article.updated_at))
-    items = [
-        SitemapItem(
-            loc=f"/articles/{slug}",
-            lastmod=updated_at.isoformat() if updated_at else None,
-            changefreq="weekly",
-            priority=0.6,
-        )
-        for slug, updated_at in res.all()
-    ]
 
-    await cache_set(cache_key, [i.model_dump() for i in items])
-    return items
\ No newline at end of file
+    async def load(db: AsyncSession) -> list[SitemapItem]:
+        res = await db.execute(select(Article.slug, Article.updated_at))
+        return [
+            SitemapItem(
+                loc=f"/articles/{slug}",
+                lastmod=updated_at.isoformat() if updated_at else None,
+                changefreq="weekly",
+                priority=0.6,
+            )
+            for slug, updated_at in res.all()
+        ]
+
+    return await cached_json_response(cache_key, with_session(load, read=True), list[SitemapItem], ttl_seconds=settings.CACHE_CONTENT_TTL_SECONDS, tags=[ARTICLES_SITEMAP])
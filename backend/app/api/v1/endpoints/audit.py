@@ -4,7 +4,7 @@ Audit endpoints (admin-only): журнал операций и отчёты по
 Требования:
 - GET /audit: журнал аудита (auth, только admin)
   - Фильтры: date_from, date_to, action, entity_type
-  - Пагинация: page, size
+  - Пагинация: cursor (next_cursor из ответа) или устаревшие page, size
   - Экспорт в CSV: export_csv=true
 - GET /audit/report: статистика доступа к ПД (просмотры/экспорты)
 """
@@ -19,28 +19,36 @@ from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response,
 from sqlalchemy import select, func, and_, desc
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db
+from app.core.database import get_read_db
+from app.core.pagination import datetime_keyset, page_of, paginate
 from app.core.config import settings
 from app.dependencies.auth import get_current_user, CurrentUser
 from app.models.audit_log import AuditLog
 
 router = APIRouter()
 
+AUDIT_ORDER = datetime_keyset("created_at", AuditLog.created_at, AuditLog.id)
+
 
 @router.get("/", status_code=status.HTTP_200_OK)
 async def get_audit_logs(
     request: Request,
     user: CurrentUser = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     date_from: Optional[datetime] = Query(None),
     date_to: Optional[datetime] = Query(None),
     action: Optional[str] = Query(None),
     entity_type: Optional[str] = Query(None),
     page: int = Query(1, ge=1),
     size: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="next_cursor предыдущей страницы"),
     export_csv: bool = Query(False),
 ) -> Any:
-    """Возвращает журнал аудита (с фильтрами и экспортом). Только админ."""
+    """Возвращает журнал аудита (с фильтрами и экспортом). Только админ.
+
+    С cursor страница выбирается по индексу (created_at, id) за одинаковое время на любой
+    глубине, а total не считается (count(*) по всему журналу и есть линейная часть).
+    """
     # Проверка прав
     if user.email != settings.ADMIN_USERNAME:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin only")
@@ -57,19 +65,22 @@ async def get_audit_logs(
 
     where_clause = and_(*conditions) if conditions else None
 
-    # Считаем total
-    count_stmt = select(func.count(AuditLog.id))
-    if where_clause is not None:
-        count_stmt = count_stmt.where(where_clause)
-    total: int = int((await db.execute(count_stmt)).scalar() or 0)
+    # Считаем total (только для постраничного режима)
+    total: Optional[int] = None
+    if not cursor:
+        count_stmt = select(func.count(AuditLog.id))
+        if where_clause is not None:
+            count_stmt = count_stmt.where(where_clause)
+        total = int((await db.execute(count_stmt)).scalar() or 0)
 
     # Выбираем страницу
     stmt = select(AuditLog)
     if where_clause is not None:
         stmt = stmt.where(where_clause)
-    stmt = stmt.order_by(desc(AuditLog.created_at)).offset((page - 1) * size).limit(size)
+    stmt = paginate(stmt, AUDIT_ORDER, size, cursor=cursor, offset=(page - 1) * size)
 
-    rows = (await db.execute(stmt)).scalars().all()
+    result = page_of((await db.execute(stmt)).scalars().all(), AUDIT_ORDER, size)
+    rows = result.items
 
     if export_csv:
         # Готовим CSV; details сериализуем как JSON-строку
@@ -97,13 +108,14 @@ async def get_audit_logs(
         "page": page,
         "size": size,
         "total": total,
+        "next_cursor": result.next_cursor,
     }
 
 
 @router.get("/report", status_code=status.HTTP_200_OK)
 async def audit_report(
     user: CurrentUser = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     days: int = Query(30, ge=1, le=365),
 ) -> Dict[str, Any]:
     """Статистика доступа к ПД за последние N дней. Только админ."""
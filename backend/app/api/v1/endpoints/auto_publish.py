@@ -16,11 +16,11 @@ from pydantic import BaseModel, Field
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
-from app.core.database import get_db
+from app.core.database import get_admin_db
 from app.core.cache import cache_get, cache_set
 from app.dependencies.auth import get_current_user, CurrentUser
 from app.models.audit_log import AuditLog
-from app.tasks.article_generator import generate_article_task
+from app.tasks.dispatch import GENERATE_ARTICLE, send_task
 
 router = APIRouter()
 
@@ -46,7 +46,7 @@ async def schedule_generation(
     payload: ScheduleRequest,
     request: Request,
     user: CurrentUser = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_admin_db),
 ) -> Dict[str, Any]:
     """Добавляет задачу генерации в очередь: запускает по времени или с задержкой."""
     if user.email != settings.ADMIN_USERNAME:
@@ -60,7 +60,7 @@ async def schedule_generation(
     elif payload.delay_seconds and payload.delay_seconds > 0:
         opts["countdown"] = payload.delay_seconds
 
-    task = generate_article_task.apply_async(kwargs={
+    task = send_task(GENERATE_ARTICLE, kwargs={
         "country_code": payload.country_code,
         "article_type": payload.article_type,
     }, **opts)
@@ -108,12 +108,12 @@ async def generate_now(
     payload: GenerateNowRequest,
     request: Request,
     user: CurrentUser = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_admin_db),
 ) -> Dict[str, Any]:
     if user.email != settings.ADMIN_USERNAME:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin only")
 
-    task = generate_article_task.delay(payload.country_code, payload.article_type)
+    task = send_task(GENERATE_ARTICLE, args=[payload.country_code, payload.article_type])
 
     # Аудит
     ip_addr = request.headers.get("x-forwarded-for") or (request.client.host if request.client else None)
@@ -1,98 +1,121 @@
 from __future__ import annotations
 
 import logging
-from typing import Optional
+from typing import Dict, List, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
-from sqlalchemy import select, func, desc
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db
-from app.core.cache import cache_get, cache_set
+from app.core.database import get_admin_db, with_session
+from app.core.pagination import datetime_keyset, page_of, paginate
+from app.core.response_cache import cached_json_batch, cached_json_response
+from app.core.config import settings
 from app.dependencies.auth import get_current_user, CurrentUser
+from app.dependencies.batch import parse_batch_param
 from app.models.case_study import CaseStudy, CaseStatus
 from app.models.audit_log import AuditLog
 from app.schemas.case_study import (
+    CaseStudyBatch,
     CaseStudyCreate,
     CaseStudyUpdate,
     CaseStudyOut,
     PaginatedCaseStudies,
 )
+from app.services.cache_invalidation import CASE_STUDIES_LIST, case_study_tag, invalidate_case_study
 
 logger = logging.getLogger("api.case_studies")
 router = APIRouter()
 
+CASE_STUDY_ORDER = datetime_keyset("created_at", CaseStudy.created_at, CaseStudy.id)
+
 
 @router.get("/", response_model=PaginatedCaseStudies, response_model_exclude_none=True)
 async def list_case_studies(
     status_filter: Optional[str] = Query(None, description="draft/published"),
     country_id: Optional[UUID] = Query(None),
     limit: int = Query(20, ge=1, le=100),
-    offset: int = Query(0, ge=0),
+    offset: int = Query(0, ge=0, description="Устаревшее: вместо offset передавайте next_cursor"),
+    cursor: Optional[str] = Query(None, description="next_cursor предыдущей страницы"),
     order_by: str = Query("created_at", pattern="^(created_at)$"),
-    db: AsyncSession = Depends(get_db),
-) -> PaginatedCaseStudies:
-    logger.info("List case studies: status=%s country=%s order_by=%s", status_filter, country_id, order_by)
-    cache_key = f"case_studies:list:{status_filter}:{country_id}:{limit}:{offset}:{order_by}"
-    cached = await cache_get(cache_key)
-    if cached:
-        return PaginatedCaseStudies(**cached)
-
-    query = select(CaseStudy)
-
-    if status_filter:
-        try:
-            status_enum = CaseStatus(status_filter)
-            query = query.where(CaseStudy.status == status_enum)
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Invalid status filter")
-
-    if country_id:
-        query = query.where(CaseStudy.country_id == country_id)
-
-    if order_by == "created_at":
-        query = query.order_by(desc(CaseStudy.created_at))
-
-    total_q = select(func.count()).select_from(CaseStudy)
-    if status_filter:
-        total_q = total_q.where(CaseStudy.status == CaseStatus(status_filter))
-    if country_id:
-        total_q = total_q.where(CaseStudy.country_id == country_id)
-
-    query = query.limit(limit).offset(offset)
-
-    items_res = await db.execute(query)
-    items = items_res.scalars().all()
-
-    total_res = await db.execute(total_q)
-    total = int(total_res.scalar() or 0)
-
-    payload = PaginatedCaseStudies(
-        items=[CaseStudyOut.model_validate(i, from_attributes=True) for i in items],
-        total=total,
-        limit=limit,
-        offset=offset,
+) -> Response:
+    logger.debug("List case studies: status=%s country=%s order_by=%s", status_filter, country_id, order_by)
+    cache_key = f"case_studies:list:{status_filter}:{country_id}:{limit}:{offset}:{order_by}:{cursor}"
+
+    async def load(db: AsyncSession) -> PaginatedCaseStudies:
+        query = select(CaseStudy)
+
+        if status_filter:
+            try:
+                status_enum = CaseStatus(status_filter)
+                query = query.where(CaseStudy.status == status_enum)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid status filter")
+
+        if country_id:
+            query = query.where(CaseStudy.country_id == country_id)
+
+        total_q = select(func.count()).select_from(CaseStudy)
+        if status_filter:
+            total_q = total_q.where(CaseStudy.status == CaseStatus(status_filter))
+        if country_id:
+            total_q = total_q.where(CaseStudy.country_id == country_id)
+
+        query = paginate(query, CASE_STUDY_ORDER, limit, cursor=cursor, offset=offset)
+
+        items_res = await db.execute(query)
+        page = page_of(items_res.scalars().all(), CASE_STUDY_ORDER, limit)
+
+        total_res = await db.execute(total_q)
+        total = int(total_res.scalar() or 0)
+
+        return PaginatedCaseStudies(
+            items=[CaseStudyOut.model_validate(i, from_attributes=True) for i in page.items],
+            total=total,
+            limit=limit,
+            offset=0 if cursor else offset,
+            next_cursor=page.next_cursor,
+        )
+
+    return await cached_json_response(
+        cache_key, with_session(load, read=True), PaginatedCaseStudies, ttl_seconds=settings.CACHE_CONTENT_TTL_SECONDS, tags=[CASE_STUDIES_LIST]
+    )
+
+
+# Объявлен до /{slug}, иначе "batch" будет принят за slug
+@router.get("/batch", response_model=CaseStudyBatch, response_model_exclude_none=True)
+async def get_case_studies_batch(slugs: str = Query(..., description="slug'и через запятую")) -> Response:
+    idents = parse_batch_param(slugs)
+    logger.debug("Get case studies batch: %d slugs", len(idents))
+
+    async def load(missing: List[str]) -> Dict[str, CaseStudyOut]:
+        async def query(db: AsyncSession) -> Dict[str, CaseStudyOut]:
+            res = await db.execute(select(CaseStudy).where(CaseStudy.slug.in_(missing)))
+            return {c.slug: CaseStudyOut.model_validate(c, from_attributes=True) for c in res.scalars().all()}
+
+        return await with_session(query, read=True)()
+
+    return await cached_json_batch(
+        idents, lambda slug: f"case_studies:slug:{slug}", load, CaseStudyOut, ttl_seconds=settings.CACHE_CONTENT_TTL_SECONDS, tags=lambda c: [case_study_tag(c.id)]
     )
-    await cache_set(cache_key, payload.model_dump())
-    return payload
 
 
 @router.get("/{slug}", response_model=CaseStudyOut, response_model_exclude_none=True)
-async def get_case_study(slug: str, db: AsyncSession = Depends(get_db)) -> CaseStudyOut:
-    logger.info("Get case study by slug: %s", slug)
+async def get_case_study(slug: str) -> Response:
+    logger.debug("Get case study by slug: %s", slug)
     cache_key = f"case_studies:slug:{slug}"
-    cached = await cache_get(cache_key)
-    if cached:
-        return CaseStudyOut(**cached)
 
-    res = await db.execute(select(CaseStudy).where(CaseStudy.slug == slug))
-    case = res.scalars().first()
-    if not case:
-        raise HTTPException(status_code=404, detail="Case study not found")
-    out = CaseStudyOut.model_validate(case, from_attributes=True)
-    await cache_set(cache_key, out.model_dump())
-    return out
+    async def load(db: AsyncSession) -> CaseStudyOut:
+        res = await db.execute(select(CaseStudy).where(CaseStudy.slug == slug))
+        case = res.scalars().first()
+        if not case:
+            raise HTTPException(status_code=404, detail="Case study not found")
+        return CaseStudyOut.model_validate(case, from_attributes=True)
+
+    return await cached_json_response(
+        cache_key, with_session(load, read=True), CaseStudyOut, ttl_seconds=settings.CACHE_CONTENT_TTL_SECONDS, tags=lambda c: [case_study_tag(c.id)]
+    )
 
 
 @router.post("/", response_model=CaseStudyOut, response_model_exclude_none=True, status_code=status.HTTP_201_CREATED)
@@ -100,7 +123,7 @@ async def create_case_study(
     payload: CaseStudyCreate,
     request: Request,
     user: CurrentUser = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_admin_db),
 ) -> CaseStudyOut:
     logger.info("Create case study by %s slug=%s", user.email, payload.slug)
 
@@ -123,6 +146,7 @@ async def create_case_study(
     db.add(case)
     await db.commit()
     await db.refresh(case)
+    await invalidate_case_study(case.id)
 
     # Audit
     ip_addr = request.headers.get("x-forwarded-for") or (request.client.host if request.client else None)
@@ -149,7 +173,7 @@ async def update_case_study(
     payload: CaseStudyUpdate,
     request: Request,
     user: CurrentUser = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_admin_db),
 ) -> CaseStudyOut:
     logger.info("Update case study %s by %s", id, user.email)
     res = await db.execute(select(CaseStudy).where(CaseStudy.id == id))
@@ -168,6 +192,7 @@ async def update_case_study(
 
     await db.commit()
     await db.refresh(case)
+    await invalidate_case_study(case.id)
 
     # Audit
     ip_addr = request.headers.get("x-forwarded-for") or (request.client.host if request.client else None)
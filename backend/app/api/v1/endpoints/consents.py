@@ -22,7 +22,7 @@ from pydantic import BaseModel, EmailStr
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db
+from app.core.database import get_admin_db, get_db
 from app.core.security import audit_log
 from app.dependencies.auth import get_current_user, CurrentUser
 from app.models.consent import UserConsent, ConsentType
@@ -80,7 +80,7 @@ async def revoke_consent_endpoint(
     id: UUID,
     request: Request,
     user: CurrentUser = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_admin_db),
 ) -> Dict[str, Any]:
     """Отзывает согласие и при необходимости удаляет связанные данные."""
     # Получим согласие, чтобы понять тип и user_hash
@@ -1,27 +1,29 @@
 from __future__ import annotations
 
 import logging
-from typing import List, Optional
+from typing import Dict, List, Optional, Sequence
 from uuid import UUID
 import uuid
 from datetime import datetime
 
-from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db
-from app.core.cache import cache_get, cache_set
+from app.core.database import get_admin_db, with_session
+from app.core.response_cache import cached_json_batch, cached_json_response
 from app.core.config import settings
 from app.dependencies.auth import get_current_user, CurrentUser
+from app.dependencies.batch import parse_batch_param
 from app.models.country import Country
 from app.models.article import Article, ArticleStatus
 from app.models.service import Service
 from app.models.seo_metadata import SEOMetadata, SEOEntityType
 from app.models.audit_log import AuditLog
-from app.schemas.country import CountryCreate, CountryUpdate, CountryOut
+from app.schemas.country import CountryBatch, CountryCreate, CountryUpdate, CountryOut
 from app.schemas.service import ServiceOut
 from app.schemas.seo_metadata import SEOMetadataOut
+from app.services.cache_invalidation import COUNTRIES_LIST, country_tag, invalidate_country
 
 logger = logging.getLogger("api.countries")
 router = APIRouter()
@@ -69,98 +71,103 @@ DEV_COUNTRIES_FALLBACK = [
 ]
 
 
+async def _countries_out(db: AsyncSession, countries: Sequence[Country]) -> List[CountryOut]:
+    """CountryOut со счётчиком статей, услугами и SEO — по одному запросу на связь для всех стран сразу."""
+    if not countries:
+        return []
+
+    ids = [c.id for c in countries]
+
+    # Articles count (published)
+    counts_res = await db.execute(
+        select(Article.country_id, func.count()).where(Article.status == ArticleStatus.published, Article.country_id.in_(ids)).group_by(Article.country_id)
+    )
+    counts_map = {cid: int(cnt) for cid, cnt in counts_res.all()}
+
+    # Services by country
+    services_res = await db.execute(select(Service).where(Service.is_active == True, Service.country_id.in_(ids)))
+    services = services_res.scalars().all()
+    services_map: dict[UUID, list[ServiceOut]] = {}
+    for s in services:
+        services_map.setdefault(s.country_id, []).append(ServiceOut.model_validate(s, from_attributes=True))
+
+    # SEO metadata
+    seo_res = await db.execute(
+        select(SEOMetadata).where(SEOMetadata.entity_type == SEOEntityType.country, SEOMetadata.entity_id.in_(ids))
+    )
+    seo_map = {m.entity_id: SEOMetadataOut.model_validate(m, from_attributes=True) for m in seo_res.scalars().all()}
+
+    return [
+        CountryOut(
+            **CountryOut.model_validate(c, from_attributes=True).model_dump(),
+            articles_count=counts_map.get(c.id, 0),
+            services=services_map.get(c.id, []),
+            seo=seo_map.get(c.id),
+        )
+        for c in countries
+    ]
+
+
 @router.get("/", response_model=List[CountryOut], response_model_exclude_none=True)
-async def list_countries(db: AsyncSession = Depends(get_db)) -> List[CountryOut]:
-    logger.info("List active countries")
+async def list_countries() -> Response:
+    logger.debug("List active countries")
     cache_key = "countries:list:active"
-    cached = await cache_get(cache_key)
-    if cached:
-        return [CountryOut(**c) for c in cached]
 
-    try:
+    async def load(db: AsyncSession) -> List[CountryOut]:
         res = await db.execute(select(Country).where(Country.is_active == True))
-        countries = res.scalars().all()
-        if not countries:
-            return []
-
-        ids = [c.id for c in countries]
+        return await _countries_out(db, res.scalars().all())
 
-        # Articles count (published)
-        counts_res = await db.execute(
-            select(Article.country_id, func.count()).where(Article.status == ArticleStatus.published, Article.country_id.in_(ids)).group_by(Article.country_id)
-        )
-        counts_map = {cid: int(cnt) for cid, cnt in counts_res.all()}
-
-        # Services by country
-        services_res = await db.execute(select(Service).where(Service.is_active == True, Service.country_id.in_(ids)))
-        services = services_res.scalars().all()
-        services_map: dict[UUID, list[ServiceOut]] = {}
-        for s in services:
-            services_map.setdefault(s.country_id, []).append(ServiceOut.model_validate(s, from_attributes=True))
-
-        # SEO metadata
-        seo_res = await db.execute(
-            select(SEOMetadata).where(SEOMetadata.entity_type == SEOEntityType.country, SEOMetadata.entity_id.in_(ids))
-        )
-        seo_map = {m.entity_id: SEOMetadataOut.model_validate(m, from_attributes=True) for m in seo_res.scalars().all()}
-
-        payload = [
-            CountryOut(
-                **CountryOut.model_validate(c, from_attributes=True).model_dump(),
-                articles_count=counts_map.get(c.id, 0),
-                services=services_map.get(c.id, []),
-                seo=seo_map.get(c.id),
-            )
-            for c in countries
-        ]
-
-        await cache_set(cache_key, [p.model_dump() for p in payload])
-        return payload
+    try:
+        return await cached_json_response(cache_key, with_session(load, read=True), List[CountryOut], ttl_seconds=settings.CACHE_CONTENT_TTL_SECONDS, tags=[COUNTRIES_LIST])
     except Exception as e:
         logger.error("list_countries DB error: %s", e)
         if settings.ENVIRONMENT == "dev":
-            await cache_set(cache_key, [p.model_dump() for p in DEV_COUNTRIES_FALLBACK])
             return DEV_COUNTRIES_FALLBACK
         raise HTTPException(status_code=503, detail="Database unavailable")
 
 
+# Объявлен до /{code}, иначе "batch" будет принят за код страны
+@router.get("/batch", response_model=CountryBatch, response_model_exclude_none=True)
+async def get_countries_batch(codes: str = Query(..., description="коды стран через запятую")) -> Response:
+    idents = parse_batch_param(codes)
+    logger.debug("Get countries batch: %d codes", len(idents))
+
+    async def load(missing: List[str]) -> Dict[str, CountryOut]:
+        async def query(db: AsyncSession) -> Dict[str, CountryOut]:
+            res = await db.execute(select(Country).where(Country.code.in_(missing)))
+            return {c.code: c for c in await _countries_out(db, res.scalars().all())}
+
+        return await with_session(query, read=True)()
+
+    try:
+        return await cached_json_batch(
+            idents, lambda code: f"countries:code:{code}", load, CountryOut,
+            ttl_seconds=settings.CACHE_CONTENT_TTL_SECONDS, tags=lambda c: [country_tag(c.id)],
+        )
+    except Exception as e:
+        logger.error("get_countries_batch DB error: %s", e)
+        if settings.ENVIRONMENT == "dev":
+            found = [c for c in DEV_COUNTRIES_FALLBACK if c.code in idents]
+            return CountryBatch(items=found, missing=[i for i in idents if i not in {c.code for c in found}])
+        raise HTTPException(status_code=503, detail="Database unavailable")
+
+
 @router.get("/{code}", response_model=CountryOut, response_model_exclude_none=True)
-async def get_country(code: str, db: AsyncSession = Depends(get_db)) -> CountryOut:
-    logger.info("Get country by code: %s", code)
+async def get_country(code: str) -> Response:
+    logger.debug("Get country by code: %s", code)
     cache_key = f"countries:code:{code}"
-    cached = await cache_get(cache_key)
-    if cached:
-        return CountryOut(**cached)
 
-    try:
+    async def load(db: AsyncSession) -> CountryOut:
         res = await db.execute(select(Country).where(Country.code == code))
         country = res.scalars().first()
         if not country:
             raise HTTPException(status_code=404, detail="Country not found")
+        return (await _countries_out(db, [country]))[0]
 
-        # Related
-        cnt_res = await db.execute(
-            select(func.count()).select_from(Article).where(Article.status == ArticleStatus.published, Article.country_id == country.id)
-        )
-        articles_count = int(cnt_res.scalar() or 0)
-
-        srv_res = await db.execute(select(Service).where(Service.is_active == True, Service.country_id == country.id))
-        services = [ServiceOut.model_validate(s, from_attributes=True) for s in srv_res.scalars().all()]
-
-        seo_res = await db.execute(
-            select(SEOMetadata).where(SEOMetadata.entity_type == SEOEntityType.country, SEOMetadata.entity_id == country.id)
-        )
-        seo = seo_res.scalars().first()
-        seo_out = SEOMetadataOut.model_validate(seo, from_attributes=True) if seo else None
-
-        out = CountryOut(
-            **CountryOut.model_validate(country, from_attributes=True).model_dump(),
-            articles_count=articles_count,
-            services=services,
-            seo=seo_out,
+    try:
+        return await cached_json_response(
+            cache_key, with_session(load, read=True), CountryOut, ttl_seconds=settings.CACHE_CONTENT_TTL_SECONDS, tags=lambda c: [country_tag(c.id)]
         )
-        await cache_set(cache_key, out.model_dump())
-        return out
     except HTTPException:
         # пробрасываем 404
         raise
@@ -169,7 +176,6 @@ async def get_country(code: str, db: AsyncSession = Depends(get_db)) -> CountryO
         if settings.ENVIRONMENT == "dev":
             match = next((c for c in DEV_COUNTRIES_FALLBACK if c.code == code), None)
             if match:
-                await cache_set(cache_key, match.model_dump())
                 return match
             raise HTTPException(status_code=404, detail="Country not found")
         raise HTTPException(status_code=503, detail="Database unavailable")
@@ -180,7 +186,7 @@ async def create_country(
     payload: CountryCreate,
     request: Request,
     user: CurrentUser = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_admin_db),
 ) -> CountryOut:
     logger.info("Create country %s by %s", payload.code, user.email)
 
@@ -200,6 +206,7 @@ async def create_country(
     db.add(country)
     await db.commit()
     await db.refresh(country)
+    await invalidate_country(country.id)
 
     # Audit
     ip_addr = request.headers.get("x-forwarded-for") or (request.client.host if request.client else None)
@@ -231,7 +238,7 @@ async def update_country(
     payload: CountryUpdate,
     request: Request,
     user: CurrentUser = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_admin_db),
 ) -> CountryOut:
     logger.info("Update country %s by %s", id, user.email)
     res = await db.execute(select(Country).where(Country.id == id))
@@ -244,6 +251,7 @@ async def update_country(
 
     await db.commit()
     await db.refresh(country)
+    await invalidate_country(country.id)
 
     ip_addr = request.headers.get("x-forwarded-for") or (request.client.host if request.client else None)
     ua = request.headers.get("user-agent")
@@ -26,14 +26,14 @@ from pydantic import BaseModel, EmailStr
 from sqlalchemy import select, update, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db
+from app.core.database import get_admin_db, get_db
 from app.core.security import audit_log
 from app.core.config import settings
 from app.dependencies.auth import get_current_user, CurrentUser
 from app.models.lead import Lead, LeadStatus, LeadSource
 from app.models.consent import UserConsent
 from app.services.encryption_service import encrypt_personal_data, decrypt_personal_data
-from app.tasks.notifications import notify_admins_new_lead
+from app.tasks.dispatch import NOTIFY_NEW_LEAD, send_task
 
 logger = logging.getLogger("api.leads")
 router = APIRouter()
@@ -89,12 +89,12 @@ async def create_lead(
 
     # Celery-уведомление админам (оборачиваем, чтобы отсутствие брокера не падало API)
     try:
-        notify_admins_new_lead.delay(
+        send_task(NOTIFY_NEW_LEAD, args=[
             str(lead.id),
             lead.status.value,
             lead.source.value,
             lead.created_at.isoformat() if lead.created_at else "",
-        )
+        ])
     except Exception:
         logger.warning("Celery notification failed or not configured")
 
@@ -105,7 +105,7 @@ async def create_lead(
 @audit_log(action="lead_list", target="lead")
 async def list_leads(
     user: CurrentUser = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_admin_db),
 ) -> List[Dict[str, Any]]:
     """Возвращает только метаданные: id, статус, дата создания (без ПД)."""
     res = await db.execute(select(Lead))
@@ -125,7 +125,7 @@ async def get_lead(
     id: UUID,
     request: Request,
     user: CurrentUser = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_admin_db),
 ) -> Dict[str, Any]:
     """Возвращает один лид с расшифрованными ПД (аудит просмотра)."""
     res = await db.execute(select(Lead).where(Lead.id == id))
@@ -153,7 +153,7 @@ async def update_lead_status(
     id: UUID,
     payload: LeadStatusUpdate,
     user: CurrentUser = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_admin_db),
 ) -> Dict[str, Any]:
     """Изменяет статус лида."""
     res = await db.execute(select(Lead).where(Lead.id == id))
@@ -173,7 +173,7 @@ async def update_lead_status(
 async def delete_lead(
     id: UUID,
     user: CurrentUser = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_admin_db),
 ) -> Dict[str, Any]:
     """Безвозвратно удаляет лид (по запросу пользователя, проверка прав)."""
     # Проверка прав: допускаем только администратора
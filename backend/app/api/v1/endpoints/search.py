@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import logging
+
+from fastapi import APIRouter, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import with_session
+from app.core.response_cache import cached_json_response
+from app.core.config import settings
+from app.schemas.search import SuggestResults
+from app.services import suggest as suggest_service
+
+logger = logging.getLogger("api.search")
+router = APIRouter()
+
+
+@router.get("/suggest", response_model=SuggestResults, response_model_exclude_none=True)
+async def suggest(
+    q: str = Query(..., description="Начало запроса из поисковой строки"),
+    limit: int = Query(settings.SEARCH_SUGGEST_LIMIT, ge=1, le=20),
+) -> Response:
+    """Подсказки: страны и услуги (из памяти воркера) и статьи (pg_trgm), устойчивые к опечаткам."""
+    query = suggest_service.normalize_query(q)
+    if not query:
+        return SuggestResults(query="", items=[])
+
+    async def load(db: AsyncSession) -> SuggestResults:
+        return SuggestResults(query=query, items=await suggest_service.suggest(db, query, limit))
+
+    # Без тегов: вариантов префиксов много, они живут SEARCH_SUGGEST_TTL_SECONDS и не перезапрашиваются в nginx
+    return await cached_json_response(
+        suggest_service.cache_key(query, limit),
+        with_session(load, read=True),
+        SuggestResults,
+        ttl_seconds=settings.SEARCH_SUGGEST_TTL_SECONDS,
+    )
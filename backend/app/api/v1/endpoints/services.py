@@ -1,56 +1,59 @@
 from __future__ import annotations
 
 import logging
-from typing import List
+from typing import List, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db
-from app.core.cache import cache_get, cache_set
+from app.core.database import get_admin_db, with_session
+from app.core.response_cache import cached_json_response
+from app.core.config import settings
 from app.dependencies.auth import get_current_user, CurrentUser
 from app.models.service import Service
 from app.models.country import Country
 from app.models.audit_log import AuditLog
 from app.schemas.service import ServiceCreate, ServiceUpdate, ServiceOut
+from app.services.cache_invalidation import SERVICES_LIST, country_tag, invalidate_service
 
 logger = logging.getLogger("api.services")
 router = APIRouter()
 
 
 @router.get("/", response_model=List[ServiceOut], response_model_exclude_none=True)
-async def list_services(db: AsyncSession = Depends(get_db)) -> List[ServiceOut]:
-    logger.info("List services")
+async def list_services() -> Response:
+    logger.debug("List services")
     cache_key = "services:list"
-    cached = await cache_get(cache_key)
-    if cached:
-        return [ServiceOut(**s) for s in cached]
 
-    res = await db.execute(select(Service))
-    items = [ServiceOut.model_validate(s, from_attributes=True) for s in res.scalars().all()]
-    await cache_set(cache_key, [i.model_dump() for i in items])
-    return items
+    async def load(db: AsyncSession) -> List[ServiceOut]:
+        res = await db.execute(select(Service))
+        return [ServiceOut.model_validate(s, from_attributes=True) for s in res.scalars().all()]
+
+    return await cached_json_response(cache_key, with_session(load, read=True), List[ServiceOut], ttl_seconds=settings.CACHE_CONTENT_TTL_SECONDS, tags=[SERVICES_LIST])
 
 
 @router.get("/by-country/{country_code}", response_model=List[ServiceOut], response_model_exclude_none=True)
-async def services_by_country(country_code: str, db: AsyncSession = Depends(get_db)) -> List[ServiceOut]:
-    logger.info("List services by country: %s", country_code)
+async def services_by_country(country_code: str) -> Response:
+    logger.debug("List services by country: %s", country_code)
     cache_key = f"services:country:{country_code}"
-    cached = await cache_get(cache_key)
-    if cached:
-        return [ServiceOut(**s) for s in cached]
+    country_id: Optional[UUID] = None
+
+    async def load(db: AsyncSession) -> List[ServiceOut]:
+        nonlocal country_id
+        cres = await db.execute(select(Country).where(Country.code == country_code))
+        country = cres.scalars().first()
+        if not country:
+            raise HTTPException(status_code=404, detail="Country not found")
+        country_id = country.id
 
-    cres = await db.execute(select(Country).where(Country.code == country_code))
-    country = cres.scalars().first()
-    if not country:
-        raise HTTPException(status_code=404, detail="Country not found")
+        sres = await db.execute(select(Service).where(Service.country_id == country.id))
+        return [ServiceOut.model_validate(s, from_attributes=True) for s in sres.scalars().all()]
 
-    sres = await db.execute(select(Service).where(Service.country_id == country.id))
-    items = [ServiceOut.model_validate(s, from_attributes=True) for s in sres.scalars().all()]
-    await cache_set(cache_key, [i.model_dump() for i in items])
-    return items
+    return await cached_json_response(
+        cache_key, with_session(load, read=True), List[ServiceOut], ttl_seconds=settings.CACHE_CONTENT_TTL_SECONDS, tags=lambda _: [country_tag(country_id)]
+    )
 
 
 @router.post("/", response_model=ServiceOut, response_model_exclude_none=True, status_code=status.HTTP_201_CREATED)
@@ -58,7 +61,7 @@ async def create_service(
     payload: ServiceCreate,
     request: Request,
     user: CurrentUser = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_admin_db),
 ) -> ServiceOut:
     logger.info("Create service type=%s for country=%s by %s", payload.service_type, payload.country_id, user.email)
 
@@ -80,6 +83,7 @@ async def create_service(
     db.add(service)
     await db.commit()
     await db.refresh(service)
+    await invalidate_service(service.id, service.country_id)
 
     ip_addr = request.headers.get("x-forwarded-for") or (request.client.host if request.client else None)
     ua = request.headers.get("user-agent")
@@ -105,7 +109,7 @@ async def update_service(
     payload: ServiceUpdate,
     request: Request,
     user: CurrentUser = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_admin_db),
 ) -> ServiceOut:
     logger.info("Update service %s by %s", id, user.email)
     res = await db.execute(select(Service).where(Service.id == id))
@@ -118,6 +122,7 @@ async def update_service(
 
     await db.commit()
     await db.refresh(service)
+    await invalidate_service(service.id, service.country_id)
 
     ip_addr = request.headers.get("x-forwarded-for") or (request.client.host if request.client else None)
     ua = request.headers.get("user-agent")
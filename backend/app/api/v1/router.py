@@ -13,6 +13,7 @@ from app.api.v1.endpoints import (
     audit,
     auto_publish,
     case_studies,
+    search,
 )
 
 api_router = APIRouter()
@@ -25,4 +26,5 @@ api_router.include_router(seo.router, prefix="/seo", tags=["seo"])
 api_router.include_router(consents.router, prefix="/consents", tags=["consents"])
 api_router.include_router(audit.router, prefix="/audit", tags=["audit"]) 
 api_router.include_router(auto_publish.router, prefix="/auto-publish", tags=["auto_publish"])
-api_router.include_router(case_studies.router, prefix="/case-studies", tags=["case_studies"])
\ No newline at end of file
+api_router.include_router(case_studies.router, prefix="/case-studies", tags=["case_studies"])
+api_router.include_router(search.router, prefix="/search", tags=["search"])
\ No newline at end of file
@@ -1,65 +1,741 @@
+import asyncio
 import json
 import logging
+import math
+import random
 import time
-from typing import Any, Optional
-
-try:
-    import redis.asyncio as aioredis
-except Exception:
-    aioredis = None
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Mapping, Optional, Sequence, Union
 
+from app.core.cache_metrics import metrics
 from app.core.config import settings
+from app.core.redis_client import get_redis, redis_stats
+from app.core import server_timing
 
 logger = logging.getLogger("core.cache")
 
-_redis: Optional["aioredis.Redis"] = None
-_mem_cache: dict[str, tuple[str, float]] = {}
+TAG_PREFIX = "cache:tag:"
+LOCK_PREFIX = "cache:lock:"
+# Счётчик поколений инвалидаций (см. app.core.cache_bus)
+GENERATION_KEY = "cache:generation"
 
+# Загрузки, выполняющиеся в текущем воркере: key -> задача загрузчика (single-flight)
+_inflight: dict[str, "asyncio.Future[Any]"] = {}
 
-def get_redis() -> Optional["aioredis.Redis"]:
-    global _redis
-    if aioredis is None:
-        return None
-    if _redis is None and settings.effective_redis_url:
-        _redis = aioredis.from_url(settings.effective_redis_url, encoding="utf-8", decode_responses=True)
-    return _redis
+# SET значения + регистрация ключа в множествах тегов одной атомарной операцией.
+# TTL множества тега только продлевается, чтобы не «потерять» долгоживущие ключи.
+# KEYS[1] — ключ кэша, KEYS[2..] — множества тегов; ARGV[1] — значение, ARGV[2] — TTL
+_SET_WITH_TAGS_LUA = """
+local ttl = tonumber(ARGV[2])
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ttl)
+for i = 2, #KEYS do
+  redis.call('SADD', KEYS[i], KEYS[1])
+  if redis.call('TTL', KEYS[i]) < ttl then
+    redis.call('EXPIRE', KEYS[i], ttl)
+  end
+end
+return 1
+"""
 
+# Удаление всех ключей, зарегистрированных под тегами, вместе с самими множествами тегов;
+# в той же операции увеличивается поколение и остальным воркерам публикуется, что чистить в L1.
+# KEYS[1] — счётчик поколений, KEYS[2..] — множества тегов; ARGV[1] — канал ("" — не публиковать),
+# ARGV[2..] — имена тегов. Возвращает список удалённых ключей (для чистки L1)
+_INVALIDATE_TAGS_LUA = """
+local removed = {}
+for i = 2, #KEYS do
+  local members = redis.call('SMEMBERS', KEYS[i])
+  for _, key in ipairs(members) do
+    redis.call('DEL', key)
+    table.insert(removed, key)
+  end
+  redis.call('DEL', KEYS[i])
+end
+local gen = redis.call('INCR', KEYS[1])
+if ARGV[1] ~= '' then
+  local tags = {}
+  for i = 2, #ARGV do
+    table.insert(tags, ARGV[i])
+  end
+  redis.call('PUBLISH', ARGV[1], cjson.encode({gen = gen, tags = tags, keys = removed}))
+end
+return removed
+"""
 
-def _mem_cache_get(key: str) -> Optional[Any]:
-    item = _mem_cache.get(key)
-    if not item:
-        return None
-    val, exp = item
-    if exp < time.time():
-        _mem_cache.pop(key, None)
-        return None
+# Снятие блокировки только её владельцем
+_RELEASE_LOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _tag_key(tag: str) -> str:
+    return f"{TAG_PREFIX}{tag}"
+
+
+class LRUCache:
+    """Ограниченный (по числу записей и байтам) LRU с TTL; хранит сериализованные значения (bytes).
+
+    Используется как L1 перед Redis для горячих префиксов и как фолбэк, когда Redis недоступен.
+    """
+
+    SWEEP_INTERVAL_SECONDS = 60
+
+    def __init__(self, max_entries: int, max_bytes: int) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # key -> (value, expires_at, size, tags)
+        self._data: "OrderedDict[str, tuple[bytes, float, int, tuple[str, ...]]]" = OrderedDict()
+        self._tags: dict[str, set[str]] = {}
+        self._last_sweep = time.monotonic()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        if item[1] < time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[0]
+
+    def set(self, key: str, value: bytes, ttl_seconds: int, tags: Iterable[str] = ()) -> None:
+        size = len(value)
+        self._remove(key)
+        if size > self.max_bytes:
+            return
+        tags = tuple(tags)
+        self._data[key] = (value, time.monotonic() + ttl_seconds, size, tags)
+        self.bytes += size
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        self._shrink()
+
+    def delete(self, key: str) -> bool:
+        return self._remove(key)
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        removed = 0
+        for tag in tags:
+            for key in list(self._tags.get(tag, ())):
+                removed += int(self._remove(key))
+        return removed
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._tags.clear()
+        self.bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._data),
+            "bytes": self.bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def _remove(self, key: str) -> bool:
+        item = self._data.pop(key, None)
+        if item is None:
+            return False
+        self.bytes -= item[2]
+        for tag in item[3]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+        return True
+
+    def _sweep_expired(self, now: float) -> None:
+        self._last_sweep = now
+        for key in [k for k, item in self._data.items() if item[1] < now]:
+            self._remove(key)
+            self.expirations += 1
+
+    def _shrink(self) -> None:
+        now = time.monotonic()
+        over = len(self._data) > self.max_entries or self.bytes > self.max_bytes
+        if over or now - self._last_sweep > self.SWEEP_INTERVAL_SECONDS:
+            self._sweep_expired(now)
+        # Затем вытесняем давно не использованные записи
+        while len(self._data) > self.max_entries or self.bytes > self.max_bytes:
+            self._remove(next(iter(self._data)))
+            self.evictions += 1
+
+
+_l1 = LRUCache(settings.CACHE_L1_MAX_ENTRIES, settings.CACHE_L1_MAX_BYTES)
+_L1_PREFIXES = tuple(settings.CACHE_L1_PREFIXES)
+
+
+def _l1_enabled(key: str) -> bool:
+    return bool(_L1_PREFIXES) and key.startswith(_L1_PREFIXES)
+
+
+def _loads(val: Optional[bytes]) -> Optional[Any]:
     return json.loads(val) if val else None
 
 
-def _mem_cache_set(key: str, value: Any, ttl_seconds: int = 300) -> None:
-    exp = time.time() + ttl_seconds
-    _mem_cache[key] = (json.dumps(value, default=str), exp)
+def _fallback_get(key: str, l1: bool) -> Optional[bytes]:
+    """Redis недоступен: для ключей вне L1 смотрим в память (там же лежат записи фолбэка)."""
+    metrics.fallback(key)
+    val = None if l1 else _l1.get(key)
+    if val is None:
+        metrics.miss(key)
+    else:
+        metrics.hit(key, "memory")
+    return val
 
 
-async def cache_get(key: str) -> Optional[Any]:
+def _redis_timing(key: str, op: str, started: float) -> None:
+    # Гистограмма задержек Redis и отрезок cache в Server-Timing текущего запроса
+    elapsed = time.perf_counter() - started
+    metrics.redis_latency(key, op, elapsed)
+    server_timing.add("cache", elapsed)
+
+
+async def cache_get_raw(key: str) -> Optional[bytes]:
+    """Сырые байты по ключу: L1 (для включённых префиксов) -> Redis -> L1 как фолбэк."""
+    l1 = _l1_enabled(key)
+    if l1:
+        val = _l1.get(key)
+        if val is not None:
+            metrics.hit(key, "l1")
+            return val
     try:
         r = get_redis()
         if r is None:
-            return _mem_cache_get(key)
+            return _fallback_get(key, l1)
+        started = time.perf_counter()
         val = await r.get(key)
-        return json.loads(val) if val else None
+        _redis_timing(key, "get", started)
     except Exception as e:
         logger.warning("Redis cache_get failed for key %s: %s", key, e)
-        return _mem_cache_get(key)
+        metrics.error(key, "get")
+        return _fallback_get(key, l1)
+    if val:
+        metrics.hit(key, "redis")
+        if l1:
+            _l1.set(key, val, settings.CACHE_L1_TTL_SECONDS)
+    else:
+        metrics.miss(key)
+    return val
 
 
-async def cache_set(key: str, value: Any, ttl_seconds: int = 300) -> None:
+async def cache_set_raw(key: str, data: bytes, ttl_seconds: int = 300, tags: Optional[Iterable[str]] = None) -> None:
+    """Сохраняет байты; если переданы tags — регистрирует ключ под ними для cache_invalidate_tags."""
+    tags = list(tags or ())
+    metrics.stored(key, len(data))
+    if _l1_enabled(key):
+        _l1.set(key, data, min(ttl_seconds, settings.CACHE_L1_TTL_SECONDS), tags)
     try:
         r = get_redis()
         if r is None:
-            _mem_cache_set(key, value, ttl_seconds)
+            metrics.fallback(key)
+            _l1.set(key, data, ttl_seconds, tags)
             return
-        await r.set(key, json.dumps(value, default=str), ex=ttl_seconds)
+        started = time.perf_counter()
+        if tags:
+            await r.eval(_SET_WITH_TAGS_LUA, 1 + len(tags), key, *[_tag_key(t) for t in tags], data, ttl_seconds)
+        else:
+            await r.set(key, data, ex=ttl_seconds)
+        _redis_timing(key, "set", started)
     except Exception as e:
         logger.warning("Redis cache_set failed for key %s: %s", key, e)
-        _mem_cache_set(key, value, ttl_seconds)
\ No newline at end of file
+        metrics.error(key, "set")
+        _l1.set(key, data, ttl_seconds, tags)
+
+
+async def cache_get(key: str) -> Optional[Any]:
+    return _loads(await cache_get_raw(key))
+
+
+async def cache_set(key: str, value: Any, ttl_seconds: int = 300, tags: Optional[Iterable[str]] = None) -> None:
+    await cache_set_raw(key, json.dumps(value, default=str).encode("utf-8"), ttl_seconds, tags)
+
+
+async def cache_get_many_raw(keys: Sequence[str]) -> Dict[str, Optional[bytes]]:
+    """Сырые байты по нескольким ключам: L1, затем один MGET для остальных (фолбэк — как в cache_get_raw)."""
+    out: Dict[str, Optional[bytes]] = {}
+    remote: List[str] = []
+    for key in dict.fromkeys(keys):
+        if _l1_enabled(key):
+            val = _l1.get(key)
+            if val is not None:
+                metrics.hit(key, "l1")
+                out[key] = val
+                continue
+        remote.append(key)
+    if not remote:
+        return out
+    try:
+        r = get_redis()
+        if r is None:
+            out.update((key, _fallback_get(key, _l1_enabled(key))) for key in remote)
+            return out
+        started = time.perf_counter()
+        values = await r.mget(remote)
+        _redis_timing(remote[0], "mget", started)
+    except Exception as e:
+        logger.warning("Redis cache_get_many failed for %d keys: %s", len(remote), e)
+        for key in remote:
+            metrics.error(key, "mget")
+            out[key] = _fallback_get(key, _l1_enabled(key))
+        return out
+    for key, val in zip(remote, values):
+        if val:
+            metrics.hit(key, "redis")
+            if _l1_enabled(key):
+                _l1.set(key, val, settings.CACHE_L1_TTL_SECONDS)
+        else:
+            metrics.miss(key)
+        out[key] = val
+    return out
+
+
+async def cache_set_many_raw(
+    entries: Mapping[str, bytes],
+    ttl_seconds: int = 300,
+    tags: Optional[Mapping[str, Iterable[str]]] = None,
+) -> None:
+    """Сохраняет несколько записей одним конвейером Redis; tags — теги по ключам (необязательно)."""
+    if not entries:
+        return
+    key_tags = {key: list((tags or {}).get(key) or ()) for key in entries}
+    for key, data in entries.items():
+        metrics.stored(key, len(data))
+        if _l1_enabled(key):
+            _l1.set(key, data, min(ttl_seconds, settings.CACHE_L1_TTL_SECONDS), key_tags[key])
+    try:
+        r = get_redis()
+        if r is None:
+            for key, data in entries.items():
+                metrics.fallback(key)
+                _l1.set(key, data, ttl_seconds, key_tags[key])
+            return
+        started = time.perf_counter()
+        # Без MULTI: атомарность нужна только внутри записи (её даёт Lua), а не всего пакета
+        pipe = r.pipeline(transaction=False)
+        for key, data in entries.items():
+            if key_tags[key]:
+                pipe.eval(_SET_WITH_TAGS_LUA, 1 + len(key_tags[key]), key, *[_tag_key(t) for t in key_tags[key]], data, ttl_seconds)
+            else:
+                pipe.set(key, data, ex=ttl_seconds)
+        await pipe.execute()
+        _redis_timing(next(iter(entries)), "pipeline", started)
+    except Exception as e:
+        logger.warning("Redis cache_set_many failed for %d keys: %s", len(entries), e)
+        for key, data in entries.items():
+            metrics.error(key, "pipeline")
+            _l1.set(key, data, ttl_seconds, key_tags[key])
+
+
+async def cache_get_many(keys: Sequence[str]) -> Dict[str, Optional[Any]]:
+    return {key: _loads(val) for key, val in (await cache_get_many_raw(keys)).items()}
+
+
+async def cache_set_many(
+    values: Mapping[str, Any],
+    ttl_seconds: int = 300,
+    tags: Optional[Mapping[str, Iterable[str]]] = None,
+) -> None:
+    entries = {key: json.dumps(value, default=str).encode("utf-8") for key, value in values.items()}
+    await cache_set_many_raw(entries, ttl_seconds, tags)
+
+
+async def cache_invalidate_tags(*tags: str) -> int:
+    """Атомарно удаляет все ключи, зарегистрированные под тегами (Redis и L1 всех воркеров через шину)."""
+    tags = tuple(dict.fromkeys(t for t in tags if t))
+    if not tags:
+        return 0
+    # L1 чистится всегда: записи могли попасть туда во время недоступности Redis
+    removed = _l1.invalidate_tags(tags)
+    try:
+        r = get_redis()
+        if r is not None:
+            channel = settings.CACHE_BUS_CHANNEL if settings.CACHE_BUS_ENABLED else ""
+            keys = await r.eval(
+                _INVALIDATE_TAGS_LUA, 1 + len(tags), GENERATION_KEY, *[_tag_key(t) for t in tags], channel, *tags
+            ) or []
+            # Копии в L1, заполненные чтением из Redis, не знают своих тегов — удаляем по ключам
+            for key in keys:
+                _l1.delete(key.decode() if isinstance(key, bytes) else key)
+            removed = max(removed, len(keys))
+    except Exception as e:
+        logger.warning("Redis cache_invalidate_tags failed for tags %s: %s", tags, e)
+    return removed
+
+
+def cache_stats() -> Dict[str, Any]:
+    """Метрики кэша текущего воркера: по префиксам ключей и счётчики L1 (hit/miss/eviction, объём)."""
+    return {**metrics.snapshot(), "l1": _l1.stats(), "redis": redis_stats()}
+
+
+def cache_metrics_text() -> str:
+    """Те же метрики в текстовом формате Prometheus."""
+    l1 = _l1.stats()
+    circuit = redis_stats()["async"]
+    return metrics.render_prometheus({
+        "redis_circuit_open": (int(circuit["state"] != "closed"), "1 while the Redis circuit breaker is open or half-open"),
+        "redis_circuit_opens": (circuit["opens_total"], "Times the Redis circuit breaker has opened since start"),
+        "redis_circuit_failures": (circuit["failures_total"], "Redis connection failures seen by the circuit breaker"),
+        "cache_l1_entries": (l1["entries"], "Entries in the in-process L1 cache"),
+        "cache_l1_bytes": (l1["bytes"], "Bytes held by the in-process L1 cache"),
+        "cache_l1_evictions": (l1["evictions"], "LRU evictions from the L1 cache since start"),
+    })
+
+
+# ------------------------- Single-flight и stale-while-revalidate -------------------------
+TagsArg = Union[Iterable[str], Callable[[Any], Iterable[str]]]
+
+CACHE_HIT = "HIT"
+CACHE_MISS = "MISS"
+CACHE_STALE = "STALE"
+CACHE_STALE_IF_ERROR = "STALE-IF-ERROR"
+
+
+@dataclass
+class CacheResult:
+    value: Any
+    status: str
+    age: int = 0
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        """Заголовки, по которым видно, что ответ отдан из кэша и насколько он устарел."""
+        if self.status == CACHE_MISS:
+            return {"X-Cache-Status": self.status}
+        return {"X-Cache-Status": self.status, "Age": str(self.age)}
+
+
+@dataclass
+class RawValue:
+    """Готовые байты (например, тело HTTP-ответа) с метаданными: кэшируются без JSON-кодирования.
+
+    variants — альтернативные представления тех же данных (например, сжатые gzip/br),
+    хранятся в той же записи следом за data.
+    """
+    data: bytes
+    meta: Dict[str, Any] = field(default_factory=dict)
+    variants: Dict[str, bytes] = field(default_factory=dict)
+
+
+def _pack_entry(value: Any, created_at: float, duration: float) -> bytes:
+    """Запись cache_fetch: JSON-заголовок {t, d[, m, x]}, перевод строки и тело (JSON либо сырые байты).
+
+    Для RawValue с вариантами x — длины вариантов, их байты идут сразу после data.
+    """
+    head: Dict[str, Any] = {"t": created_at, "d": round(duration, 4)}
+    if isinstance(value, RawValue):
+        head["m"] = value.meta
+        body = value.data
+        if value.variants:
+            head["x"] = {name: len(data) for name, data in value.variants.items()}
+            body = b"".join([body, *value.variants.values()])
+    else:
+        body = json.dumps(value, default=str).encode("utf-8")
+    # json.dumps экранирует переводы строк, поэтому первый b"\n" всегда отделяет заголовок
+    return json.dumps(head).encode("utf-8") + b"\n" + body
+
+
+def _unpack_entry(raw: Optional[bytes]) -> Optional[dict]:
+    """Обратное к _pack_entry: {"v": значение, "t": время записи, "d": длительность загрузки}."""
+    if not raw:
+        return None
+    head_raw, sep, body = raw.partition(b"\n")
+    if not sep:
+        return None
+    try:
+        head = json.loads(head_raw)
+        value = _unpack_raw(head, body) if "m" in head else json.loads(body)
+        return {"v": value, "t": float(head["t"]), "d": float(head.get("d") or 0.0)}
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def _unpack_raw(head: Dict[str, Any], body: bytes) -> RawValue:
+    sizes: Dict[str, int] = head.get("x") or {}
+    # Варианты лежат в конце тела в порядке заголовка
+    offset = len(body) - sum(sizes.values())
+    if offset < 0:
+        raise ValueError("corrupted cache entry")
+    data, variants = body[:offset], {}
+    for name, size in sizes.items():
+        variants[name] = body[offset:offset + size]
+        offset += size
+    return RawValue(data, head["m"], variants)
+
+
+def _should_refresh_early(entry: dict, ttl_seconds: int) -> bool:
+    """XFetch: чем ближе истечение и дороже загрузка, тем выше шанс обновить ключ заранее."""
+    beta = settings.CACHE_EARLY_REFRESH_BETA
+    if beta <= 0:
+        return False
+    delta = float(entry.get("d") or 0.0)
+    expires_at = float(entry["t"]) + ttl_seconds
+    return time.time() - delta * beta * math.log(1.0 - random.random()) >= expires_at
+
+
+async def _acquire_lock(key: str) -> Optional[str]:
+    """Возвращает токен блокировки, "" если Redis недоступен (грузим сами), None если занято."""
+    r = get_redis()
+    if r is None:
+        return ""
+    token = uuid.uuid4().hex
+    try:
+        acquired = await r.set(LOCK_PREFIX + key, token, nx=True, px=int(settings.CACHE_LOCK_TTL_SECONDS * 1000))
+    except Exception as e:
+        logger.warning("Redis lock failed for key %s: %s", key, e)
+        return ""
+    return token if acquired else None
+
+
+async def _release_lock(key: str, token: str) -> None:
+    if not token:
+        return
+    try:
+        r = get_redis()
+        if r is not None:
+            await r.eval(_RELEASE_LOCK_LUA, 1, LOCK_PREFIX + key, token)
+    except Exception as e:
+        logger.warning("Redis unlock failed for key %s: %s", key, e)
+
+
+async def _wait_for_fill(key: str, outdated: Optional[dict] = None) -> Optional[dict]:
+    """Ждёт, пока другой процесс, держащий блокировку, заполнит ключ.
+
+    outdated — запись, которую вызывающий уже прочитал и отверг как устаревшую: она хранится
+    дольше окна stale, поэтому принимается только запись новее неё.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.CACHE_LOCK_WAIT_SECONDS
+    while loop.time() < deadline:
+        await asyncio.sleep(settings.CACHE_LOCK_POLL_SECONDS)
+        entry = _unpack_entry(await cache_get_raw(key))
+        if entry is not None and (outdated is None or float(entry["t"]) > float(outdated["t"])):
+            return entry
+    return None
+
+
+async def _load_and_store(
+    key: str,
+    loader: Callable[[], Awaitable[Any]],
+    ttl_seconds: int,
+    tags: Optional[TagsArg],
+    current: Optional[dict],
+    outdated: Optional[dict] = None,
+) -> Any:
+    token = await _acquire_lock(key)
+    if token is None:
+        # Ключ пересобирает другой процесс: отдаём текущее значение или ждём нового
+        if current is not None:
+            return current["v"]
+        entry = await _wait_for_fill(key, outdated)
+        if entry is not None:
+            return entry["v"]
+        logger.warning("Cache lock wait timed out for key %s, loading directly", key)
+    try:
+        started = time.monotonic()
+        value = await loader()
+        entry = _pack_entry(value, time.time(), time.monotonic() - started)
+        await cache_set_raw(key, entry, ttl_seconds=ttl_seconds, tags=tags(value) if callable(tags) else tags)
+        return value
+    finally:
+        await _release_lock(key, token or "")
+
+
+def _start_load(
+    key: str,
+    loader: Callable[[], Awaitable[Any]],
+    ttl_seconds: int,
+    tags: Optional[TagsArg],
+    current: Optional[dict],
+    outdated: Optional[dict] = None,
+) -> "asyncio.Future[Any]":
+    task = _inflight.get(key)
+    if task is None:
+        # Загрузка идёт отдельной задачей: отмена первого запроса не рушит остальных ожидающих
+        task = asyncio.ensure_future(_load_and_store(key, loader, ttl_seconds, tags, current, outdated))
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _inflight.pop(key, None) if _inflight.get(key) is t else None)
+    return task
+
+
+def pending_loads() -> List["asyncio.Future[Any]"]:
+    """Загрузки и фоновые обновления ключей, которые ещё идут (дожидаются при остановке воркера)."""
+    return list(_inflight.values())
+
+
+def _log_refresh_failure(key: str, task: "asyncio.Future[Any]") -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("Background cache refresh failed for key %s: %s", key, task.exception())
+
+
+def _refresh_in_background(
+    key: str,
+    loader: Callable[[], Awaitable[Any]],
+    ttl_seconds: int,
+    tags: Optional[TagsArg],
+    current: dict,
+) -> None:
+    if key in _inflight:
+        return
+    task = _start_load(key, loader, ttl_seconds, tags, current)
+    task.add_done_callback(lambda t: _log_refresh_failure(key, t))
+
+
+async def cache_fetch(
+    key: str,
+    loader: Callable[[], Awaitable[Any]],
+    ttl_seconds: int = 300,
+    tags: Optional[TagsArg] = None,
+    stale_ttl_seconds: Optional[int] = None,
+    stale_if_error_seconds: Optional[int] = None,
+) -> CacheResult:
+    """Возвращает значение из кэша либо загружает его через loader ровно один раз.
+
+    tags — список тегов либо функция от загруженного значения (теги сущности известны после загрузки).
+    Loader возвращает JSON-совместимое значение либо RawValue (байты хранятся как есть).
+
+    Конкурентные промахи в воркере ждут одну задачу загрузки, между воркерами пересборку
+    выполняет владелец Redis-блокировки. Запись свежая ttl_seconds; следующие stale_ttl_seconds
+    она отдаётся сразу, а обновляется в фоне (как и при вероятностном раннем обновлении XFetch).
+    Если загрузка падает с ошибкой сервера, отдаётся последнее значение не старше
+    ttl_seconds + stale_if_error_seconds. Loader может пережить запрос, поэтому ему нужна
+    собственная сессия БД (см. app.core.database.with_session).
+    """
+    if stale_ttl_seconds is None:
+        stale_ttl_seconds = settings.CACHE_STALE_TTL_SECONDS
+    if stale_if_error_seconds is None:
+        stale_if_error_seconds = settings.CACHE_STALE_IF_ERROR_SECONDS
+    # Redis хранит запись до конца самого длинного «устаревшего» окна
+    store_ttl = ttl_seconds + max(stale_ttl_seconds, stale_if_error_seconds)
+
+    current = _unpack_entry(await cache_get_raw(key))
+    age = 0.0
+    if current is not None:
+        age = max(0.0, time.time() - float(current["t"]))
+        if age < ttl_seconds:
+            if _should_refresh_early(current, ttl_seconds):
+                _refresh_in_background(key, loader, store_ttl, tags, current)
+                metrics.fetched(key, "EARLY-REFRESH")
+            metrics.fetched(key, CACHE_HIT)
+            return CacheResult(current["v"], CACHE_HIT, int(age))
+        if age < ttl_seconds + stale_ttl_seconds:
+            _refresh_in_background(key, loader, store_ttl, tags, current)
+            metrics.fetched(key, CACHE_STALE)
+            return CacheResult(current["v"], CACHE_STALE, int(age))
+
+    try:
+        # Запись за окном stale (хранится до stale-if-error) ожидающий воркер не примет за новую
+        value = await asyncio.shield(_start_load(key, loader, store_ttl, tags, None, current))
+        metrics.fetched(key, CACHE_MISS)
+        return CacheResult(value, CACHE_MISS)
+    except Exception as e:
+        # 4xx (например, 404 из loader) — это ответ, а не сбой: его не маскируем
+        server_error = getattr(e, "status_code", 500) >= 500
+        if current is not None and server_error and age < ttl_seconds + stale_if_error_seconds:
+            logger.warning("Serving stale value for key %s (age %ss) after load error: %s", key, int(age), e)
+            metrics.fetched(key, CACHE_STALE_IF_ERROR)
+            return CacheResult(current["v"], CACHE_STALE_IF_ERROR, int(age))
+        if server_error:
+            metrics.error(key, "load")
+        raise
+
+
+async def cache_fetch_many(
+    keys: Mapping[Hashable, str],
+    loader: Callable[[List[Hashable]], Awaitable[Mapping[Hashable, Any]]],
+    ttl_seconds: int = 300,
+    tags: Optional[Callable[[Hashable, Any], Iterable[str]]] = None,
+    stale_if_error_seconds: Optional[int] = None,
+) -> Dict[Hashable, CacheResult]:
+    """Пакетный вариант cache_fetch: keys — {идентификатор: ключ кэша}.
+
+    Свежие записи берутся одним MGET, остальные идентификаторы (промахи и устаревшие записи)
+    передаются в loader одним списком — он загружает их одним запросом и возвращает
+    {идентификатор: значение}. Идентификаторы, которых loader не вернул, в результат не попадают.
+    Записи совместимы с cache_fetch: одиночные и пакетные запросы делят одни и те же ключи.
+    """
+    if stale_if_error_seconds is None:
+        stale_if_error_seconds = settings.CACHE_STALE_IF_ERROR_SECONDS
+    store_ttl = ttl_seconds + max(settings.CACHE_STALE_TTL_SECONDS, stale_if_error_seconds)
+
+    raw = await cache_get_many_raw(list(keys.values()))
+    now = time.time()
+    results: Dict[Hashable, CacheResult] = {}
+    stale: Dict[Hashable, tuple[dict, float]] = {}
+    missing: List[Hashable] = []
+    for ident, key in keys.items():
+        entry = _unpack_entry(raw.get(key))
+        age = max(0.0, now - float(entry["t"])) if entry is not None else 0.0
+        if entry is not None and age < ttl_seconds:
+            metrics.fetched(key, CACHE_HIT)
+            results[ident] = CacheResult(entry["v"], CACHE_HIT, int(age))
+            continue
+        if entry is not None:
+            stale[ident] = (entry, age)
+        missing.append(ident)
+    if not missing:
+        return results
+
+    try:
+        started = time.monotonic()
+        loaded = await loader(missing)
+        duration = (time.monotonic() - started) / len(missing)
+    except Exception as e:
+        if getattr(e, "status_code", 500) < 500:
+            raise
+        usable = {i: s for i, s in stale.items() if s[1] < ttl_seconds + stale_if_error_seconds}
+        if not usable:
+            for ident in missing:
+                metrics.error(keys[ident], "load")
+            raise
+        logger.warning("Serving %d stale values after batch load error: %s", len(usable), e)
+        for ident, (entry, age) in usable.items():
+            metrics.fetched(keys[ident], CACHE_STALE_IF_ERROR)
+            results[ident] = CacheResult(entry["v"], CACHE_STALE_IF_ERROR, int(age))
+        return results
+
+    created_at = time.time()
+    entries: Dict[str, bytes] = {}
+    entry_tags: Dict[str, List[str]] = {}
+    for ident in missing:
+        if ident not in loaded:
+            continue
+        value = loaded[ident]
+        key = keys[ident]
+        entries[key] = _pack_entry(value, created_at, duration)
+        if tags is not None:
+            entry_tags[key] = list(tags(ident, value))
+        metrics.fetched(key, CACHE_MISS)
+        results[ident] = CacheResult(value, CACHE_MISS)
+    await cache_set_many_raw(entries, ttl_seconds=store_ttl, tags=entry_tags)
+    return results
+
+
+async def cache_get_or_set(
+    key: str,
+    loader: Callable[[], Awaitable[Any]],
+    ttl_seconds: int = 300,
+    tags: Optional[TagsArg] = None,
+) -> Any:
+    """То же, что cache_fetch, но возвращает только значение."""
+    return (await cache_fetch(key, loader, ttl_seconds=ttl_seconds, tags=tags)).value
@@ -0,0 +1,138 @@
+"""
+Шина инвалидации L1 между воркерами.
+
+Каждый воркер держит свой L1 (LRUCache в app.core.cache). cache_invalidate_tags в одной
+Lua-операции удаляет ключи в Redis, увеличивает счётчик поколений cache:generation и
+публикует в CACHE_BUS_CHANNEL сообщение {gen, tags, keys}. Слушатель в каждом воркере
+удаляет из своего L1 записи с этими тегами и ключами.
+
+Сообщения pub/sub не гарантированы (разрыв соединения, перезапуск Redis), поэтому слушатель
+следит за поколением: пропуск номера в сообщениях или расхождение со счётчиком при
+периодической проверке означает, что часть инвалидаций потеряна, — тогда L1 воркера
+очищается целиком. Так горячие данные можно держать в памяти каждого воркера, не отдавая
+то, что уже обновили в другом.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Optional
+
+from app.core.cache import GENERATION_KEY, _l1
+from app.core.config import settings
+from app.core.database import fence_replica_reads
+from app.core.redis_client import get_redis
+
+logger = logging.getLogger("core.cache_bus")
+
+RECONNECT_MAX_SECONDS = 30.0
+
+
+class InvalidationListener:
+    def __init__(self) -> None:
+        self.generation: Optional[int] = None
+        self.connected = False
+        self.messages = 0
+        self.resyncs = 0
+        self._subscribed = False
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def start(self) -> None:
+        if not settings.CACHE_BUS_ENABLED or self._task is not None or get_redis() is None:
+            return
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        self.connected = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.CACHE_BUS_ENABLED,
+            "connected": self.connected,
+            "generation": self.generation,
+            "messages": self.messages,
+            "resyncs": self.resyncs,
+        }
+
+    def _resync(self, generation: int, reason: str) -> None:
+        """Часть инвалидаций могла быть пропущена: L1 этого воркера больше не доверяем."""
+        if self.generation is not None:
+            logger.warning("Cache bus %s (generation %s -> %s), clearing L1", reason, self.generation, generation)
+            _l1.clear()
+            self.resyncs += 1
+        self.generation = generation
+
+    def apply(self, data: bytes | str) -> None:
+        try:
+            message = json.loads(data)
+            gen = int(message["gen"])
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Malformed cache bus message: %r", data)
+            return
+        self.messages += 1
+        if self.generation is not None and gen != self.generation + 1:
+            if gen == self.generation:
+                return  # уже учтено периодической сверкой
+            self._resync(gen, "gap" if gen > self.generation else "reset")
+            return
+        # Данные изменились: загрузчики этого воркера какое-то время читают с основной БД, не с реплики
+        fence_replica_reads()
+        # cjson кодирует пустой список как {}, поэтому принимаем любой контейнер
+        _l1.invalidate_tags(list(message.get("tags") or ()))
+        for key in message.get("keys") or ():
+            _l1.delete(key)
+        self.generation = gen
+
+    async def _check_generation(self, r: Any) -> None:
+        current = int(await r.get(GENERATION_KEY) or 0)
+        if self.generation is None or current != self.generation:
+            self._resync(current, "generation mismatch")
+
+    async def _listen(self) -> None:
+        r = get_redis()
+        if r is None:
+            raise RuntimeError("Redis is unavailable")
+        pubsub = r.pubsub()
+        try:
+            # Сначала подписка, потом чтение счётчика: сообщения между ними не теряются
+            await pubsub.subscribe(settings.CACHE_BUS_CHANNEL)
+            await self._check_generation(r)
+            self.connected = self._subscribed = True
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=settings.CACHE_BUS_CHECK_SECONDS)
+                if message is not None:
+                    self.apply(message["data"])
+                    continue
+                # Тишина на канале: сверяем поколение (ловит сообщения, потерянные при разрыве)
+                await self._check_generation(r)
+        finally:
+            self.connected = False
+            await pubsub.aclose()
+
+    async def _run(self) -> None:
+        delay = 1.0
+        while True:
+            self._subscribed = False
+            try:
+                await self._listen()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Отступ растёт только при повторных отказах подключения; рабочее соединение его сбрасывает
+                if self._subscribed:
+                    delay = 1.0
+                logger.warning("Cache bus listener error: %s; reconnecting in %.0fs", e, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_SECONDS)
+
+
+invalidation_listener = InvalidationListener()
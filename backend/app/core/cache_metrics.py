@@ -0,0 +1,208 @@
+"""
+Метрики кэша по префиксам ключей.
+
+Ключи группируются по префиксам из CACHE_METRIC_PREFIXES (articles:list, articles:slug ...),
+остальные попадают в "other" — число меток ограничено и не зависит от параметров запросов.
+По каждому префиксу считаются попадания (L1/Redis/память), промахи, фолбэки в память при
+недоступном Redis, ошибки, гистограммы задержек Redis и размеров записей, статусы cache_fetch
+и число различных ключей (видно, какие варианты списков дробят пространство ключей).
+
+Счётчики живут в памяти воркера: в JSON-виде и на /metrics/cache они отражают только процесс,
+обработавший запрос; сумму по всем процессам отдаёт /metrics (app.core.metrics).
+"""
+from __future__ import annotations
+
+import time
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+OTHER_PREFIX = "other"
+
+# Границы бакетов: задержка Redis (секунды) и размер записи (байты)
+LATENCY_BUCKETS: Tuple[float, ...] = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+SIZE_BUCKETS: Tuple[float, ...] = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Сколько различных ключей помнить на префикс (дальше счётчик помечается как «не меньше»)
+MAX_TRACKED_KEYS = 10000
+
+
+class Histogram:
+    """Кумулятивная гистограмма в духе Prometheus: бакеты, сумма и количество наблюдений."""
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # последний — +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        out: List[Tuple[str, int]] = []
+        total = 0
+        for bound, cnt in zip((*self.buckets, float("inf")), self.counts):
+            total += cnt
+            out.append(("+Inf" if bound == float("inf") else fmt_value(bound), total))
+        return out
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "avg": round(self.sum / self.count, 6) if self.count else None,
+            "max": round(self.max, 6),
+            "buckets": dict(self.cumulative()),
+        }
+
+
+class PrefixStats:
+    def __init__(self) -> None:
+        self.hits: Dict[str, int] = {"l1": 0, "redis": 0, "memory": 0}
+        self.misses = 0
+        self.fallbacks = 0
+        self.errors: Dict[str, int] = {}
+        self.sets = 0
+        self.fetch: Dict[str, int] = {}
+        self.latency: Dict[str, Histogram] = {}
+        self.payload = Histogram(SIZE_BUCKETS)
+        self.keys: set[str] = set()
+
+    def snapshot(self) -> Dict[str, Any]:
+        hits = sum(self.hits.values())
+        lookups = hits + self.misses
+        return {
+            "hits": hits,
+            "hits_by_source": dict(self.hits),
+            "misses": self.misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else None,
+            "memory_fallbacks": self.fallbacks,
+            "errors": dict(self.errors),
+            "sets": self.sets,
+            "fetch_status": dict(self.fetch),
+            "redis_latency_seconds": {op: h.snapshot() for op, h in self.latency.items()},
+            "payload_bytes": self.payload.snapshot(),
+            "distinct_keys": len(self.keys),
+            "distinct_keys_capped": len(self.keys) >= MAX_TRACKED_KEYS,
+        }
+
+
+class CacheMetrics:
+    def __init__(self, prefixes: Sequence[str]) -> None:
+        # Длинные префиксы проверяются первыми (articles:slug раньше articles)
+        self.prefixes = tuple(sorted(prefixes, key=len, reverse=True))
+        self.started_at = time.time()
+        self._stats: Dict[str, PrefixStats] = {}
+
+    def prefix(self, key: str) -> str:
+        for p in self.prefixes:
+            if key.startswith(p):
+                return p
+        return OTHER_PREFIX
+
+    def _for(self, key: str) -> PrefixStats:
+        p = self.prefix(key)
+        stats = self._stats.get(p)
+        if stats is None:
+            stats = self._stats[p] = PrefixStats()
+        return stats
+
+    def hit(self, key: str, source: str) -> None:
+        self._for(key).hits[source] += 1
+
+    def miss(self, key: str) -> None:
+        self._for(key).misses += 1
+
+    def fallback(self, key: str) -> None:
+        self._for(key).fallbacks += 1
+
+    def error(self, key: str, op: str) -> None:
+        errors = self._for(key).errors
+        errors[op] = errors.get(op, 0) + 1
+
+    def redis_latency(self, key: str, op: str, seconds: float) -> None:
+        latency = self._for(key).latency
+        hist = latency.get(op)
+        if hist is None:
+            hist = latency[op] = Histogram(LATENCY_BUCKETS)
+        hist.observe(seconds)
+
+    def stored(self, key: str, size: int) -> None:
+        stats = self._for(key)
+        stats.sets += 1
+        stats.payload.observe(size)
+        if len(stats.keys) < MAX_TRACKED_KEYS:
+            stats.keys.add(key)
+
+    def fetched(self, key: str, status: str) -> None:
+        fetch = self._for(key).fetch
+        fetch[status] = fetch.get(status, 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "uptime_seconds": int(time.time() - self.started_at),
+            "prefixes": {p: s.snapshot() for p, s in sorted(self._stats.items())},
+        }
+
+    def render_prometheus(self, extra_gauges: Optional[Dict[str, Tuple[float, str]]] = None) -> str:
+        """Текстовый формат экспозиции Prometheus; extra_gauges — {имя: (значение, описание)}."""
+        lines: List[str] = []
+
+        def family(name: str, kind: str, help_text: str) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        items = sorted(self._stats.items())
+        family("cache_hits_total", "counter", "Cache hits by key prefix and source tier")
+        for p, s in items:
+            for source, cnt in s.hits.items():
+                lines.append(f'cache_hits_total{{prefix="{p}",source="{source}"}} {cnt}')
+        family("cache_misses_total", "counter", "Cache misses by key prefix")
+        for p, s in items:
+            lines.append(f'cache_misses_total{{prefix="{p}"}} {s.misses}')
+        family("cache_memory_fallbacks_total", "counter", "Lookups served by the in-process fallback while Redis was unavailable")
+        for p, s in items:
+            lines.append(f'cache_memory_fallbacks_total{{prefix="{p}"}} {s.fallbacks}')
+        family("cache_errors_total", "counter", "Cache errors by key prefix and operation (get, set, load)")
+        for p, s in items:
+            for op, cnt in s.errors.items():
+                lines.append(f'cache_errors_total{{prefix="{p}",op="{op}"}} {cnt}')
+        family("cache_fetch_total", "counter", "cache_fetch results by key prefix and status")
+        for p, s in items:
+            for status, cnt in s.fetch.items():
+                lines.append(f'cache_fetch_total{{prefix="{p}",status="{status}"}} {cnt}')
+        family("cache_redis_latency_seconds", "histogram", "Redis round-trip latency")
+        for p, s in items:
+            for op, hist in s.latency.items():
+                histogram_lines(lines, "cache_redis_latency_seconds", f'prefix="{p}",op="{op}"', hist)
+        family("cache_payload_bytes", "histogram", "Size of serialized cache entries written")
+        for p, s in items:
+            histogram_lines(lines, "cache_payload_bytes", f'prefix="{p}"', s.payload)
+        family("cache_distinct_keys", "gauge", "Distinct keys written per prefix (capped)")
+        for p, s in items:
+            lines.append(f'cache_distinct_keys{{prefix="{p}"}} {len(s.keys)}')
+        for name, (value, help_text) in (extra_gauges or {}).items():
+            family(name, "gauge", help_text)
+            lines.append(f"{name} {fmt_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def fmt_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) and not float(value).is_integer() else str(int(value))
+
+
+def histogram_lines(lines: List[str], name: str, labels: str, hist: Histogram) -> None:
+    for le, cnt in hist.cumulative():
+        lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cnt}')
+    lines.append(f"{name}_sum{{{labels}}} {fmt_value(hist.sum)}")
+    lines.append(f"{name}_count{{{labels}}} {hist.count}")
+
+
+metrics = CacheMetrics(settings.CACHE_METRIC_PREFIXES)
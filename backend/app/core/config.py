@@ -67,8 +67,140 @@ class Settings(BaseSettings):
 
     # Сервисные настройки
     BACKEND_PORT: int = 8000
-    BACKEND_WORKERS: int = 2
-    RATE_LIMIT_PER_MINUTE: int = 120
+    BACKEND_WORKERS: int = 0  # воркеров gunicorn; 0 — по числу CPU, доступных контейнеру
+    # Остановка воркера: сколько ждать завершения запросов и фоновых задач (кэш, прогрев, nginx)
+    SHUTDOWN_GRACE_SECONDS: int = 30
+    SHUTDOWN_DRAIN_SECONDS: float = 10.0
+    # Адаптивный предел одновременных запросов на воркер и сброс нагрузки по классам (503)
+    LOAD_SHED_ENABLED: bool = True
+    LOAD_SHED_MIN_LIMIT: int = 4
+    LOAD_SHED_MAX_LIMIT: int = 200
+    LOAD_SHED_TARGET_POOL_WAIT_MS: float = 50.0  # дольше ждали соединение из пула — перегрузка
+    LOAD_SHED_TARGET_LATENCY_MS: float = 2000.0
+    LOAD_SHED_DECREASE_FACTOR: float = 0.8
+    LOAD_SHED_DECREASE_COOLDOWN_SECONDS: float = 0.5
+    LOAD_SHED_CONTENT_SHARE: float = 0.6  # доля предела для анонимного чтения контента
+    LOAD_SHED_ADMIN_SHARE: float = 0.8  # для админки и выгрузок; заявкам доступен весь предел
+    LOAD_SHED_RETRY_AFTER_SECONDS: int = 5
+    # Rate limiting (GCRA): запросов в минуту с одного IP по классам маршрутов
+    RATE_LIMIT_PER_MINUTE: int = 120  # всё, что не попало в классы ниже
+    RATE_LIMIT_READ_PER_MINUTE: int = 600  # GET/HEAD /api/v1/* (в основном из кэша)
+    RATE_LIMIT_FORMS_PER_MINUTE: int = 10  # POST /leads и /consents
+    RATE_LIMIT_ADMIN_PER_MINUTE: int = 300  # /admin
+    RATE_LIMIT_BATCH_COST: int = 5  # стоимость пакетного запроса (/batch) в классе read
+    RATE_LIMIT_MEMORY_MAX_KEYS: int = 10000  # фолбэк без Redis: не больше стольких IP на воркер
+    # Прокси, которым доверяем X-Forwarded-For (nginx в docker-сети); остальным — адрес соединения
+    TRUSTED_PROXIES: List[str] = Field(
+        default_factory=lambda: ["127.0.0.1/32", "::1/128", "10.0.0.0/8", "172.16.0.0/12", "192.168.0.0/16"]
+    )
+    # Логи: JSON в stdout через очередь и фоновый поток; access-лог с выборкой успешных ответов
+    LOG_LEVEL: str = "INFO"
+    LOG_JSON: bool = True  # False — текстовые строки (удобнее при локальной разработке)
+    LOG_QUEUE_SIZE: int = 10000  # при переполнении записи отбрасываются, цикл событий не ждёт
+    ACCESS_LOG_SAMPLE_CACHED: float = 0.01  # доля успешных ответов из кэша (X-Cache-Status HIT/STALE)
+    ACCESS_LOG_SAMPLE_SUCCESS: float = 1.0  # доля прочих успешных ответов; ошибки пишутся всегда
+    ACCESS_LOG_SLOW_MS: int = 1000  # запросы дольше пишутся всегда
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0  # ожидание соединения в пуле primary (заявки и записи), секунды
+    # Пулы классов нагрузки к основной БД (app.core.database); размер 0 — класс берёт пул primary
+    DB_PUBLIC_POOL_SIZE: int = 5
+    DB_PUBLIC_MAX_OVERFLOW: int = 5
+    DB_PUBLIC_POOL_TIMEOUT: float = 5.0
+    DB_ADMIN_POOL_SIZE: int = 2
+    DB_ADMIN_MAX_OVERFLOW: int = 3
+    DB_ADMIN_POOL_TIMEOUT: float = 30.0
+    DB_AUDIT_POOL_SIZE: int = 1
+    DB_AUDIT_MAX_OVERFLOW: int = 2
+    DB_AUDIT_POOL_TIMEOUT: float = 5.0
+    DB_BACKGROUND_POOL_SIZE: int = 2
+    DB_BACKGROUND_MAX_OVERFLOW: int = 2
+    DB_BACKGROUND_POOL_TIMEOUT: float = 60.0
+    # Реплики для чтения (get_read_db): DSN через запятую; пусто — всё читается с основной БД
+    DATABASE_READ_URL: str = ""
+    DB_READ_POOL_SIZE: int = 5
+    DB_READ_MAX_OVERFLOW: int = 10
+    DB_REPLICA_RETRY_SECONDS: float = 30.0  # реплика после ошибки соединения исключается на это время
+    DB_REPLICA_CHECK_SECONDS: float = 5.0  # как часто проверять отставание реплики
+    DB_REPLICA_MAX_LAG_SECONDS: float = 10.0  # реплика с большим отставанием не используется
+    DB_READ_STICKY_SECONDS: int = 10  # после записи админ и пересборка кэша читают с основной БД
+    # HTTP-кэширование публичных GET (Cache-Control) и микро-кэш nginx перед API, секунды
+    HTTP_CACHE_MAX_AGE: int = 30  # браузер
+    HTTP_CACHE_S_MAXAGE: int = 60  # nginx (s-maxage)
+    HTTP_CACHE_STALE_WHILE_REVALIDATE: int = 300
+    HTTP_CACHE_STALE_IF_ERROR: int = 86400
+    # Внутренний адрес nginx для обновления микро-кэша после записи (например, http://nginx:8081);
+    # пусто — записи в nginx живут до истечения s-maxage
+    EDGE_CACHE_REFRESH_URL: Optional[str] = None
+    EDGE_CACHE_REFRESH_CONCURRENCY: int = 4
+    EDGE_CACHE_REFRESH_TIMEOUT_SECONDS: float = 5.0
+    # /metrics: сумма метрик всех процессов (снимки процессов в Redis)
+    METRICS_TOKEN: Optional[str] = None  # если задан — /metrics и /metrics/cache только с Authorization: Bearer <token>
+    METRICS_PUBLISH_SECONDS: float = 5.0
+    METRICS_PROCESS_TTL_SECONDS: int = 60  # снимок завершившегося процесса исчезает через столько
+    # Server-Timing (cache/db/build/serialize/handler): в dev — на всех ответах; в prod — по запросу
+    # администратора (X-Server-Timing: 1 и действующий Bearer-токен) и в доле SERVER_TIMING_SAMPLE_RATE
+    SERVER_TIMING_SAMPLE_RATE: float = 0.0
+
+    # Кэш: TTL публичного контента (ключи инвалидируются по тегам при записи)
+    CACHE_CONTENT_TTL_SECONDS: int = 3600
+    CACHE_SEARCH_TTL_SECONDS: int = 300  # выдача поиска по статьям (ключ — нормализованный запрос)
+    # L1: ограниченный LRU в памяти воркера перед Redis (только для перечисленных префиксов ключей)
+    CACHE_L1_PREFIXES: List[str] = Field(
+        default_factory=lambda: ["countries:", "services:", "articles:slug:", "case_studies:slug:", "search:suggest:"]
+    )
+    CACHE_L1_TTL_SECONDS: int = 30  # с шиной инвалидации (CACHE_BUS_ENABLED) можно держать дольше
+    CACHE_L1_MAX_ENTRIES: int = 2048
+    CACHE_L1_MAX_BYTES: int = 32 * 1024 * 1024
+    # Single-flight: межпроцессная блокировка на пересборку ключа и вероятностное раннее обновление
+    CACHE_LOCK_TTL_SECONDS: float = 10.0
+    CACHE_LOCK_WAIT_SECONDS: float = 3.0
+    CACHE_LOCK_POLL_SECONDS: float = 0.05
+    CACHE_EARLY_REFRESH_BETA: float = 1.0  # 0 — отключить раннее обновление
+    # После TTL запись ещё CACHE_STALE_TTL_SECONDS отдаётся сразу с фоновым обновлением,
+    # а при ошибке БД — до CACHE_STALE_IF_ERROR_SECONDS (последнее удачное значение)
+    CACHE_STALE_TTL_SECONDS: int = 300
+    CACHE_STALE_IF_ERROR_SECONDS: int = 24 * 3600
+    # Префиксы ключей, по которым ведутся метрики кэша (прочие ключи — "other")
+    CACHE_METRIC_PREFIXES: List[str] = Field(
+        default_factory=lambda: [
+            "articles:list", "articles:slug", "articles:sitemap", "articles:search", "search", "countries", "services", "case_studies", "auto_publish",
+        ]
+    )
+    # Сжатые варианты кэшированных ответов готовятся один раз при заполнении кэша
+    RESPONSE_COMPRESS_MIN_BYTES: int = 1024  # как gzip_min_length в nginx
+    RESPONSE_GZIP_LEVEL: int = 9
+    RESPONSE_BROTLI_QUALITY: int = 11
+    # Шина инвалидации: удаления по тегам рассылаются всем воркерам через Redis pub/sub,
+    # счётчик поколений ловит пропущенные сообщения (тогда L1 воркера очищается целиком)
+    CACHE_BUS_ENABLED: bool = True
+    CACHE_BUS_CHANNEL: str = "cache:invalidate"
+    CACHE_BUS_CHECK_SECONDS: float = 5.0
+    # Прогрев: после старта воркера и после публикации статьи
+    CACHE_WARM_ON_STARTUP: bool = True
+    CACHE_WARM_CONCURRENCY: int = 4  # одновременных загрузок при прогреве
+    CACHE_WARM_ARTICLES: int = 20  # новых и самых читаемых статей (каждой группы)
+    # Пакетные выборки (/articles/batch?slugs=...): максимум идентификаторов в запросе
+    BATCH_LOOKUP_MAX_ITEMS: int = 50
+    # Поиск по статьям (/articles/search): более длинный запрос обрезается
+    SEARCH_MAX_QUERY_LENGTH: int = 200
+    # Подсказки (/search/suggest): страны и услуги — из индекса в памяти воркера, статьи — pg_trgm
+    SEARCH_SUGGEST_MAX_QUERY_LENGTH: int = 64
+    SEARCH_SUGGEST_LIMIT: int = 8
+    SEARCH_SUGGEST_TTL_SECONDS: int = 60  # ответы по префиксу; под тегами не регистрируются
+    SEARCH_SUGGEST_MIN_ARTICLE_CHARS: int = 3  # короче — триграммный индекс не помогает
+    SEARCH_SUGGEST_ARTICLE_SIMILARITY: float = 0.4  # pg_trgm.word_similarity_threshold
+    SEARCH_SUGGEST_FUZZY_THRESHOLD: float = 0.5  # доля триграмм запроса, найденных в названии
+    SEARCH_CATALOG_REFRESH_SECONDS: float = 10.0  # как часто воркер сверяет индекс с кэшем
+
+    # Общий пул Redis: короткие таймауты и выключатель (после N ошибок подряд — сразу фолбэк)
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_SOCKET_TIMEOUT_SECONDS: float = 0.5
+    REDIS_CONNECT_TIMEOUT_SECONDS: float = 0.5
+    REDIS_HEALTH_CHECK_SECONDS: int = 30
+    REDIS_BREAKER_FAILURES: int = 5
+    REDIS_BREAKER_RESET_SECONDS: float = 5.0
+    CELERY_REDIS_SOCKET_TIMEOUT_SECONDS: float = 5.0
 
     # Поддержка старых окружений: если REDIS_URL не задан, собираем из HOST/PORT
     REDIS_HOST: str = "redis"
@@ -82,6 +214,13 @@ class Settings(BaseSettings):
             return [o.strip() for o in v.split(",") if o.strip()]
         return v
 
+    @field_validator("CACHE_L1_PREFIXES", "CACHE_METRIC_PREFIXES", "TRUSTED_PROXIES", mode="before")
+    @classmethod
+    def parse_comma_separated(cls, v):
+        if isinstance(v, str):
+            return [p.strip() for p in v.split(",") if p.strip()]
+        return v
+
     @field_validator("DATABASE_URL", mode="before")
     @classmethod
     def compose_database_url(cls, v):
@@ -1,9 +1,48 @@
-from typing import AsyncGenerator
+"""
+Движки и сессии SQLAlchemy: пулы по классам нагрузки и необязательные реплики для чтения.
 
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+К основной БД ведут несколько пулов с отдельными размерами и таймаутами ожидания, чтобы один
+класс нагрузки не выбирал соединения у другого (выгрузка в админке — у приёма заявок):
+- primary — заявки, согласия и прочие записи публичной части (get_db);
+- public — загрузчики публичного контента (with_session);
+- admin — админка и API под авторизацией (get_admin_db, фолбэк get_read_db);
+- audit — запись журнала аудита декоратором audit_log;
+- background — прогрев кэша и задачи Celery (session_for(BACKGROUND)).
+Размер 0 у класса — он пользуется пулом primary. Ожидание соединения в primary, public и
+репликах — сигнал перегрузки для app.core.load_shedding; в остальных пулах оно ограничивает
+только свой класс. Занятость каждого пула — в /metrics (db_pool_*{pool=...}).
+
+get_db — сессия основной БД (записи и всё, что должно видеть их сразу). get_read_db — сессия
+для тяжёлого чтения (публичный контент, списки админки, отчёты аудита): реплика из
+DATABASE_READ_URL по кругу, а если реплик нет, все недоступны или отстают больше
+DB_REPLICA_MAX_LAG_SECONDS — пул admin основной БД. Реплика, на которой не удалось получить соединение,
+исключается на DB_REPLICA_RETRY_SECONDS; ошибка посреди запроса уходит клиенту как обычно.
+
+Чтение своих записей: запрос админа с изменяющим методом (get_db) отмечает его в Redis на
+DB_READ_STICKY_SECONDS, и его чтения идут с основной БД, пока реплика догоняет. Так же после
+инвалидации кэша (fence_replica_reads) загрузчики публичного контента читают с основной БД:
+иначе пересобранный ответ мог бы закэшироваться по данным до изменения.
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from dataclasses import dataclass
+from typing import AsyncGenerator, Awaitable, Callable, Dict, List, Optional, Sequence, Type, TypeVar
+
+from sqlalchemy import exc as sa_exc, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.requests import Request
 
 from app.core.config import settings
+from app.core.load_shedding import concurrency_limiter
+from app.core.metrics import process_metrics
+from app.core.redis_client import UNAVAILABLE_ERRORS, get_redis
+from app.core.server_timing import instrument_engine
+
+logger = logging.getLogger("core.database")
 
 
 def _to_async_dsn(url: str) -> str:
@@ -17,21 +56,100 @@ def _to_async_dsn(url: str) -> str:
     return url
 
 
+@dataclass(frozen=True)
+class PoolConfig:
+    size: int
+    max_overflow: int
+    timeout: float  # ожидание свободного соединения, секунды
+    congestion_signal: bool = True  # ожидание в пуле — сигнал перегрузки для load shedding
+
+
+PRIMARY = "primary"
+PUBLIC = "public"
+ADMIN = "admin"
+AUDIT = "audit"
+BACKGROUND = "background"
+
+POOL_CONFIGS: Dict[str, PoolConfig] = {
+    PRIMARY: PoolConfig(settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW, settings.DB_POOL_TIMEOUT),
+    PUBLIC: PoolConfig(settings.DB_PUBLIC_POOL_SIZE, settings.DB_PUBLIC_MAX_OVERFLOW, settings.DB_PUBLIC_POOL_TIMEOUT),
+    ADMIN: PoolConfig(settings.DB_ADMIN_POOL_SIZE, settings.DB_ADMIN_MAX_OVERFLOW, settings.DB_ADMIN_POOL_TIMEOUT, False),
+    AUDIT: PoolConfig(settings.DB_AUDIT_POOL_SIZE, settings.DB_AUDIT_MAX_OVERFLOW, settings.DB_AUDIT_POOL_TIMEOUT, False),
+    BACKGROUND: PoolConfig(
+        settings.DB_BACKGROUND_POOL_SIZE, settings.DB_BACKGROUND_MAX_OVERFLOW, settings.DB_BACKGROUND_POOL_TIMEOUT, False
+    ),
+}
+
+
+def _timed_pool(name: str, congestion_signal: bool = True) -> Type[AsyncAdaptedQueuePool]:
+    """Пул, который пишет в метрики время получения соединения и таймауты ожидания.
+
+    При congestion_signal они же — сигнал перегрузки для адаптивного предела запросов
+    (app.core.load_shedding).
+    """
+
+    class TimedPool(AsyncAdaptedQueuePool):
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                return super()._do_get()
+            except sa_exc.TimeoutError:
+                process_metrics.pool_timeout(name)
+                if congestion_signal:
+                    concurrency_limiter.congested()
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                process_metrics.pool_checkout(name, elapsed)
+                if congestion_signal:
+                    concurrency_limiter.observe_pool_wait(elapsed)
+
+    return TimedPool
+
+
+def _make_engine(url: str, name: str, config: PoolConfig) -> AsyncEngine:
+    """Движок с пулом под именем name в метриках и учётом времени SQL для Server-Timing."""
+    eng = create_async_engine(
+        url,
+        poolclass=_timed_pool(name, config.congestion_signal),
+        pool_size=config.size,
+        max_overflow=config.max_overflow,
+        pool_timeout=config.timeout,
+        pool_pre_ping=True,
+        pool_recycle=1800,
+    )
+    process_metrics.watch_pool(name, eng)
+    instrument_engine(eng)
+    return eng
+
+
 DATABASE_URL_ASYNC = _to_async_dsn(settings.DATABASE_URL)
 
-engine = create_async_engine(
-    DATABASE_URL_ASYNC,
-    pool_size=5,
-    max_overflow=10,
-    pool_pre_ping=True,
-    pool_recycle=1800,
-)
+engine = _make_engine(DATABASE_URL_ASYNC, PRIMARY, POOL_CONFIGS[PRIMARY])
 
 AsyncSessionLocal = async_sessionmaker(
     bind=engine,
     expire_on_commit=False,
 )
 
+# Пулы классов нагрузки (подключения открываются лениво, при первой сессии)
+workload_engines: Dict[str, AsyncEngine] = {PRIMARY: engine}
+_sessionmakers: Dict[str, async_sessionmaker] = {PRIMARY: AsyncSessionLocal}
+for _name, _config in POOL_CONFIGS.items():
+    if _name == PRIMARY:
+        continue
+    if _config.size > 0:
+        workload_engines[_name] = _make_engine(DATABASE_URL_ASYNC, _name, _config)
+        _sessionmakers[_name] = async_sessionmaker(bind=workload_engines[_name], expire_on_commit=False)
+    else:
+        workload_engines[_name] = engine
+        _sessionmakers[_name] = AsyncSessionLocal
+
+
+def session_for(workload: str) -> AsyncSession:
+    """Новая сессия из пула класса нагрузки (PRIMARY, PUBLIC, ADMIN, AUDIT, BACKGROUND)."""
+    return _sessionmakers[workload]()
+
 # Для совместимости возможных импортов в существующем коде
 SessionLocal = AsyncSessionLocal
 
@@ -40,6 +158,225 @@ class Base(DeclarativeBase):
     pass
 
 
-async def get_db() -> AsyncGenerator[AsyncSession, None]:
+T = TypeVar("T")
+
+# Отставание реплики, секунды; 0 — если реплика применила всё полученное (иначе простой
+# основной БД выглядел бы как отставание)
+_LAG_SQL = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() "
+    "THEN 0 ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+class ReplicaUnavailable(Exception):
+    pass
+
+
+# Ошибки получения соединения, после которых реплика временно исключается
+REPLICA_ERRORS = (ReplicaUnavailable, OSError, asyncio.TimeoutError, sa_exc.DBAPIError, sa_exc.TimeoutError)
+
+
+class Replica:
+    def __init__(self, index: int, url: str) -> None:
+        self.name = f"replica{index}"
+        self.engine = _make_engine(
+            _to_async_dsn(url),
+            self.name,
+            PoolConfig(settings.DB_READ_POOL_SIZE, settings.DB_READ_MAX_OVERFLOW, settings.DB_PUBLIC_POOL_TIMEOUT),
+        )
+        self.sessionmaker = async_sessionmaker(bind=self.engine, expire_on_commit=False)
+        self.down_until = 0.0
+        self.checked_at = 0.0
+        self.lag: Optional[float] = None
+        self.failures = 0
+
+    def mark_down(self, error: BaseException) -> None:
+        self.down_until = time.monotonic() + settings.DB_REPLICA_RETRY_SECONDS
+        self.failures += 1
+        logger.warning(
+            "Read replica %s unavailable (%s); excluded for %.0fs",
+            self.name, error, settings.DB_REPLICA_RETRY_SECONDS,
+        )
+
+    async def open(self) -> AsyncSession:
+        """Сессия с уже полученным соединением; REPLICA_ERRORS — репликой пользоваться нельзя."""
+        session = self.sessionmaker()
+        try:
+            conn = await session.connection()
+            now = time.monotonic()
+            if conn.dialect.name == "postgresql" and now - self.checked_at >= settings.DB_REPLICA_CHECK_SECONDS:
+                self.checked_at = now
+                self.lag = float((await conn.execute(_LAG_SQL)).scalar() or 0.0)
+            if self.lag is not None and self.lag > settings.DB_REPLICA_MAX_LAG_SECONDS:
+                raise ReplicaUnavailable(f"replication lag {self.lag:.1f}s")
+        except BaseException:
+            await session.close()
+            raise
+        return session
+
+
+class ReadRouter:
+    """Выбор сессии для чтения: здоровая реплика по кругу или пул основной БД (fallback)."""
+
+    def __init__(self, urls: List[str]) -> None:
+        self.replicas = [Replica(i, url) for i, url in enumerate(urls)]
+        self.fenced_until = 0.0
+        self.primary_fallbacks = 0
+        self._next = 0
+
+    def fence(self, seconds: float) -> None:
+        self.fenced_until = max(self.fenced_until, time.monotonic() + seconds)
+
+    def _candidates(self) -> List[Replica]:
+        now = time.monotonic()
+        count = len(self.replicas)
+        start, self._next = self._next, (self._next + 1) % count
+        ordered = (self.replicas[(start + i) % count] for i in range(count))
+        return [replica for replica in ordered if replica.down_until <= now]
+
+    async def session(self, fallback: str, primary: bool = False) -> AsyncSession:
+        if self.replicas and not primary and time.monotonic() >= self.fenced_until:
+            for replica in self._candidates():
+                try:
+                    return await replica.open()
+                except REPLICA_ERRORS as e:
+                    replica.mark_down(e)
+            self.primary_fallbacks += 1
+        return session_for(fallback)
+
+    def stats(self) -> Dict[str, object]:
+        now = time.monotonic()
+        return {
+            "replicas": [
+                {
+                    "name": r.name,
+                    "available": r.down_until <= now,
+                    "lag_seconds": r.lag,
+                    "failures": r.failures,
+                }
+                for r in self.replicas
+            ],
+            "primary_fallbacks": self.primary_fallbacks,
+            "fenced": self.fenced_until > now,
+        }
+
+
+read_router = ReadRouter([url.strip() for url in settings.DATABASE_READ_URL.split(",") if url.strip()])
+
+_SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+def _sticky_key(request: Request) -> Optional[str]:
+    """Ключ «недавно писал» для админа: сессия админки или Bearer-токен; анонимам — None."""
+    identity = None
+    if "session" in request.scope and request.session.get("email"):
+        identity = "session:" + request.session["email"]
+    elif request.headers.get("authorization"):
+        identity = "bearer:" + request.headers["authorization"]
+    if identity is None:
+        return None
+    return "db:sticky:" + hashlib.sha256(identity.encode()).hexdigest()[:32]
+
+
+async def _mark_sticky(request: Request) -> None:
+    key = _sticky_key(request)
+    r = get_redis()
+    if key is None or r is None:
+        return
+    try:
+        await r.set(key, 1, ex=settings.DB_READ_STICKY_SECONDS)
+    except UNAVAILABLE_ERRORS as e:
+        logger.debug("Read stickiness not recorded: %s", e)
+
+
+async def _is_sticky(request: Request) -> bool:
+    key = _sticky_key(request)
+    if key is None:
+        return False
+    r = get_redis()
+    if r is None:
+        return True  # не проверить — читаем с основной, чтобы админ видел свои изменения
+    try:
+        return bool(await r.exists(key))
+    except UNAVAILABLE_ERRORS:
+        return True
+
+
+def fence_replica_reads(seconds: Optional[float] = None) -> None:
+    """Чтения через реплику в этом воркере на время идут с основной БД (после инвалидации кэша)."""
+    if read_router.replicas:
+        read_router.fence(settings.DB_READ_STICKY_SECONDS if seconds is None else seconds)
+
+
+async def get_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    if read_router.replicas and request.method not in _SAFE_METHODS:
+        await _mark_sticky(request)
     async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+        yield session
+
+
+async def get_admin_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """Как get_db, но из пула admin: тяжёлые запросы админки не занимают соединения заявок."""
+    if read_router.replicas and request.method not in _SAFE_METHODS:
+        await _mark_sticky(request)
+    async with session_for(ADMIN) as session:
+        yield session
+
+
+async def get_read_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """Сессия только для чтения: реплика или, при её недоступности и после записи админа, пул admin."""
+    primary = not read_router.replicas or await _is_sticky(request)
+    async with await read_router.session(ADMIN, primary=primary) as session:
+        yield session
+
+
+def all_engines() -> List[AsyncEngine]:
+    engines = list({id(eng): eng for eng in workload_engines.values()}.values())
+    return engines + [replica.engine for replica in read_router.replicas]
+
+
+async def dispose_engines() -> None:
+    for eng in all_engines():
+        await eng.dispose()
+
+
+async def prewarm_pool(connections: Optional[int] = None, workloads: Sequence[str] = (PRIMARY, PUBLIC)) -> int:
+    """Открывает соединения пулов заранее (по умолчанию pool_size), чтобы первые запросы не ждали connect.
+
+    Соединения удерживаются одновременно, иначе пул вернул бы одно и то же. Возвращает число открытых.
+    """
+
+    async def open_one(eng: AsyncEngine):
+        conn = await eng.connect()
+        await conn.execute(text("SELECT 1"))
+        return conn
+
+    # Класс с пулом размера 0 делит движок primary: прогревается один раз и по размеру его пула
+    engines = {}
+    for w in workloads:
+        eng = workload_engines[w]
+        engines[id(eng)] = (PRIMARY if eng is engine else w, eng)
+    opened_total = 0
+    for name, eng in engines.values():
+        count = connections or eng.sync_engine.pool.size()
+        results = await asyncio.gather(*(open_one(eng) for _ in range(count)), return_exceptions=True)
+        opened = [c for c in results if not isinstance(c, BaseException)]
+        for conn in opened:
+            await conn.close()  # возвращает соединение в пул, не закрывая его
+        errors = [e for e in results if isinstance(e, BaseException)]
+        if errors:
+            logger.warning("DB pool %s prewarm: %d of %d connections failed: %s", name, len(errors), count, errors[0])
+        opened_total += len(opened)
+    return opened_total
+
+
+def with_session(fn: Callable[[AsyncSession], Awaitable[T]], read: bool = False) -> Callable[[], Awaitable[T]]:
+    """Оборачивает загрузчик кэша собственной сессией: он может выполняться уже после ответа (фоновое обновление).
+
+    Сессия — из пула public; read=True — загрузчик только читает и может идти на реплику (см. get_read_db).
+    """
+    async def run() -> T:
+        session = await read_router.session(PUBLIC) if read else session_for(PUBLIC)
+        async with session:
+            return await fn(session)
+    return run
\ No newline at end of file
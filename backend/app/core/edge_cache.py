@@ -0,0 +1,153 @@
+"""
+Обновление микро-кэша nginx после изменения контента.
+
+В nginx open source нет purge, поэтому вместо удаления записи бэкенд перезапрашивает её через
+внутренний порт nginx (EDGE_CACHE_REFRESH_URL), где кэш обходится (proxy_cache_bypass) и свежий
+ответ записывается на место старого.
+
+Какие URL перезапрашивать, известно по тегам: каждый публичный ответ из кэша приложения
+(промах или попадание — nginx приходит за URL и тогда, когда кэш приложения тёплый) запоминает
+свой URL в Redis в множествах edge:tag:{tag}. TTL множества — время, сколько nginx может
+держать ответ (s-maxage + stale-while-revalidate): каждое обращение nginx к бэкенду его продлевает. refresh_tags() после
+инвалидации забирает URL по тегам и перезапрашивает их в фоне для каждого варианта
+Accept-Encoding, который различает nginx. URL, не попавшие в реестр, устареют сами не позже s-maxage.
+
+Обновляющие запросы несут заголовок X-Edge-Refresh с токеном из SECRET_KEY: с ним
+RateLimitMiddleware их не считает. Иначе все они попадали бы в одну корзину лимита (адрес nginx),
+после записи статьи упирались бы в 429, и nginx оставлял бы старую запись до s-maxage + SWR.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+import logging
+from contextvars import ContextVar
+from typing import Any, Iterable, List, Optional, Set
+
+import httpx
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+
+logger = logging.getLogger("core.edge_cache")
+
+TAG_PREFIX = "edge:tag:"
+
+REFRESH_HEADER = "X-Edge-Refresh"
+
+# nginx сводит Accept-Encoding к одному из трёх значений и хранит по варианту на каждое (см. nginx.conf)
+REFRESH_ENCODINGS = ("br", "gzip", "identity")
+
+# URL публичного запроса (путь и query как их видит nginx); ставит CacheControlMiddleware
+edge_url_var: ContextVar[Optional[str]] = ContextVar("edge_url", default=None)
+
+_background: Set["asyncio.Task[Any]"] = set()
+
+# Клиент воркера: соединения с nginx переиспользуются между обновлениями; закрывается в lifespan
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _enabled() -> bool:
+    return bool(settings.EDGE_CACHE_REFRESH_URL)
+
+
+def refresh_token() -> str:
+    return hmac.new(settings.SECRET_KEY.encode(), b"edge-cache-refresh", hashlib.sha256).hexdigest()
+
+
+def is_refresh(value: Optional[str]) -> bool:
+    """Запрос пришёл от _refresh() (значение заголовка X-Edge-Refresh совпало с токеном)."""
+    return value is not None and hmac.compare_digest(value, refresh_token())
+
+
+async def remember(tags: Iterable[str]) -> None:
+    """Запоминает URL текущего публичного запроса под тегами его ответа."""
+    url = edge_url_var.get()
+    tags = [t for t in tags if t]
+    if url is None or not tags or not _enabled():
+        return
+    r = get_redis()
+    if r is None:
+        return
+    ttl = settings.HTTP_CACHE_S_MAXAGE + settings.HTTP_CACHE_STALE_WHILE_REVALIDATE
+    try:
+        pipe = r.pipeline(transaction=False)
+        for tag in tags:
+            pipe.sadd(TAG_PREFIX + tag, url)
+            pipe.expire(TAG_PREFIX + tag, ttl)
+        await pipe.execute()
+    except Exception as e:
+        logger.debug("Edge cache remember failed: %s", e)
+
+
+async def refresh_tags(tags: Iterable[str]) -> int:
+    """Забирает URL, закэшированные nginx под тегами, и запускает их обновление в фоне."""
+    keys = [TAG_PREFIX + t for t in dict.fromkeys(tags) if t]
+    if not keys or not _enabled():
+        return 0
+    r = get_redis()
+    if r is None:
+        return 0
+    try:
+        pipe = r.pipeline(transaction=True)
+        pipe.sunion(keys)
+        pipe.delete(*keys)
+        members, _ = await pipe.execute()
+    except Exception as e:
+        logger.warning("Edge cache refresh lookup failed for tags %s: %s", tags, e)
+        return 0
+    urls = sorted(m.decode() if isinstance(m, bytes) else m for m in members)
+    if urls:
+        task = asyncio.ensure_future(_refresh(urls))
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+    return len(urls)
+
+
+def _http_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            base_url=settings.EDGE_CACHE_REFRESH_URL or "",
+            timeout=settings.EDGE_CACHE_REFRESH_TIMEOUT_SECONDS,
+            headers={REFRESH_HEADER: refresh_token()},
+            limits=httpx.Limits(max_connections=max(1, settings.EDGE_CACHE_REFRESH_CONCURRENCY)),
+        )
+    return _client
+
+
+async def _refresh(urls: List[str]) -> None:
+    semaphore = asyncio.Semaphore(max(1, settings.EDGE_CACHE_REFRESH_CONCURRENCY))
+    client = _http_client()
+    failed = 0
+
+    async def fetch(url: str, encoding: str) -> None:
+        nonlocal failed
+        async with semaphore:
+            try:
+                response = await client.get(url, headers={"Accept-Encoding": encoding})
+            except httpx.HTTPError as e:
+                failed += 1
+                logger.debug("Edge cache refresh %s failed: %s", url, e)
+                return
+            # 429/503 nginx не кэширует: запись осталась старой
+            if response.status_code in (429, 503):
+                failed += 1
+                logger.debug("Edge cache refresh %s: HTTP %d", url, response.status_code)
+
+    await asyncio.gather(*(fetch(url, enc) for url in urls for enc in REFRESH_ENCODINGS))
+    if failed:
+        logger.warning("Edge cache refresh: %d of %d requests failed", failed, len(urls) * len(REFRESH_ENCODINGS))
+
+
+def background_tasks() -> Set["asyncio.Task[Any]"]:
+    """Обновления, ещё идущие в фоне (дожидаются при остановке воркера)."""
+    return set(_background)
+
+
+async def close() -> None:
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        await client.aclose()
@@ -0,0 +1,69 @@
+"""
+Политика HTTP-кэширования ответов (Cache-Control) по маршрутам.
+
+Публичный контент (статьи, страны, услуги, кейсы), запрошенный без Authorization, помечается
+public с коротким max-age для браузера, s-maxage для микро-кэша nginx и stale-while-revalidate /
+stale-if-error: nginx отдаёт такие ответы сам и обновляет их в фоне, до uvicorn доходит
+малая часть публичного трафика. Персональные данные и админка (/leads, /audit, /consents,
+/auto-publish, /admin) — private, no-store: их не сохраняет ни nginx, ни браузер.
+Для остальных маршрутов заголовок не ставится.
+
+Cache-Control, выставленный самим эндпоинтом, не перезаписывается.
+"""
+from __future__ import annotations
+
+import re
+from typing import Optional, Tuple
+
+from app.core.config import settings
+
+PUBLIC = "public"
+PRIVATE = "private"
+AUTHORIZED = "authorized"  # публичный маршрут, запрошенный с Authorization
+
+PRIVATE_NO_STORE = "private, no-store"
+# Ответ может зависеть от пользователя: в общий кэш не попадает, браузер перепроверяет по ETag
+AUTHORIZED_NO_CACHE = "private, no-cache"
+PUBLIC_CACHE_CONTROL = (
+    f"public, max-age={settings.HTTP_CACHE_MAX_AGE}, s-maxage={settings.HTTP_CACHE_S_MAXAGE}, "
+    f"stale-while-revalidate={settings.HTTP_CACHE_STALE_WHILE_REVALIDATE}, "
+    f"stale-if-error={settings.HTTP_CACHE_STALE_IF_ERROR}"
+)
+
+# Первое совпадение определяет класс маршрута; не совпало ничего — заголовок не ставится
+CACHE_RULES: Tuple[Tuple["re.Pattern[str]", str], ...] = (
+    (re.compile(r"^/admin(/|$)"), PRIVATE),
+    (re.compile(r"^/api/v1/(leads|audit|consents|auto-publish)(/|$)"), PRIVATE),
+    (re.compile(r"^/api/v1/(articles|countries|services|case-studies|search)(/|$)"), PUBLIC),
+)
+
+_READ = frozenset({"GET", "HEAD"})
+
+# Статусы публичных ответов, которые имеет смысл кэшировать (ошибки не кэшируются)
+CACHEABLE_STATUSES = frozenset({200, 304})
+
+
+def route_policy(method: str, path: str, authorized: bool) -> Optional[str]:
+    """PUBLIC — кэшируемое чтение, PRIVATE — запрет кэширования, AUTHORIZED — чтение
+    публичного маршрута с авторизацией, None — маршрут вне политики."""
+    for pattern, kind in CACHE_RULES:
+        if pattern.match(path):
+            break
+    else:
+        return None
+    if kind == PRIVATE:
+        return PRIVATE
+    if method not in _READ:
+        return None
+    return AUTHORIZED if authorized else PUBLIC
+
+
+def cache_control(policy: str, status: int) -> Optional[str]:
+    """Значение Cache-Control для ответа с данным статусом."""
+    if policy == PRIVATE:
+        return PRIVATE_NO_STORE
+    if policy == AUTHORIZED:
+        return AUTHORIZED_NO_CACHE
+    if status in CACHEABLE_STATUSES:
+        return PUBLIC_CACHE_CONTROL
+    return None
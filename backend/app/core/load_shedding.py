@@ -0,0 +1,124 @@
+"""
+Адаптивный предел одновременных запросов и сброс нагрузки по классам приоритета.
+
+Когда Postgres замедляется, запросы копятся в ожидании пула соединений, пока клиенты не
+отвалятся по таймауту, а заявки (POST /leads — основной путь выручки) стоят в той же очереди,
+что и обход краулеров. Здесь воркер держит предел одновременных запросов (limit) и меняет его
+по AIMD: при ожидании соединения из пула дольше LOAD_SHED_TARGET_POOL_WAIT_MS, таймауте пула
+или запросе дольше LOAD_SHED_TARGET_LATENCY_MS предел умножается на LOAD_SHED_DECREASE_FACTOR
+(не чаще раза в LOAD_SHED_DECREASE_COOLDOWN_SECONDS), иначе растёт на 1 с каждым успешным
+запросом, пока занята хотя бы половина предела, — до LOAD_SHED_MAX_LIMIT. На малой нагрузке
+предел не растёт: он не участвует в допуске, и рост ничего не проверял бы.
+
+Классы (lane) занимают разную долю предела: анонимное чтение контента — LOAD_SHED_CONTENT_SHARE,
+админка и выгрузки — LOAD_SHED_ADMIN_SHARE, заявки и согласия — весь предел. При росте
+нагрузки первым отказывают чтению контента (его nginx отдаёт из микро-кэша, в том числе
+устаревшим), заявки — последними. Отказ — 503 с Retry-After до начала обработки.
+"""
+from __future__ import annotations
+
+import re
+import time
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from app.core.config import settings
+
+CONTENT = "content"
+ADMIN = "admin"
+LEADS = "leads"
+
+LANE_SHARES: Dict[str, float] = {
+    CONTENT: settings.LOAD_SHED_CONTENT_SHARE,
+    ADMIN: settings.LOAD_SHED_ADMIN_SHARE,
+    LEADS: 1.0,
+}
+
+_WRITE = frozenset({"POST", "PUT", "PATCH"})
+
+
+@dataclass(frozen=True)
+class LaneRule:
+    lane: str
+    pattern: "re.Pattern[str]"
+    methods: Optional[FrozenSet[str]] = None  # None — любой метод
+
+    def matches(self, method: str, path: str) -> bool:
+        return (self.methods is None or method in self.methods) and bool(self.pattern.match(path))
+
+
+# Первое совпадение определяет класс; остальное — CONTENT (или ADMIN с Authorization)
+LANE_RULES: Tuple[LaneRule, ...] = (
+    LaneRule(LEADS, re.compile(r"^/api/v1/(leads|consents)/?$"), _WRITE),
+    LaneRule(ADMIN, re.compile(r"^/admin(/|$)")),
+    LaneRule(ADMIN, re.compile(r"^/api/v1/(leads|audit|consents|auto-publish)(/|$)")),
+)
+
+# Служебные пути не ограничиваются: healthcheck и сбор метрик нужны именно под нагрузкой
+EXEMPT_PATHS = frozenset({"/health", "/metrics"})
+EXEMPT_PREFIXES = ("/metrics/",)
+
+
+def request_lane(method: str, path: str, authorized: bool) -> Optional[str]:
+    """Класс запроса; None — не ограничивается."""
+    if path in EXEMPT_PATHS or path.startswith(EXEMPT_PREFIXES):
+        return None
+    for rule in LANE_RULES:
+        if rule.matches(method, path):
+            return rule.lane
+    return ADMIN if authorized else CONTENT
+
+
+class AdaptiveLimiter:
+    """AIMD-предел одновременных запросов воркера (один цикл событий — без блокировок)."""
+
+    def __init__(self, min_limit: int, max_limit: int) -> None:
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self.lane_in_flight: Dict[str, int] = {lane: 0 for lane in LANE_SHARES}
+        self.shed: Dict[str, int] = {lane: 0 for lane in LANE_SHARES}
+        self.decreases = 0
+        self._last_decrease = 0.0
+
+    def try_acquire(self, lane: str) -> bool:
+        if self.in_flight >= max(1.0, self.limit * LANE_SHARES[lane]):
+            self.shed[lane] += 1
+            return False
+        self.in_flight += 1
+        self.lane_in_flight[lane] += 1
+        return True
+
+    def release(self, lane: str, latency_seconds: float) -> None:
+        self.in_flight -= 1
+        self.lane_in_flight[lane] -= 1
+        # Выгрузки админки законно бывают долгими: задержку как сигнал перегрузки берём по остальным
+        if lane != ADMIN and latency_seconds * 1000 > settings.LOAD_SHED_TARGET_LATENCY_MS:
+            self.congested()
+        elif self.in_flight * 2 >= self.limit:
+            self.limit = min(float(self.max_limit), self.limit + 1.0)
+
+    def observe_pool_wait(self, seconds: float) -> None:
+        if seconds * 1000 > settings.LOAD_SHED_TARGET_POOL_WAIT_MS:
+            self.congested()
+
+    def congested(self) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < settings.LOAD_SHED_DECREASE_COOLDOWN_SECONDS:
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.min_limit), self.limit * settings.LOAD_SHED_DECREASE_FACTOR)
+        self.decreases += 1
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "lane_in_flight": dict(self.lane_in_flight),
+            "shed": dict(self.shed),
+            "decreases": self.decreases,
+        }
+
+
+concurrency_limiter = AdaptiveLimiter(settings.LOAD_SHED_MIN_LIMIT, settings.LOAD_SHED_MAX_LIMIT)
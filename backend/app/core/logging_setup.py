@@ -0,0 +1,173 @@
+"""
+Логирование API: JSON-строки в stdout через очередь и фоновый поток записи.
+
+Обработчики в цикле событий только кладут запись в ограниченную очередь (QueueHandler);
+форматирование в JSON и запись в stdout делает поток QueueListener. Если stdout не
+успевает (медленный сборщик логов), очередь заполняется и новые записи отбрасываются
+со счётчиком — цикл событий на записи в лог не блокируется.
+
+Access-лог пишет RequestLoggerMiddleware с выборкой: ошибки и медленные запросы — всегда,
+успешные ответы из кэша — ACCESS_LOG_SAMPLE_CACHED, прочие успешные — ACCESS_LOG_SAMPLE_SUCCESS,
+служебные пути (SAMPLE_RULES) — не пишутся. Доля выборки попадает в запись (sample_rate),
+чтобы при анализе можно было восстановить полные числа.
+"""
+from __future__ import annotations
+
+import copy
+import json
+import logging
+import os
+import queue
+import re
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.request_context import RequestIdFilter
+
+access_logger = logging.getLogger("access")
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+
+# Доля успешных ответов, попадающих в access-лог, по маршрутам (первое совпадение)
+SAMPLE_RULES: Tuple[Tuple["re.Pattern[str]", float], ...] = (
+    (re.compile(r"^/health$"), 0.0),
+    (re.compile(r"^/metrics(/|$)"), 0.0),
+)
+
+# Ответы, отданные из кэша (X-Cache-Status); MISS/BYPASS считаются обычными
+CACHED_STATUSES = frozenset({"HIT", "STALE", "STALE-IF-ERROR", "PARTIAL"})
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+        }
+        access = getattr(record, "access", None)
+        if access:
+            entry.update(access)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler, который при переполненной очереди отбрасывает запись вместо ожидания."""
+
+    def __init__(self, q: "queue.Queue[Any]") -> None:
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # В потоке вызова — только подстановка аргументов и текст трассировки (их объекты
+        # могут измениться после возврата); JSON собирает поток записи
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging() -> None:
+    """Корневой логгер и логгеры uvicorn — через очередь в stdout. Повторный вызов ничего не делает."""
+    global _listener
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if settings.LOG_JSON else logging.Formatter(TEXT_FORMAT))
+    q: "queue.Queue[Any]" = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    handler = DroppingQueueHandler(q)
+    # Фильтр работает в потоке вызова: там доступен contextvar с request id
+    handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(settings.LOG_LEVEL.upper())
+    for name in ("uvicorn", "uvicorn.error"):
+        uv = logging.getLogger(name)
+        uv.handlers = []
+        uv.propagate = True
+    # Свой access-лог у uvicorn заменён журналом RequestLoggerMiddleware
+    logging.getLogger("uvicorn.access").disabled = True
+
+    _listener = QueueListener(q, stream, respect_handler_level=True)
+    _listener.start()
+
+
+def _restart_after_fork() -> None:
+    # Поток записи не переживает fork (gunicorn --preload): дочернему процессу — своя очередь и поток
+    global _listener
+    if _listener is not None:
+        _listener = None
+        configure_logging()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def stop_logging() -> None:
+    """Дописывает очередь и останавливает поток записи (при остановке воркера)."""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+
+
+def dropped_records() -> int:
+    return sum(getattr(h, "dropped", 0) for h in logging.getLogger().handlers)
+
+
+def access_sample_rate(path: str, status: int, cache_status: Optional[str], duration_ms: int) -> float:
+    """Доля запросов такого вида, попадающих в access-лог."""
+    if status >= 400 or duration_ms >= settings.ACCESS_LOG_SLOW_MS:
+        return 1.0
+    for pattern, rate in SAMPLE_RULES:
+        if pattern.match(path):
+            return rate
+    if cache_status in CACHED_STATUSES:
+        return settings.ACCESS_LOG_SAMPLE_CACHED
+    return settings.ACCESS_LOG_SAMPLE_SUCCESS
+
+
+def log_access(
+    method: str,
+    path: str,
+    status: int,
+    duration_ms: int,
+    client_ip: str,
+    cache_status: Optional[str],
+    sample_rate: float,
+) -> None:
+    access_logger.info(
+        "%s %s -> %s in %dms",
+        method, path, status, duration_ms,
+        extra={
+            "access": {
+                "method": method,
+                "path": path,
+                "status": status,
+                "duration_ms": duration_ms,
+                "client_ip": client_ip,
+                "cache": cache_status,
+                "sample_rate": sample_rate,
+            }
+        },
+    )
@@ -0,0 +1,286 @@
+"""
+Метрики процесса в формате Prometheus и их сведение по всем процессам (/metrics).
+
+Каждый процесс (воркер uvicorn, процесс Celery) считает свои метрики в памяти: длительность
+HTTP-запросов по шаблону маршрута и статусу, запросы в обработке, пул соединений SQLAlchemy
+(занятые, overflow, ожидание соединения), задачи Celery; к ним добавляются метрики кэша
+(app.core.cache_metrics), лимитов частоты, сброса нагрузки и очереди логов.
+
+Раз в METRICS_PUBLISH_SECONDS процесс кладёт свою экспозицию в Redis (metrics:proc:{host}:{pid},
+TTL METRICS_PROCESS_TTL_SECONDS). /metrics на любом воркере публикует свежий снимок своего
+процесса, читает снимки остальных и суммирует одноимённые ряды: счётчики и гистограммы
+складываются, gauge — тоже (сумма по процессам: всего в обработке, всего занято соединений).
+Снимок завершившегося процесса пропадает по TTL — для Prometheus это сброс счётчика,
+rate()/increase() его учитывают. Без Redis /metrics отдаёт только свой процесс.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.core.cache import cache_metrics_text
+from app.core.cache_metrics import Histogram, fmt_value, histogram_lines
+from app.core.config import settings
+from app.core.load_shedding import concurrency_limiter
+from app.core.logging_setup import dropped_records
+from app.core.rate_limit import rate_limiter
+from app.core.redis_client import call_sync, get_redis
+
+logger = logging.getLogger("core.metrics")
+
+PROC_PREFIX = "metrics:proc:"
+INDEX_KEY = "metrics:procs"
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+# Границы бакетов, секунды
+HTTP_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_WAIT_BUCKETS: Tuple[float, ...] = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+TASK_BUCKETS: Tuple[float, ...] = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class ProcessMetrics:
+    def __init__(self) -> None:
+        self.http: Dict[Tuple[str, str, int], Histogram] = {}
+        self.in_flight = 0
+        self.pools: Dict[str, Any] = {}  # имя пула -> engine (пул читается при выдаче: dispose() его пересоздаёт)
+        self.pool_wait: Dict[str, Histogram] = {}
+        self.pool_timeouts: Dict[str, int] = {}
+        self.tasks_published: Dict[str, int] = {}
+        self.tasks: Dict[Tuple[str, str], int] = {}
+        self.task_duration: Dict[str, Histogram] = {}
+        self._task_started: Dict[str, float] = {}
+
+    # --- HTTP ---
+    def request_done(self, method: str, route: str, status: int, seconds: float) -> None:
+        key = (method, route, status)
+        hist = self.http.get(key)
+        if hist is None:
+            hist = self.http[key] = Histogram(HTTP_BUCKETS)
+        hist.observe(seconds)
+
+    # --- Пулы соединений БД ---
+    def watch_pool(self, name: str, engine: Any) -> None:
+        self.pools[name] = engine
+
+    def pool_checkout(self, name: str, seconds: float) -> None:
+        hist = self.pool_wait.get(name)
+        if hist is None:
+            hist = self.pool_wait[name] = Histogram(DB_WAIT_BUCKETS)
+        hist.observe(seconds)
+
+    def pool_timeout(self, name: str) -> None:
+        self.pool_timeouts[name] = self.pool_timeouts.get(name, 0) + 1
+
+    # --- Celery ---
+    def task_published(self, name: str) -> None:
+        self.tasks_published[name] = self.tasks_published.get(name, 0) + 1
+
+    def task_started(self, task_id: str) -> None:
+        self._task_started[task_id] = time.perf_counter()
+
+    def task_finished(self, task_id: str, name: str, state: str) -> None:
+        self.tasks[(name, state)] = self.tasks.get((name, state), 0) + 1
+        started = self._task_started.pop(task_id, None)
+        if started is not None:
+            hist = self.task_duration.get(name)
+            if hist is None:
+                hist = self.task_duration[name] = Histogram(TASK_BUCKETS)
+            hist.observe(time.perf_counter() - started)
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+
+        def family(name: str, kind: str, help_text: str) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        family("http_request_duration_seconds", "histogram", "HTTP request latency by method, route template and status")
+        for (method, route, status), hist in sorted(self.http.items()):
+            labels = f'method="{method}",route="{_label(route)}",status="{status}"'
+            histogram_lines(lines, "http_request_duration_seconds", labels, hist)
+        family("http_requests_in_flight", "gauge", "HTTP requests being processed")
+        lines.append(f"http_requests_in_flight {self.in_flight}")
+
+        pools = {name: engine.pool for name, engine in sorted(self.pools.items())}
+        pools = {name: pool for name, pool in pools.items() if hasattr(pool, "checkedout")}
+        family("db_pool_size", "gauge", "Configured connections kept in the SQLAlchemy pool")
+        for name, pool in pools.items():
+            lines.append(f'db_pool_size{{pool="{name}"}} {pool.size()}')
+        family("db_pool_checked_out", "gauge", "Connections currently checked out of the pool")
+        for name, pool in pools.items():
+            lines.append(f'db_pool_checked_out{{pool="{name}"}} {pool.checkedout()}')
+        family("db_pool_overflow", "gauge", "Connections open above pool_size (max_overflow)")
+        for name, pool in pools.items():
+            lines.append(f'db_pool_overflow{{pool="{name}"}} {max(0, pool.overflow())}')
+        # Насыщение пула: db_pool_checked_out / db_pool_max_connections (доля не суммируется между процессами)
+        family("db_pool_max_connections", "gauge", "Connection limit of the pool (pool_size + max_overflow)")
+        for name, pool in pools.items():
+            lines.append(f'db_pool_max_connections{{pool="{name}"}} {pool.size() + max(0, pool._max_overflow)}')
+        family("db_pool_wait_seconds", "histogram", "Time to obtain a pooled connection (queue wait or new connection)")
+        for name, hist in sorted(self.pool_wait.items()):
+            histogram_lines(lines, "db_pool_wait_seconds", f'pool="{name}"', hist)
+        family("db_pool_timeouts_total", "counter", "Checkouts that failed with pool timeout")
+        for name, cnt in sorted(self.pool_timeouts.items()):
+            lines.append(f'db_pool_timeouts_total{{pool="{name}"}} {cnt}')
+
+        limiter = rate_limiter.stats()
+        family("rate_limit_requests_total", "counter", "Rate limit decisions by policy and result")
+        for result in ("allowed", "limited"):
+            for policy, cnt in sorted(limiter[result].items()):  # type: ignore[union-attr]
+                lines.append(f'rate_limit_requests_total{{policy="{policy}",result="{result}"}} {cnt}')
+        family("rate_limit_memory_fallbacks_total", "counter", "Rate limit checks done in memory because Redis was unavailable")
+        lines.append(f"rate_limit_memory_fallbacks_total {limiter['memory_fallbacks']}")
+
+        shedding = concurrency_limiter.stats()
+        family("load_shed_limit", "gauge", "Adaptive concurrency limit (sum over processes)")
+        lines.append(f"load_shed_limit {fmt_value(shedding['limit'])}")  # type: ignore[arg-type]
+        family("load_shed_in_flight", "gauge", "Requests admitted by the concurrency limiter by priority lane")
+        for lane, cnt in shedding["lane_in_flight"].items():  # type: ignore[union-attr]
+            lines.append(f'load_shed_in_flight{{lane="{lane}"}} {cnt}')
+        family("load_shed_rejected_total", "counter", "Requests shed with 503 by priority lane")
+        for lane, cnt in shedding["shed"].items():  # type: ignore[union-attr]
+            lines.append(f'load_shed_rejected_total{{lane="{lane}"}} {cnt}')
+        family("load_shed_decreases_total", "counter", "Times the concurrency limit was reduced on congestion")
+        lines.append(f"load_shed_decreases_total {shedding['decreases']}")
+
+        family("celery_tasks_published_total", "counter", "Celery tasks sent by task name")
+        for name, cnt in sorted(self.tasks_published.items()):
+            lines.append(f'celery_tasks_published_total{{task="{_label(name)}"}} {cnt}')
+        family("celery_tasks_total", "counter", "Celery tasks finished by task name and state")
+        for (name, state), cnt in sorted(self.tasks.items()):
+            lines.append(f'celery_tasks_total{{task="{_label(name)}",state="{state}"}} {cnt}')
+        family("celery_task_duration_seconds", "histogram", "Celery task run time")
+        for name, hist in sorted(self.task_duration.items()):
+            histogram_lines(lines, "celery_task_duration_seconds", f'task="{_label(name)}"', hist)
+
+        family("log_records_dropped_total", "counter", "Log records dropped because the log queue was full")
+        lines.append(f"log_records_dropped_total {dropped_records()}")
+        return "\n".join(lines) + "\n"
+
+
+process_metrics = ProcessMetrics()
+
+
+def instance_id() -> str:
+    # pid читается каждый раз: процессы Celery получают копию модуля через fork
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def render_local() -> str:
+    """Экспозиция текущего процесса: его метрики и метрики кэша."""
+    return process_metrics.render_prometheus() + cache_metrics_text()
+
+
+def merge_expositions(texts: Iterable[str]) -> str:
+    """Суммирует одинаковые ряды нескольких экспозиций; HELP/TYPE берутся из первого вхождения."""
+    headers: Dict[str, List[str]] = {}
+    samples: Dict[str, Dict[str, float]] = {}
+    for text in texts:
+        family = ""
+        introduced = set()
+        for line in text.splitlines():
+            if not line:
+                continue
+            if line.startswith("# "):
+                family = line.split(" ", 3)[2]
+                if family not in headers:
+                    headers[family] = []
+                    introduced.add(family)
+                if family in introduced:
+                    headers[family].append(line)
+                samples.setdefault(family, {})
+                continue
+            series, _, value = line.rpartition(" ")
+            bucket = samples.setdefault(family, {})
+            bucket[series] = bucket.get(series, 0.0) + float(value)
+    lines: List[str] = []
+    for family, series in samples.items():
+        lines.extend(headers.get(family, ()))
+        lines.extend(f"{name} {fmt_value(value)}" for name, value in series.items())
+    return "\n".join(lines) + "\n"
+
+
+async def publish() -> None:
+    """Кладёт снимок процесса в Redis (для /metrics на других воркерах)."""
+    r = get_redis()
+    if r is None:
+        return
+    pipe = r.pipeline(transaction=False)
+    pipe.set(PROC_PREFIX + instance_id(), render_local(), ex=settings.METRICS_PROCESS_TTL_SECONDS)
+    pipe.sadd(INDEX_KEY, instance_id())
+    await pipe.execute()
+
+
+async def exposition() -> str:
+    """Метрики всех живых процессов, сведённые в одну экспозицию."""
+    texts: Optional[List[str]] = None
+    r = get_redis()
+    if r is not None:
+        try:
+            await publish()
+            ids = sorted(m.decode() if isinstance(m, bytes) else m for m in await r.smembers(INDEX_KEY))
+            values = await r.mget([PROC_PREFIX + i for i in ids]) if ids else []
+            gone = [i for i, v in zip(ids, values) if v is None]
+            if gone:
+                await r.srem(INDEX_KEY, *gone)
+            texts = [v.decode() if isinstance(v, bytes) else v for v in values if v is not None]
+        except Exception as e:
+            logger.warning("Metrics aggregation via Redis failed, serving this process only: %s", e)
+    if not texts:
+        texts = [render_local()]
+    return merge_expositions(texts) + (
+        "# HELP metrics_processes Processes whose metrics are included\n"
+        "# TYPE metrics_processes gauge\n"
+        f"metrics_processes {len(texts)}\n"
+    )
+
+
+async def publish_loop() -> None:
+    """Фоновая публикация снимка воркера uvicorn."""
+    while True:
+        await asyncio.sleep(settings.METRICS_PUBLISH_SECONDS)
+        try:
+            await publish()
+        except Exception as e:
+            logger.debug("Metrics publish failed: %s", e)
+
+
+_sync_publisher_pid: Optional[int] = None
+
+
+def _publish_sync() -> None:
+    def store(r: Any) -> None:
+        pipe = r.pipeline(transaction=False)
+        pipe.set(PROC_PREFIX + instance_id(), render_local(), ex=settings.METRICS_PROCESS_TTL_SECONDS)
+        pipe.sadd(INDEX_KEY, instance_id())
+        pipe.execute()
+
+    call_sync(store)
+
+
+def ensure_sync_publisher() -> None:
+    """Запускает поток публикации в процессе Celery (один на процесс; после fork — заново)."""
+    global _sync_publisher_pid
+    if _sync_publisher_pid == os.getpid():
+        return
+    _sync_publisher_pid = os.getpid()
+
+    def run() -> None:
+        while True:
+            try:
+                _publish_sync()
+            except Exception as e:
+                logger.debug("Metrics publish failed: %s", e)
+            time.sleep(settings.METRICS_PUBLISH_SECONDS)
+
+    threading.Thread(target=run, name="metrics-publisher", daemon=True).start()
@@ -0,0 +1,328 @@
+"""
+ASGI-middleware приложения: ограничение частоты запросов, сброс нагрузки, журнал запросов
+(access-лог), политика Cache-Control, метрики HTTP и заголовок Server-Timing.
+
+Написаны как «чистые» ASGI-обёртки (scope, receive, send), а не через BaseHTTPMiddleware:
+тот запускает обработчик в отдельной задаче и гонит тело ответа через memory stream,
+что на маленьких JSON-ответах заметно добавляет к задержке и снижает пропускную способность.
+Здесь запрос проходит напрямую, а статус ответа берётся из сообщения http.response.start.
+"""
+from __future__ import annotations
+
+import ipaddress
+import random
+import time
+from typing import Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.edge_cache import edge_url_var, is_refresh
+from app.core.http_cache import PUBLIC, cache_control, route_policy
+from app.core.load_shedding import AdaptiveLimiter, concurrency_limiter, request_lane
+from app.core.logging_setup import access_sample_rate, log_access
+from app.core.metrics import UNMATCHED_ROUTE, process_metrics
+from app.core.rate_limit import RateLimiter, client_bucket, rate_limiter, resolve_route
+from app.core.request_context import new_request_id, request_id_var
+from app.core.security import decode_access_token
+from app.core.server_timing import Timings, timings_var
+
+_TRUSTED_PROXIES = tuple(ipaddress.ip_network(n, strict=False) for n in settings.TRUSTED_PROXIES)
+
+
+def _trusted(ip: str) -> bool:
+    try:
+        addr = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return any(addr in net for net in _TRUSTED_PROXIES)
+
+
+def client_ip(scope: Scope) -> str:
+    """IP клиента с учётом доверенных прокси.
+
+    X-Forwarded-For читается справа налево, только если соединение пришло от доверенного
+    прокси (nginx): первый адрес не из TRUSTED_PROXIES и есть клиент. Заголовок от
+    клиента напрямую игнорируется — иначе его можно подделать и обойти лимит.
+    """
+    client = scope.get("client")
+    peer = client[0] if client else "unknown"
+    if not _trusted(peer):
+        return peer
+    headers = Headers(scope=scope)
+    hops = [h.strip() for value in headers.getlist("x-forwarded-for") for h in value.split(",") if h.strip()]
+    for hop in reversed(hops):
+        if not _trusted(hop):
+            try:
+                return str(ipaddress.ip_address(hop))
+            except ValueError:
+                return peer  # мусор в цепочке: дальше неё доверять нельзя
+    return hops[0] if hops else headers.get("x-real-ip", peer)
+
+
+class RateLimitMiddleware:
+    """Лимиты частоты по политикам маршрутов (app.core.rate_limit) с заголовками RateLimit-*.
+
+    Счётчики в Redis (общие для воркеров); при недоступном Redis — в памяти процесса.
+    Обновления микро-кэша nginx (app.core.edge_cache) от доверенного прокси лимитом не считаются.
+    """
+
+    def __init__(self, app: ASGIApp, limiter: RateLimiter = rate_limiter) -> None:
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route = resolve_route(scope["method"], scope["path"])
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+
+        client = scope.get("client")
+        if client and _trusted(client[0]) and is_refresh(_header(scope, b"x-edge-refresh")):
+            await self.app(scope, receive, send)
+            return
+
+        policy, cost = route
+        decision = await self.limiter.check(policy, client_bucket(client_ip(scope)), cost)
+        if not decision.allowed:
+            response = JSONResponse(status_code=429, content={"detail": "Too Many Requests"}, headers=decision.headers)
+            await response(scope, receive, send)
+            return
+
+        extra = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in decision.headers.items()]
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), *extra]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+class LoadSheddingMiddleware:
+    """Адаптивный предел одновременных запросов с классами приоритета (app.core.load_shedding).
+
+    Запрос сверх доли предела своего класса получает 503 с Retry-After, не дойдя до обработчика
+    и пула соединений БД.
+    """
+
+    def __init__(self, app: ASGIApp, limiter: AdaptiveLimiter = concurrency_limiter) -> None:
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.LOAD_SHED_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        lane = request_lane(scope["method"], scope["path"], _header(scope, b"authorization") is not None)
+        if lane is None:
+            await self.app(scope, receive, send)
+            return
+        if not self.limiter.try_acquire(lane):
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Service overloaded, retry later"},
+                headers={"Retry-After": str(settings.LOAD_SHED_RETRY_AFTER_SECONDS)},
+            )
+            await response(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.limiter.release(lane, time.perf_counter() - start)
+
+
+class RequestLoggerMiddleware:
+    """Присваивает запросу request id (X-Request-ID) и пишет выборочный JSON access-лог.
+
+    Запись идёт через очередь в фоновый поток (app.core.logging_setup); запросы, не попавшие
+    в выборку, ничего не выделяют сверх захвата статуса и X-Cache-Status.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        request_id = new_request_id(_header(scope, b"x-request-id"))
+        token = request_id_var.set(request_id)
+        status_code = 500  # исключение до начала ответа превратит в 500 ServerErrorMiddleware выше по стеку
+        cache_status: Optional[str] = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, cache_status
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = message.setdefault("headers", [])
+                for name, value in headers:
+                    if name == b"x-cache-status":
+                        cache_status = value.decode("latin-1")
+                        break
+                message["headers"] = [*headers, (b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration_ms = int((time.perf_counter() - start) * 1000)
+            path = scope["path"]
+            rate = access_sample_rate(path, status_code, cache_status, duration_ms)
+            if rate >= 1.0 or (rate > 0.0 and random.random() < rate):
+                log_access(scope["method"], path, status_code, duration_ms, client_ip(scope), cache_status, rate)
+            request_id_var.reset(token)
+
+
+class CacheControlMiddleware:
+    """Ставит Cache-Control по политике маршрутов (app.core.http_cache).
+
+    Для публичного чтения запоминает URL запроса в edge_url_var: при сборке ответа он
+    регистрируется под тегами, чтобы после записи обновить его в микро-кэше nginx.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        policy = route_policy(scope["method"], scope["path"], _header(scope, b"authorization") is not None)
+        if policy is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cache_control(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = message.get("headers", [])
+                value = cache_control(policy, message["status"])
+                if value is not None and not any(k == b"cache-control" for k, _ in headers):
+                    message["headers"] = [*headers, (b"cache-control", value.encode("latin-1"))]
+            await send(message)
+
+        if policy != PUBLIC:
+            await self.app(scope, receive, send_with_cache_control)
+            return
+        # Путь и query как в $request_uri nginx (ключ микро-кэша)
+        url = (scope.get("raw_path") or scope["path"].encode()).decode("latin-1")
+        if scope.get("query_string"):
+            url += "?" + scope["query_string"].decode("latin-1")
+        token = edge_url_var.set(url)
+        try:
+            await self.app(scope, receive, send_with_cache_control)
+        finally:
+            edge_url_var.reset(token)
+
+
+class MetricsMiddleware:
+    """Длительность запросов по шаблону маршрута и статусу и число запросов в обработке.
+
+    Шаблон (/api/v1/articles/{slug}) берётся из scope["route"], который роутер кладёт в тот же
+    scope при сопоставлении; запросы, не дошедшие до маршрута, идут под UNMATCHED_ROUTE —
+    число рядов не зависит от URL.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        process_metrics.in_flight += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            process_metrics.in_flight -= 1
+            process_metrics.request_done(scope["method"], route_template(scope), status_code, time.perf_counter() - start)
+
+
+class ServerTimingMiddleware:
+    """Заголовок Server-Timing с разбивкой времени запроса (app.core.server_timing).
+
+    В dev — на каждом ответе. В prod — по запросу администратора (X-Server-Timing: 1 и
+    действующий Bearer-токен) и в доле SERVER_TIMING_SAMPLE_RATE; выборочные ответы с
+    public Cache-Control идут без заголовка — иначе микро-кэш nginx раздал бы чужие тайминги.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.always = settings.ENVIRONMENT == "dev"
+
+    def _requested(self, scope: Scope) -> bool:
+        if self.always:
+            return True
+        if _header(scope, b"x-server-timing") == "1":
+            scheme, _, token = (_header(scope, b"authorization") or "").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                try:
+                    decode_access_token(token)
+                    return True
+                except Exception:
+                    pass
+        return settings.SERVER_TIMING_SAMPLE_RATE > 0.0 and random.random() < settings.SERVER_TIMING_SAMPLE_RATE
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        timings = Timings()
+        token = timings_var.set(timings)
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = message.get("headers", [])
+                shared = any(k == b"cache-control" and b"public" in v for k, v in headers)
+                if self.always or not shared:
+                    message["headers"] = [*headers, (b"server-timing", timings.header().encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            timings_var.reset(token)
+
+
+def route_template(scope: Scope) -> str:
+    """Шаблон пути маршрута, обработавшего запрос (/api/v1/articles/{slug})."""
+    template = getattr(scope.get("route"), "path_format", None)
+    if not template:
+        return UNMATCHED_ROUTE
+    # Маршрут вложенного роутера может знать только свой путь без префикса include_router:
+    # префикс восстанавливается по фактическому пути запроса
+    try:
+        rendered = template.format(**scope.get("path_params", {}))
+    except (KeyError, IndexError, ValueError):
+        return template
+    path = scope["path"]
+    if path.endswith(rendered):
+        return path[: len(path) - len(rendered)] + template
+    return template
+
+
+def _header(scope: Scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", ()):
+        if key == name:
+            return value.decode("latin-1")
+    return None
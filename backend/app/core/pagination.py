@@ -0,0 +1,92 @@
+"""
+Keyset-пагинация (курсоры) для списков.
+
+OFFSET заставляет БД пройти и отбросить все предыдущие строки: глубокие страницы растущей
+таблицы (журнал аудита) становятся всё медленнее, а новые строки сдвигают выдачу между
+запросами. Здесь страница задаётся последней увиденной парой (значение сортировки, id):
+следующая выбирается условием (col, id) < (value, id) по составному индексу (col, id) и
+стоит одинаково на любой глубине.
+
+Курсор непрозрачен для клиента: base64url от JSON {"k": порядок, "v": значение, "id": id}.
+Подделка курсора ничего не открывает — он только задаёт позицию в той же выборке с теми же
+фильтрами и правами. Сортировка по views_count — «мягкая»: счётчик меняется, и статья может
+переместиться между страницами.
+"""
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Generic, List, Optional, Sequence, Tuple, TypeVar
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlalchemy import Select, desc, tuple_
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class Keyset:
+    """Порядок выдачи: колонка сортировки по убыванию, при равенстве — id по убыванию."""
+
+    name: str  # записывается в курсор: курсор одного порядка не принимается для другого
+    column: Any
+    id_column: Any
+    parse: Callable[[Any], Any]  # значение из курсора -> значение колонки
+    dump: Callable[[Any], Any]  # значение колонки -> JSON
+
+    def order(self, query: Select) -> Select:
+        return query.order_by(desc(self.column), desc(self.id_column))
+
+
+def datetime_keyset(name: str, column: Any, id_column: Any) -> Keyset:
+    return Keyset(name, column, id_column, datetime.fromisoformat, lambda v: v.isoformat())
+
+
+def int_keyset(name: str, column: Any, id_column: Any) -> Keyset:
+    return Keyset(name, column, id_column, int, int)
+
+
+def encode_cursor(keyset: Keyset, row: Any) -> str:
+    payload = {"k": keyset.name, "v": keyset.dump(getattr(row, keyset.column.key)), "id": str(row.id)}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(keyset: Keyset, cursor: str) -> Tuple[Any, UUID]:
+    """Позиция из курсора; 400 — курсор испорчен или выдан для другого порядка."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if payload["k"] != keyset.name:
+            raise ValueError("cursor order mismatch")
+        return keyset.parse(payload["v"]), UUID(payload["id"])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def paginate(query: Select, keyset: Keyset, limit: int, cursor: Optional[str] = None, offset: int = 0) -> Select:
+    """Страница выборки: после курсора, а без него — по OFFSET (совместимость). Выбирает limit + 1 строку."""
+    query = keyset.order(query)
+    if cursor:
+        value, last_id = decode_cursor(keyset, cursor)
+        query = query.where(tuple_(keyset.column, keyset.id_column) < tuple_(value, last_id))
+    elif offset:
+        query = query.offset(offset)
+    return query.limit(limit + 1)
+
+
+@dataclass
+class Page(Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str]
+
+
+def page_of(rows: Sequence[T], keyset: Keyset, limit: int) -> Page[T]:
+    """Отрезает лишнюю строку от paginate; next_cursor — если за страницей есть ещё строки."""
+    items = list(rows[:limit])
+    next_cursor = encode_cursor(keyset, items[-1]) if len(rows) > limit and items else None
+    return Page(items, next_cursor)
@@ -0,0 +1,217 @@
+"""
+Ограничение частоты запросов по алгоритму GCRA (generic cell rate algorithm).
+
+Для каждой пары (политика, клиент) хранится одно число — «теоретическое время прибытия»
+(TAT) следующего запроса. Запрос стоимостью cost сдвигает TAT на cost * period / limit и
+пропускается, если новый TAT опережает текущее время не больше чем на period. Получается
+скользящее окно без набора отметок времени: ключ на клиента, который сам истекает,
+а остаток и время сброса вычисляются из того же числа.
+
+В Redis проверка и запись выполняются одним Lua-скриптом — атомарно и за один round trip,
+общие лимиты для всех воркеров. Если Redis недоступен, тот же алгоритм работает в памяти
+процесса на ограниченном LRU с истечением записей (лимит тогда считается на воркер).
+
+Политики назначаются по маршрутам (ROUTE_RULES): формы (POST /leads, /consents) — строго,
+чтение /api/v1 — щедро, /admin — отдельно, пакетные запросы стоят дороже одиночных.
+"""
+from __future__ import annotations
+
+import ipaddress
+import logging
+import math
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+
+logger = logging.getLogger("core.rate_limit")
+
+KEY_PREFIX = "rl"
+
+# KEYS[1] — TAT клиента (мс). ARGV: сейчас (мс), интервал между запросами (мс), лимит, стоимость.
+# Возвращает {пропущен, остаток, повторить через (мс), полный сброс через (мс)}
+_GCRA_LUA = """
+local now = tonumber(ARGV[1])
+local emission = tonumber(ARGV[2])
+local tolerance = emission * tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+local new_tat = tat + emission * tonumber(ARGV[4])
+local allow_at = new_tat - tolerance
+if now < allow_at then
+  return {0, 0, math.ceil(allow_at - now), math.ceil(tat - now)}
+end
+new_tat = math.ceil(new_tat)
+redis.call('SET', KEYS[1], new_tat, 'PX', new_tat - now)
+return {1, math.floor((now - allow_at) / emission), 0, new_tat - now}
+"""
+
+
+@dataclass(frozen=True)
+class RatePolicy:
+    name: str
+    limit: int
+    period_seconds: int = 60
+
+    @property
+    def emission_ms(self) -> float:
+        """Интервал между запросами при равномерной нагрузке на пределе лимита."""
+        return self.period_seconds * 1000 / max(1, self.limit)
+
+    @property
+    def header(self) -> str:
+        return f"{self.limit};w={self.period_seconds}"
+
+
+@dataclass(frozen=True)
+class RouteRule:
+    policy: str
+    pattern: "re.Pattern[str]"
+    methods: Optional[FrozenSet[str]] = None  # None — любые
+    cost: int = 1
+
+    def matches(self, method: str, path: str) -> bool:
+        return (self.methods is None or method in self.methods) and self.pattern.match(path) is not None
+
+
+@dataclass(frozen=True)
+class RateDecision:
+    allowed: bool
+    policy: RatePolicy
+    remaining: int
+    retry_after_ms: int
+    reset_ms: int
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        """Заголовки RateLimit-* (draft-ietf-httpapi-ratelimit-headers), на 429 — и Retry-After."""
+        headers = {
+            "RateLimit-Limit": str(self.policy.limit),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(math.ceil(self.reset_ms / 1000)),
+            "RateLimit-Policy": self.policy.header,
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after_ms / 1000)))
+        return headers
+
+
+POLICIES: Dict[str, RatePolicy] = {
+    "default": RatePolicy("default", settings.RATE_LIMIT_PER_MINUTE),
+    "read": RatePolicy("read", settings.RATE_LIMIT_READ_PER_MINUTE),
+    "forms": RatePolicy("forms", settings.RATE_LIMIT_FORMS_PER_MINUTE),
+    "admin": RatePolicy("admin", settings.RATE_LIMIT_ADMIN_PER_MINUTE),
+}
+
+_READ = frozenset({"GET", "HEAD"})
+
+# Первое совпадение определяет политику и стоимость; не совпало ничего — "default"
+ROUTE_RULES: Tuple[RouteRule, ...] = (
+    RouteRule("forms", re.compile(r"^/api/v1/(leads|consents)/?$"), frozenset({"POST"})),
+    RouteRule("admin", re.compile(r"^/admin(/|$)")),
+    RouteRule("read", re.compile(r"^/api/v1/[^/]+/batch/?$"), _READ, cost=settings.RATE_LIMIT_BATCH_COST),
+    RouteRule("read", re.compile(r"^/api/v1/"), _READ),
+)
+
+# Служебные пути не ограничиваются: healthcheck docker и сбор метрик внутри сети
+EXEMPT_PATHS = frozenset({"/health", "/metrics"})
+EXEMPT_PREFIXES = ("/metrics/",)
+
+
+def resolve_route(method: str, path: str) -> Optional[Tuple[RatePolicy, int]]:
+    """Политика и стоимость запроса; None — путь не ограничивается."""
+    if path in EXEMPT_PATHS or path.startswith(EXEMPT_PREFIXES):
+        return None
+    for rule in ROUTE_RULES:
+        if rule.matches(method, path):
+            return POLICIES[rule.policy], rule.cost
+    return POLICIES["default"], 1
+
+
+def client_bucket(ip: str) -> str:
+    """Идентификатор клиента для лимита: IPv6 — по сети /64 (адреса внутри неё выдаются одному абоненту)."""
+    try:
+        addr = ipaddress.ip_address(ip)
+    except ValueError:
+        return "unknown"
+    if addr.version == 6:
+        if addr.ipv4_mapped is not None:
+            return str(addr.ipv4_mapped)
+        return str(ipaddress.ip_network(f"{addr}/64", strict=False).network_address) + "/64"
+    return str(addr)
+
+
+class MemoryGCRA:
+    """Тот же GCRA в памяти процесса: не больше max_keys клиентов, истёкшие записи удаляются."""
+
+    def __init__(self, max_keys: int) -> None:
+        self.max_keys = max(1, max_keys)
+        self._tat: "OrderedDict[str, float]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._tat)
+
+    def _prune(self, now: float) -> None:
+        # Самые давние записи — в начале; TAT в прошлом означает полностью восстановленный лимит
+        while self._tat:
+            key, tat = next(iter(self._tat.items()))
+            if tat > now and len(self._tat) <= self.max_keys:
+                break
+            del self._tat[key]
+
+    def check(self, key: str, policy: RatePolicy, cost: int, now_ms: float) -> RateDecision:
+        emission = policy.emission_ms
+        tat = max(self._tat.get(key, now_ms), now_ms)
+        new_tat = tat + emission * cost
+        allow_at = new_tat - emission * policy.limit
+        if now_ms < allow_at:
+            return RateDecision(False, policy, 0, math.ceil(allow_at - now_ms), math.ceil(tat - now_ms))
+        self._tat[key] = new_tat
+        self._tat.move_to_end(key)
+        self._prune(now_ms)
+        return RateDecision(True, policy, int((now_ms - allow_at) // emission), 0, math.ceil(new_tat - now_ms))
+
+
+class RateLimiter:
+    def __init__(self, memory_max_keys: int) -> None:
+        self.memory = MemoryGCRA(memory_max_keys)
+        self.allowed: Dict[str, int] = {}
+        self.limited: Dict[str, int] = {}
+        self.fallbacks = 0
+
+    async def check(self, policy: RatePolicy, client: str, cost: int = 1) -> RateDecision:
+        key = f"{KEY_PREFIX}:{policy.name}:{client}"
+        now_ms = time.time() * 1000
+        decision: Optional[RateDecision] = None
+        # Общий клиент Redis; None — не настроен или разомкнут выключатель (сразу в память)
+        r = get_redis()
+        if r is not None:
+            try:
+                allowed, remaining, retry_ms, reset_ms = await r.eval(
+                    _GCRA_LUA, 1, key, int(now_ms), policy.emission_ms, policy.limit, cost
+                )
+                decision = RateDecision(bool(allowed), policy, int(remaining), int(retry_ms), int(reset_ms))
+            except Exception as e:
+                logger.debug("Rate limit via Redis failed, using memory: %s", e)
+        if decision is None:
+            self.fallbacks += 1
+            decision = self.memory.check(key, policy, cost, now_ms)
+        counter = self.allowed if decision.allowed else self.limited
+        counter[policy.name] = counter.get(policy.name, 0) + 1
+        return decision
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "policies": {p.name: p.header for p in POLICIES.values()},
+            "allowed": dict(self.allowed),
+            "limited": dict(self.limited),
+            "memory_fallbacks": self.fallbacks,
+            "memory_keys": len(self.memory),
+        }
+
+
+rate_limiter = RateLimiter(settings.RATE_LIMIT_MEMORY_MAX_KEYS)
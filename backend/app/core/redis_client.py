@@ -0,0 +1,232 @@
+"""
+Общий пул Redis с таймаутами и автоматическим выключателем (circuit breaker).
+
+Кэш, rate-limit middleware, шина инвалидации и лимитер OpenAI работают через один клиент
+на процесс (get_redis / get_sync_redis) с короткими socket/connect таймаутами.
+После REDIS_BREAKER_FAILURES подряд ошибок соединения выключатель размыкается: get_redis()
+сразу возвращает None, и вызывающий код идёт по своему фолбэку, не дожидаясь таймаута на
+каждом запросе. Фоновая проверка (PING раз в REDIS_BREAKER_RESET_SECONDS) замыкает его обратно.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+try:
+    import redis.asyncio as aioredis
+    from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+except Exception:
+    aioredis = None
+    RedisConnectionError = RedisTimeoutError = OSError
+
+try:
+    import redis as sync_redis
+except Exception:
+    sync_redis = None
+
+from app.core.config import settings
+
+logger = logging.getLogger("core.redis")
+
+# Ошибки, означающие недоступность Redis (а не ошибку команды)
+UNAVAILABLE_ERRORS = (RedisConnectionError, RedisTimeoutError, OSError, asyncio.TimeoutError)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Размыкается после N ошибок подряд. Если задана асинхронная проверка probe, замыкается
+    по её успеху в фоне; иначе через reset_seconds пропускает один пробный вызов (half-open)."""
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int,
+        reset_seconds: float,
+        probe: Optional[Callable[[], Awaitable[Any]]] = None,
+    ) -> None:
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.probe = probe
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.failures_total = 0
+        self.opens_total = 0
+        self.opened_at = 0.0
+        self._probe_task: Optional["asyncio.Task[None]"] = None
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        now = time.monotonic()
+        if self._probe_task is None and now - self.opened_at >= self.reset_seconds:
+            # Один пробный вызов за интервал: успех замкнёт цепь, ошибка снова разомкнёт
+            self.state = HALF_OPEN
+            self.opened_at = now
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+        if self.state != CLOSED:
+            logger.info("Redis circuit %s closed", self.name)
+            self.state = CLOSED
+
+    def record_failure(self) -> None:
+        self.failures_total += 1
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN or (self.state == CLOSED and self.consecutive_failures >= self.failure_threshold):
+            self._open()
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.opens_total += 1
+        logger.warning("Redis circuit %s opened after %d failures", self.name, self.consecutive_failures)
+        if self.probe is not None and self._probe_task is None:
+            try:
+                self._probe_task = asyncio.get_running_loop().create_task(self._probe_loop())
+            except RuntimeError:
+                self._probe_task = None  # нет цикла событий — остаётся half-open по таймеру
+
+    async def _probe_loop(self) -> None:
+        try:
+            while self.state != CLOSED:
+                await asyncio.sleep(self.reset_seconds)
+                try:
+                    await self.probe()
+                except Exception as e:
+                    logger.debug("Redis circuit %s probe failed: %s", self.name, e)
+                    self.opened_at = time.monotonic()
+                    continue
+                self.record_success()
+        finally:
+            self._probe_task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failures_total": self.failures_total,
+            "opens_total": self.opens_total,
+        }
+
+
+if aioredis is not None:
+
+    class BreakerRedis(aioredis.Redis):
+        """Клиент, сообщающий выключателю об успехах и ошибках соединения каждой команды и конвейера."""
+
+        breaker: CircuitBreaker
+
+        async def execute_command(self, *args: Any, **options: Any) -> Any:
+            try:
+                result = await super().execute_command(*args, **options)
+            except UNAVAILABLE_ERRORS:
+                self.breaker.record_failure()
+                raise
+            self.breaker.record_success()
+            return result
+
+        def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> "BreakerPipeline":
+            pipe = BreakerPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+            pipe.breaker = self.breaker
+            return pipe
+
+    class BreakerPipeline(aioredis.client.Pipeline):
+        """Конвейер команд: execute() учитывается выключателем как одна команда."""
+
+        breaker: CircuitBreaker
+
+        async def execute(self, raise_on_error: bool = True) -> List[Any]:
+            if not self.command_stack and not self.watching:
+                return []
+            try:
+                result = await super().execute(raise_on_error)
+            except UNAVAILABLE_ERRORS:
+                self.breaker.record_failure()
+                raise
+            self.breaker.record_success()
+            return result
+
+
+_redis: Optional["aioredis.Redis"] = None
+_sync_redis: Optional["sync_redis.Redis"] = None
+
+
+async def _ping() -> None:
+    if _redis is None:
+        raise RuntimeError("Redis client is closed")
+    # Мимо выключателя: иначе проверка сама прошла бы через разомкнутую цепь
+    await aioredis.Redis.execute_command(_redis, "PING")
+
+
+breaker = CircuitBreaker("async", settings.REDIS_BREAKER_FAILURES, settings.REDIS_BREAKER_RESET_SECONDS, probe=_ping)
+sync_breaker = CircuitBreaker("sync", settings.REDIS_BREAKER_FAILURES, settings.REDIS_BREAKER_RESET_SECONDS)
+
+
+def _pool_kwargs() -> Dict[str, Any]:
+    return {
+        "max_connections": settings.REDIS_MAX_CONNECTIONS,
+        "socket_timeout": settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+        "socket_connect_timeout": settings.REDIS_CONNECT_TIMEOUT_SECONDS,
+        "health_check_interval": settings.REDIS_HEALTH_CHECK_SECONDS,
+    }
+
+
+def get_redis() -> Optional["aioredis.Redis"]:
+    """Общий асинхронный клиент процесса; None — Redis не настроен или выключатель разомкнут.
+
+    Ответы — bytes (без decode_responses): в кэше лежат готовые тела ответов.
+    """
+    global _redis
+    if aioredis is None or not settings.effective_redis_url:
+        return None
+    if _redis is None:
+        pool = aioredis.ConnectionPool.from_url(settings.effective_redis_url, **_pool_kwargs())
+        _redis = BreakerRedis(connection_pool=pool)
+        _redis.breaker = breaker
+    return _redis if breaker.allow() else None
+
+
+def get_sync_redis() -> Optional["sync_redis.Redis"]:
+    """Синхронный клиент (Celery-задачи, OpenAIService) с теми же таймаутами и своим выключателем."""
+    global _sync_redis
+    if sync_redis is None or not settings.effective_redis_url:
+        return None
+    if _sync_redis is None:
+        _sync_redis = sync_redis.Redis(
+            connection_pool=sync_redis.ConnectionPool.from_url(settings.effective_redis_url, **_pool_kwargs())
+        )
+    return _sync_redis if sync_breaker.allow() else None
+
+
+def call_sync(fn: Callable[["sync_redis.Redis"], Any], default: Any = None) -> Any:
+    """Выполняет fn(клиент) с учётом выключателя; при недоступности Redis возвращает default."""
+    r = get_sync_redis()
+    if r is None:
+        return default
+    try:
+        result = fn(r)
+    except UNAVAILABLE_ERRORS as e:
+        sync_breaker.record_failure()
+        logger.warning("Redis (sync) unavailable: %s", e)
+        return default
+    sync_breaker.record_success()
+    return result
+
+
+async def close_redis() -> None:
+    global _redis
+    client, _redis = _redis, None
+    if client is not None:
+        await client.aclose()
+
+
+def redis_stats() -> Dict[str, Any]:
+    return {"async": breaker.stats(), "sync": sync_breaker.stats()}
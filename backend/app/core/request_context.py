@@ -0,0 +1,41 @@
+"""
+Идентификатор запроса (request id) в контексте выполнения.
+
+Middleware журнала запросов кладёт его в contextvar на время обработки запроса. Оттуда его
+читают JSON-логи (RequestIdFilter), записи AuditLog (details.request_id) и Celery: при
+публикации задачи id уходит в заголовки сообщения, а воркер восстанавливает его на время
+выполнения задачи. Так по одному id находятся строка access-лога, аудит и логи фоновой задачи.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import re
+from contextvars import ContextVar
+from typing import Optional
+
+REQUEST_ID_HEADER = "x-request-id"
+
+# Входящий id (например, $request_id от nginx) принимаем, только если он похож на id
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{8,64}$")
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+
+def get_request_id() -> Optional[str]:
+    return request_id_var.get()
+
+
+def new_request_id(incoming: Optional[str] = None) -> str:
+    if incoming and _VALID_REQUEST_ID.match(incoming):
+        return incoming
+    return os.urandom(8).hex()
+
+
+class RequestIdFilter(logging.Filter):
+    """Добавляет record.request_id ("-" вне запроса), чтобы его можно было вывести в формате."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get() or "-"
+        return True
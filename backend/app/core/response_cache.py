@@ -0,0 +1,344 @@
+"""
+Кэш готовых HTTP-ответов публичного контента.
+
+Тело сериализуется один раз при заполнении кэша (как это сделал бы response_model
+с response_model_exclude_none=True) и хранится вместе с content-type. При попадании байты
+отдаются как есть через Response: без json.loads, Pydantic-моделей и повторной валидации.
+
+Там же один раз готовятся сжатые варианты (gzip и, если установлен пакет brotli, br).
+Вариант выбирается по Accept-Encoding запроса и уходит с Content-Encoding, поэтому
+nginx не сжимает такие ответы повторно.
+
+В метаданных записи хранятся валидаторы: ETag (хэш тела) и Last-Modified (updated_at
+сущности, для списков — время сборки). Клиент с совпадающим If-None-Match (или, без него,
+If-Modified-Since не раньше Last-Modified) получает 304 без тела — при попадании в кэш
+это не трогает ни БД, ни сериализацию. Сжатые варианты имеют свои сильные ETag
+(суффикс -br/-gzip), но при сравнении считаются тем же ресурсом.
+"""
+from __future__ import annotations
+
+import asyncio
+import gzip
+import hashlib
+import json
+import time
+from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence
+
+from fastapi import Response
+from pydantic import TypeAdapter
+from starlette.types import Receive, Scope, Send
+
+from app.core.cache import CACHE_HIT, CACHE_MISS, CacheResult, RawValue, TagsArg, cache_fetch, cache_fetch_many
+from app.core.config import settings
+from app.core.edge_cache import remember as remember_edge_url
+from app.core.server_timing import build_span, span
+
+try:
+    import brotli
+except Exception:
+    brotli = None
+
+JSON_MEDIA_TYPE = "application/json"
+
+# X-Cache-Status пакетного ответа, когда часть элементов пришла из кэша, а часть загружена
+CACHE_PARTIAL = "PARTIAL"
+
+# Предпочтение при равном q: brotli плотнее gzip
+ENCODINGS_PREFERENCE = ("br", "gzip")
+
+_adapters: Dict[Any, TypeAdapter] = {}
+
+# Статистика сжатия текущего воркера: encoding -> счётчики
+_compression_stats: Dict[str, Dict[str, int]] = {
+    enc: {"compressed": 0, "original_bytes": 0, "compressed_bytes": 0, "served": 0, "bytes_saved": 0}
+    for enc in ENCODINGS_PREFERENCE
+}
+
+
+# Условные запросы текущего воркера: сколько ответов ушло 304 и сколько байт тела не отправлено
+_conditional_stats: Dict[str, int] = {"not_modified": 0, "bytes_saved": 0}
+
+# Заголовки, которые остаются в ответе 304 (RFC 9110, 15.4.5) плюс статус кэша
+NOT_MODIFIED_HEADERS = frozenset({
+    b"etag", b"last-modified", b"vary", b"cache-control", b"expires", b"content-location", b"date",
+    b"x-cache-status", b"age",
+})
+
+
+def _adapter(model: Any) -> TypeAdapter:
+    adapter = _adapters.get(model)
+    if adapter is None:
+        adapter = _adapters[model] = TypeAdapter(model)
+    return adapter
+
+
+def render_json(value: Any, model: Any) -> bytes:
+    """JSON-тело ответа по схеме model (None-поля опускаются, как в эндпоинтах)."""
+    return _adapter(model).dump_json(value, exclude_none=True)
+
+
+def compress_variants(body: bytes) -> Dict[str, bytes]:
+    """Сжатые варианты тела; маленькие тела и варианты, не давшие выигрыша, пропускаются."""
+    if len(body) < settings.RESPONSE_COMPRESS_MIN_BYTES:
+        return {}
+    variants: Dict[str, bytes] = {}
+    if brotli is not None:
+        variants["br"] = brotli.compress(body, quality=settings.RESPONSE_BROTLI_QUALITY)
+    # mtime=0: одинаковое тело даёт одинаковые байты (стабильные ETag и кэш прокси)
+    variants["gzip"] = gzip.compress(body, compresslevel=settings.RESPONSE_GZIP_LEVEL, mtime=0)
+    return {enc: data for enc, data in variants.items() if len(data) < len(body)}
+
+
+def entity_validators(body: bytes, value: Any) -> Dict[str, Any]:
+    """Метаданные записи для условных запросов: etag — хэш тела, lm — Last-Modified (unix-время).
+
+    Last-Modified берётся из updated_at сущности; у списков и сущностей без updated_at
+    (удаление элемента не сдвигает ничей updated_at) — время сборки тела.
+    """
+    updated = getattr(value, "updated_at", None)
+    return {
+        "etag": hashlib.blake2b(body, digest_size=16).hexdigest(),
+        "lm": int(updated.timestamp()) if isinstance(updated, datetime) else int(time.time()),
+    }
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Сравнение If-None-Match (слабое, как требует RFC 9110): любой вариант кодировки того же тела."""
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag.strip('"').partition("-")[0] == etag:
+            return True
+    return False
+
+
+def not_modified_since(if_modified_since: str, last_modified: int) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    return since.tzinfo is not None and last_modified <= since.timestamp()
+
+
+def _record_compression(body: bytes, variants: Dict[str, bytes]) -> None:
+    for enc, data in variants.items():
+        stats = _compression_stats[enc]
+        stats["compressed"] += 1
+        stats["original_bytes"] += len(body)
+        stats["compressed_bytes"] += len(data)
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Accept-Encoding -> {кодировка: q}. Некорректные q считаются нулём."""
+    accepted: Dict[str, float] = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name] = q
+    return accepted
+
+
+def choose_encoding(header: str, available: Dict[str, bytes]) -> Optional[str]:
+    """Лучший из имеющихся вариантов, который принимает клиент; None — отдать несжатое тело."""
+    if not header or not available:
+        return None
+    accepted = parse_accept_encoding(header)
+    best: Optional[str] = None
+    best_q = 0.0
+    for enc in ENCODINGS_PREFERENCE:
+        if enc not in available:
+            continue
+        q = accepted.get(enc, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = enc, q
+    return best
+
+
+def compression_stats() -> Dict[str, Any]:
+    """Степень сжатия и сэкономленные байты по кодировкам (с момента старта воркера)."""
+    out: Dict[str, Any] = {}
+    for enc, stats in _compression_stats.items():
+        ratio = stats["original_bytes"] / stats["compressed_bytes"] if stats["compressed_bytes"] else None
+        out[enc] = {**stats, "ratio": round(ratio, 2) if ratio else None}
+    out["brotli_available"] = brotli is not None
+    return out
+
+
+def conditional_stats() -> Dict[str, int]:
+    return dict(_conditional_stats)
+
+
+class CachedBytesResponse(Response):
+    """Ответ из кэшированных байтов; сжатый вариант выбирается при отправке по Accept-Encoding,
+    на совпавший If-None-Match / If-Modified-Since уходит 304 без тела."""
+
+    def __init__(self, raw: RawValue, headers: Optional[Dict[str, str]] = None) -> None:
+        self.raw = raw
+        super().__init__(content=raw.data, media_type=raw.meta.get("ct", JSON_MEDIA_TYPE), headers=headers)
+        if raw.variants:
+            self.headers["vary"] = "Accept-Encoding"
+        # Записи без валидаторов (созданные до их появления) отдаются без ETag до перезаполнения
+        self.etag: Optional[str] = raw.meta.get("etag")
+        self.last_modified: Optional[int] = raw.meta.get("lm")
+        if self.etag is not None:
+            self.headers["etag"] = f'"{self.etag}"'
+        if self.last_modified is not None:
+            self.headers["last-modified"] = formatdate(self.last_modified, usegmt=True)
+
+    def _is_not_modified(self, if_none_match: Optional[str], if_modified_since: Optional[str]) -> bool:
+        # If-Modified-Since учитывается только без If-None-Match (RFC 9110, 13.1.3)
+        if if_none_match is not None:
+            return self.etag is not None and etag_matches(if_none_match, self.etag)
+        if if_modified_since is not None and self.last_modified is not None:
+            return not_modified_since(if_modified_since, self.last_modified)
+        return False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        accept = ""
+        if_none_match: Optional[str] = None
+        if_modified_since: Optional[str] = None
+        for name, value in scope.get("headers", []):
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+            elif name == b"if-none-match":
+                if_none_match = value.decode("latin-1")
+            elif name == b"if-modified-since":
+                if_modified_since = value.decode("latin-1")
+        encoding = choose_encoding(accept, self.raw.variants)
+        if encoding is not None:
+            self.body = self.raw.variants[encoding]
+            self.headers["content-encoding"] = encoding
+            self.headers["content-length"] = str(len(self.body))
+            if self.etag is not None:
+                self.headers["etag"] = f'"{self.etag}-{encoding}"'
+
+        if self._is_not_modified(if_none_match, if_modified_since):
+            _conditional_stats["not_modified"] += 1
+            _conditional_stats["bytes_saved"] += len(self.body)
+            await send({
+                "type": "http.response.start",
+                "status": 304,
+                "headers": [(k, v) for k, v in self.raw_headers if k in NOT_MODIFIED_HEADERS],
+            })
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if encoding is not None:
+            stats = _compression_stats[encoding]
+            stats["served"] += 1
+            stats["bytes_saved"] += len(self.raw.data) - len(self.body)
+        await super().__call__(scope, receive, send)
+
+
+def raw_response(result: CacheResult) -> Response:
+    return CachedBytesResponse(result.value, headers=result.headers)
+
+
+async def cached_json_response(
+    key: str,
+    loader: Callable[[], Awaitable[Any]],
+    model: Any,
+    ttl_seconds: int,
+    tags: Optional[TagsArg] = None,
+) -> Response:
+    """Ответ из кэша готовых байтов; при промахе loader строит модель, она сериализуется один раз.
+
+    tags — список тегов либо функция от модели, которую вернул loader.
+    """
+    entity_tags: List[str] = []
+
+    async def render() -> RawValue:
+        with build_span():
+            value = await loader()
+        entity_tags.extend(tags(value) if callable(tags) else (tags or ()))
+        with span("serialize"):
+            body = render_json(value, model)
+            # Сжатие на максимальных уровнях — в пуле потоков, чтобы не держать цикл событий
+            variants = await asyncio.to_thread(compress_variants, body)
+        _record_compression(body, variants)
+        # Теги хранятся в записи: по ним URL регистрируется и при попадании в кэш
+        meta = {"ct": JSON_MEDIA_TYPE, **entity_validators(body, value), "tags": list(entity_tags)}
+        return RawValue(body, meta, variants)
+
+    result = await cache_fetch(
+        key,
+        render,
+        ttl_seconds=ttl_seconds,
+        tags=lambda _: entity_tags,
+    )
+    # URL публичного запроса — под тегами ответа, чтобы обновить его в микро-кэше nginx. На каждом
+    # ответе, а не только при сборке: nginx перезапрашивает URL и тогда, когда кэш приложения тёплый
+    await remember_edge_url(_entry_tags(result.value, tags))
+    return raw_response(result)
+
+
+def _entry_tags(value: RawValue, tags: Optional[TagsArg]) -> Iterable[str]:
+    if "tags" in value.meta:
+        return value.meta["tags"]
+    # Запись, собранная до того, как теги стали храниться в ней
+    return () if callable(tags) else (tags or ())
+
+
+async def cached_json_batch(
+    idents: Sequence[str],
+    key_for: Callable[[str], str],
+    loader: Callable[[List[str]], Awaitable[Dict[str, Any]]],
+    model: Any,
+    ttl_seconds: int,
+    tags: Optional[Callable[[Any], Iterable[str]]] = None,
+) -> Response:
+    """Пакетный ответ {"items": [...], "missing": [...]} из тех же записей, что и одиночные эндпоинты.
+
+    Попадания берутся одним MGET, промахи loader загружает одним запросом
+    ({идентификатор: модель}). Тело собирается из готовых байтов элементов без повторной
+    сериализации; порядок items — как в idents, не найденные идентификаторы — в missing.
+    """
+    entity_tags: Dict[str, List[str]] = {}
+
+    async def render_many(missing: List[str]) -> Dict[str, RawValue]:
+        with build_span():
+            values = await loader(missing)
+        with span("serialize"):
+            bodies = {ident: render_json(value, model) for ident, value in values.items()}
+            variants = await asyncio.to_thread(lambda: {i: compress_variants(b) for i, b in bodies.items()})
+        rendered: Dict[str, RawValue] = {}
+        for ident, body in bodies.items():
+            _record_compression(body, variants[ident])
+            entity_tags[ident] = list(tags(values[ident])) if tags is not None else []
+            meta = {"ct": JSON_MEDIA_TYPE, **entity_validators(body, values[ident]), "tags": entity_tags[ident]}
+            rendered[ident] = RawValue(body, meta, variants[ident])
+        return rendered
+
+    results = await cache_fetch_many(
+        {ident: key_for(ident) for ident in idents},
+        render_many,
+        ttl_seconds=ttl_seconds,
+        tags=lambda ident, _: entity_tags.get(ident, ()),
+    )
+    await remember_edge_url(t for r in results.values() for t in _entry_tags(r.value, None))
+    items = [results[ident].value.data for ident in idents if ident in results]
+    missing = [ident for ident in idents if ident not in results]
+    body = b'{"items":[' + b",".join(items) + b'],"missing":' + json.dumps(missing, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"}"
+
+    statuses = {r.status for r in results.values()}
+    if statuses <= {CACHE_HIT} and results:
+        status = CACHE_HIT
+    elif statuses <= {CACHE_MISS}:
+        status = CACHE_MISS
+    else:
+        status = CACHE_PARTIAL
+    return Response(content=body, media_type=JSON_MEDIA_TYPE, headers={"X-Cache-Status": status})
@@ -7,7 +7,7 @@ from passlib.context import CryptContext
 from cryptography.fernet import Fernet, InvalidToken
 
 from app.core.config import settings
-from app.core.database import AsyncSessionLocal
+from app.core.database import AUDIT, session_for
 from app.models.audit_log import AuditLog
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -83,7 +83,7 @@ def audit_log(action: str, target: str) -> Callable[..., Any]:
 
             try:
                 result = await func(*args, **kwargs)
-                async with AsyncSessionLocal() as session:
+                async with session_for(AUDIT) as session:
                     session.add(
                         AuditLog(
                             actor=actor,
@@ -95,7 +95,7 @@ def audit_log(action: str, target: str) -> Callable[..., Any]:
                     await session.commit()
                 return result
             except Exception as exc:
-                async with AsyncSessionLocal() as session:
+                async with session_for(AUDIT) as session:
                     session.add(
                         AuditLog(
                             actor=actor,
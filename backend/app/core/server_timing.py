@@ -0,0 +1,116 @@
+"""
+Разбивка времени запроса для заголовка Server-Timing.
+
+Пока запрос в выборке (см. ServerTimingMiddleware), в contextvar лежит объект Timings, куда
+складываются отрезки:
+- cache — обращения к Redis (app.core.cache);
+- db — выполнение SQL, сумма по всем запросам (события SQLAlchemy), в desc — их число;
+- build — загрузчик ответа кэша без SQL: гидратация ORM и построение Pydantic-моделей;
+- serialize — JSON-кодирование и сжатие тела (app.core.response_cache);
+- handler — остаток до начала ответа: код эндпоинта, зависимости, middleware;
+- total — от входа в middleware до отправки заголовков ответа.
+
+Вне выборки contextvar пуст и хуки сводятся к одному чтению contextvar.
+Отрезки, закончившиеся после отправки заголовков (фоновое обновление кэша), в ответ не попадают.
+"""
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import event
+
+# Порядок в заголовке; handler и total вычисляются при сборке
+SPANS = ("cache", "db", "build", "serialize")
+
+
+class Timings:
+    __slots__ = ("started", "spans")
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.spans: Dict[str, List[float]] = {}  # имя -> [секунды, число отрезков]
+
+    def add(self, name: str, seconds: float, count: int = 1) -> None:
+        span = self.spans.get(name)
+        if span is None:
+            self.spans[name] = [seconds, count]
+        else:
+            span[0] += seconds
+            span[1] += count
+
+    def total(self, name: str) -> float:
+        span = self.spans.get(name)
+        return span[0] if span else 0.0
+
+    def header(self) -> str:
+        total = time.perf_counter() - self.started
+        parts: List[str] = []
+        for name in SPANS:
+            span = self.spans.get(name)
+            if span is None:
+                continue
+            desc = f';desc="{span[1]} stmt"' if name == "db" else ""
+            parts.append(f"{name};dur={span[0] * 1000:.2f}{desc}")
+        handler = max(0.0, total - sum(self.total(name) for name in SPANS))
+        parts.append(f"handler;dur={handler * 1000:.2f}")
+        parts.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(parts)
+
+
+timings_var: ContextVar[Optional[Timings]] = ContextVar("server_timing", default=None)
+
+
+def add(name: str, seconds: float) -> None:
+    timings = timings_var.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    timings = timings_var.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started)
+
+
+@contextmanager
+def build_span() -> Iterator[None]:
+    """Отрезок build: время блока за вычетом SQL, выполненного внутри него."""
+    timings = timings_var.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    db_before = timings.total("db")
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started - (timings.total("db") - db_before)
+        timings.add("build", max(0.0, elapsed))
+
+
+def _before_cursor_execute(conn: Any, cursor: Any, statement: Any, parameters: Any, context: Any, executemany: bool) -> None:
+    if timings_var.get() is not None and context is not None:
+        context._server_timing_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn: Any, cursor: Any, statement: Any, parameters: Any, context: Any, executemany: bool) -> None:
+    started = getattr(context, "_server_timing_started", None)
+    if started is not None:
+        add("db", time.perf_counter() - started)
+
+
+def instrument_engine(engine: Any) -> None:
+    """Подключает учёт времени SQL к движку (AsyncEngine или Engine)."""
+    target = getattr(engine, "sync_engine", engine)
+    event.listen(target, "before_cursor_execute", _before_cursor_execute)
+    event.listen(target, "after_cursor_execute", _after_cursor_execute)
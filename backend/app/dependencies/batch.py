@@ -0,0 +1,18 @@
+from typing import List
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+
+
+def parse_batch_param(raw: str) -> List[str]:
+    """Список идентификаторов из параметра вида "a,b,c": без пустых и повторов, с ограничением длины."""
+    idents = list(dict.fromkeys(part.strip() for part in raw.split(",") if part.strip()))
+    if not idents:
+        raise HTTPException(status_code=422, detail="Empty batch")
+    if len(idents) > settings.BATCH_LOOKUP_MAX_ITEMS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Too many items in batch (max {settings.BATCH_LOOKUP_MAX_ITEMS})",
+        )
+    return idents
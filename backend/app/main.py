@@ -1,19 +1,36 @@
-import time
+import asyncio
+import hmac
 import logging
-from typing import Optional
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
 from urllib.parse import urlparse
 
-from fastapi import FastAPI, Request
+from fastapi import Depends, FastAPI, HTTPException, Request
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from starlette.middleware.sessions import SessionMiddleware
 
+from app.core import edge_cache
+from app.core.cache import cache_metrics_text, pending_loads
+from app.core.cache_bus import invalidation_listener
 from app.core.config import settings
-from app.core.database import Base, engine
+from app.core.logging_setup import configure_logging, stop_logging
+from app.core.metrics import exposition, publish_loop
+from app.core.middleware import (
+    CacheControlMiddleware,
+    LoadSheddingMiddleware,
+    MetricsMiddleware,
+    RateLimitMiddleware,
+    RequestLoggerMiddleware,
+    ServerTimingMiddleware,
+)
+from app.core.redis_client import close_redis, get_redis
+from app.core.database import Base, dispose_engines, engine
 from app.api.v1.router import api_router
 from app.admin.admin_setup import admin_router
+from app.services import cache_warmer
+from app.services.cache_warmer import schedule_warmup, warm_cache
 
 # --------- Helpers ---------
 RU_SUFFIXES = (".ru", ".xn--p1ai", ".рф")
@@ -27,73 +44,61 @@ def is_ru_origin(origin: str) -> bool:
         return False
 
 
-# --------- Optional redis for rate-limit ---------
-try:
-    import redis.asyncio as aioredis
-except Exception:
-    aioredis = None
-
-
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app: FastAPI, limit_per_minute: int):
-        super().__init__(app)
-        self.limit = limit_per_minute
-        self.redis = None
-
-    async def dispatch(self, request: Request, call_next):
-        ip = request.headers.get("x-forwarded-for") or (request.client.host if request.client else "unknown")
-        now_minute = int(time.time() // 60)
-        key = f"rl:{ip}:{now_minute}"
-
-        # Redis, если доступен
-        if aioredis and settings.effective_redis_url:
-            try:
-                if self.redis is None:
-                    self.redis = aioredis.from_url(settings.effective_redis_url, encoding="utf-8", decode_responses=True)
-                count = await self.redis.incr(key)
-                if count == 1:
-                    await self.redis.expire(key, 60)
-            except Exception:
-                # graceful fallback на in-memory
-                if not hasattr(self, "_mem"):
-                    self._mem = {}
-                count = self._mem.get(key, 0) + 1
-                self._mem[key] = count
-        else:
-            # простой in-memory fallback на время текущего процесса
-            if not hasattr(self, "_mem"):
-                self._mem = {}
-            count = self._mem.get(key, 0) + 1
-            self._mem[key] = count
-
-        if count > self.limit:
-            return JSONResponse(status_code=429, content={"detail": "Too Many Requests"})
-
-        response = await call_next(request)
-        return response
-
-
-# --------- Request logging middleware ---------
-class RequestLoggerMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        start = time.time()
-        ip = request.headers.get("x-forwarded-for") or (request.client.host if request.client else "unknown")
-        method = request.method
-        path = request.url.path
-        response = await call_next(request)
-        duration_ms = int((time.time() - start) * 1000)
-        # Логируем кратко в stdout
-        print(f"{ip} {method} {path} -> {response.status_code} in {duration_ms}ms")
-        return response
-
-
 # --------- App ---------
 DEV = settings.ENVIRONMENT == "dev"
+logger = logging.getLogger("startup")
+
+
+async def drain_background() -> None:
+    """Дожидается фоновых задач воркера (прогрев, обновления кэша, edge) и отменяет незавершённые."""
+    pending = set(cache_warmer.background_tasks()) | set(edge_cache.background_tasks()) | set(pending_loads())
+    pending = {task for task in pending if not task.done()}
+    if not pending:
+        return
+    _, left = await asyncio.wait(pending, timeout=settings.SHUTDOWN_DRAIN_SECONDS)
+    for task in left:
+        task.cancel()
+    if left:
+        logger.warning("Shutdown: cancelled %d background tasks after %.0fs", len(left), settings.SHUTDOWN_DRAIN_SECONDS)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # Запуск выполняется в каждом воркере после fork (gunicorn --preload): соединения, потоки и
+    # задачи создаются здесь, а не при импорте
+    if DEV:
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+        except Exception as e:
+            logger.error("DB init failed: %s", e)
+    app.state.redis = get_redis()
+    invalidation_listener.start()
+    # В фоне: воркер начинает принимать запросы сразу, отчёт о прогреве — в логах и админке
+    if settings.CACHE_WARM_ON_STARTUP:
+        schedule_warmup(warm_cache("startup"))
+    metrics_publisher = asyncio.create_task(publish_loop())
+    try:
+        yield
+    finally:
+        # Сервер уже перестал принимать запросы и дождался текущих (graceful_timeout у gunicorn)
+        metrics_publisher.cancel()
+        await invalidation_listener.stop()
+        await drain_background()
+        await dispose_engines()
+        await edge_cache.close()
+        await close_redis()
+        # Последним: дописывает очередь логов, в том числе сообщения об остановке
+        stop_logging()
+
+# JSON-логи через очередь и фоновый поток: до создания приложения, чтобы ничего не ушло мимо
+configure_logging()
 app = FastAPI(
     title=settings.PROJECT_NAME,
     docs_url="/docs" if DEV else None,
     redoc_url="/redoc" if DEV else None,
     openapi_url="/openapi.json" if DEV else None,
+    lifespan=lifespan,
 )
 
 # Сессии для админ-панели (cookie-сессия + таймаут)
@@ -122,8 +127,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(CacheControlMiddleware)
+app.add_middleware(LoadSheddingMiddleware)
 app.add_middleware(RequestLoggerMiddleware)
-app.add_middleware(RateLimitMiddleware, limit_per_minute=settings.RATE_LIMIT_PER_MINUTE)
+app.add_middleware(ServerTimingMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RateLimitMiddleware)
 
 # Подключение роутеров: всё под /api/v1
 app.include_router(api_router, prefix="/api/v1")
@@ -138,6 +147,29 @@ async def health() -> dict:
     return {"status": "ok"}
 
 
+# --------- Metrics ---------
+# Не проксируется nginx наружу (только /api/ и /admin/), снимается внутри сети
+def require_metrics_token(request: Request) -> None:
+    """При заданном METRICS_TOKEN метрики отдаются только с Authorization: Bearer <token>."""
+    if not settings.METRICS_TOKEN:
+        return
+    supplied = request.headers.get("authorization", "")
+    if not hmac.compare_digest(supplied.encode(), f"Bearer {settings.METRICS_TOKEN}".encode()):
+        raise HTTPException(status_code=401, detail="Unauthorized", headers={"WWW-Authenticate": "Bearer"})
+
+
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(require_metrics_token)])
+async def metrics() -> PlainTextResponse:
+    # Все процессы API и Celery сразу
+    return PlainTextResponse(await exposition(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/metrics/cache", include_in_schema=False, dependencies=[Depends(require_metrics_token)])
+async def cache_metrics() -> PlainTextResponse:
+    # Только процесс, обработавший запрос
+    return PlainTextResponse(cache_metrics_text(), media_type="text/plain; version=0.0.4")
+
+
 # --------- Exception handlers ---------
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -154,13 +186,3 @@ async def unhandled_exception_handler(request: Request, exc: Exception):
         status_code=500,
         content={"detail": str(exc), "message": "Internal Server Error", "ip": ip},
     )
-
-
-@app.on_event("startup")
-async def ensure_db_schema() -> None:
-    if DEV:
-        try:
-            async with engine.begin() as conn:
-                await conn.run_sync(Base.metadata.create_all)
-        except Exception as e:
-            logging.getLogger("startup").error("DB init failed: %s", e)
\ No newline at end of file
@@ -5,6 +5,8 @@ Article model (async SQLAlchemy, PostgreSQL).
 - status enum (draft/published/archived)
 - optional relation to Country
 - common indexes
+- search_vector: полнотекстовый индекс (generated column, GIN), см. app.services.article_search
+- триграммный индекс заголовка (pg_trgm) для подсказок, см. app.services.suggest
 """
 from __future__ import annotations
 
@@ -13,10 +15,10 @@ from datetime import datetime
 from enum import Enum
 from typing import Optional
 
-from sqlalchemy import String, Text, DateTime, Boolean, ForeignKey, Enum as SAEnum, Index
+from sqlalchemy import DDL, String, Text, DateTime, Boolean, Computed, ForeignKey, Enum as SAEnum, Index, event
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
-from sqlalchemy.dialects.postgresql import UUID as PGUUID, JSONB
+from sqlalchemy.dialects.postgresql import UUID as PGUUID, JSONB, TSVECTOR
 
 from app.core.database import Base
 
@@ -58,9 +60,27 @@ class Article(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
+    # Полнотекстовый поиск (русская морфология): заголовок с весом A, текст — B. Колонку
+    # пересчитывает сама БД при каждой записи; deferred — обычные выборки её не читают
+    search_vector: Mapped[Optional[str]] = mapped_column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('russian'::regconfig, coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('russian'::regconfig, coalesce(content, '')), 'B')",
+            persisted=True,
+        ),
+        deferred=True,
+    )
+
     __table_args__ = (
         Index("ix_articles_status_country", "status", "country_id"),
         Index("ix_articles_published_at", "published_at"),
+        # Keyset-пагинация списков (app.core.pagination): ORDER BY col DESC, id DESC
+        Index("ix_articles_created_at_id", "created_at", "id"),
+        Index("ix_articles_views_count_id", "views_count", "id"),
+        Index("ix_articles_search_vector", "search_vector", postgresql_using="gin"),
+        # Подсказки: ILIKE '%…%' и word_similarity (<%) по заголовку
+        Index("ix_articles_title_trgm", "title", postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}),
     )
 
     def __repr__(self) -> str:
@@ -82,4 +102,12 @@ class Article(Base):
             "published_at": self.published_at.isoformat() if self.published_at else None,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
-        }
\ No newline at end of file
+        }
+
+
+# gin_trgm_ops нужен до создания индекса: для create_all в dev; в существующих базах — миграция 0003
+event.listen(
+    Article.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
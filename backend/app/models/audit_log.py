@@ -5,6 +5,7 @@ AuditLog model (async SQLAlchemy, PostgreSQL).
 - user_id (admin email), ip_address, user_agent
 - details JSON
 - indexes on entity and created_at
+- details.request_id — id HTTP-запроса или Celery-задачи, в которой сделана запись
 """
 from __future__ import annotations
 
@@ -12,12 +13,13 @@ import uuid
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import String, DateTime, Index
+from sqlalchemy import String, DateTime, Index, event
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.postgresql import UUID as PGUUID, JSONB
 
 from app.core.database import Base
+from app.core.request_context import get_request_id
 
 
 class AuditLog(Base):
@@ -39,7 +41,8 @@ class AuditLog(Base):
 
     __table_args__ = (
         Index("ix_audit_logs_entity", "entity_type", "entity_id"),
-        Index("ix_audit_logs_created_at", "created_at"),
+        # Фильтры по дате и keyset-пагинация журнала (ORDER BY created_at DESC, id DESC)
+        Index("ix_audit_logs_created_at_id", "created_at", "id"),
         Index("ix_audit_logs_user", "user_id"),
     )
 
@@ -57,4 +60,12 @@ class AuditLog(Base):
             "user_agent": self.user_agent,
             "details": self.details,
             "created_at": self.created_at.isoformat() if self.created_at else None,
-        }
\ No newline at end of file
+        }
+
+
+@event.listens_for(AuditLog, "before_insert")
+def _attach_request_id(mapper, connection, target: AuditLog) -> None:
+    # Связь записи аудита со строкой access-лога и логами задачи без правки каждого места создания
+    request_id = get_request_id()
+    if request_id and "request_id" not in (target.details or {}):
+        target.details = {**(target.details or {}), "request_id": request_id}
@@ -55,6 +55,7 @@ class CaseStudy(Base):
 
     __table_args__ = (
         Index("ix_case_studies_status_country", "status", "country_id"),
+        Index("ix_case_studies_created_at_id", "created_at", "id"),  # keyset-пагинация
     )
 
     def __repr__(self) -> str:
@@ -72,6 +72,27 @@ class PaginatedArticles(BaseModel):
     total: int
     limit: int
     offset: int
+    next_cursor: Optional[str] = None  # курсор следующей страницы; None — страница последняя
+
+
+class ArticleSearchHit(BaseModel):
+    """Найденная статья: вместо полного текста — сниппет с совпадениями в <mark>…</mark>."""
+    id: UUID
+    slug: str
+    title: str
+    snippet: str
+    rank: float
+    seo_description: Optional[str] = None
+    country_id: Optional[UUID] = None
+    published_at: Optional[datetime] = None
+
+
+class ArticleSearchResults(BaseModel):
+    query: str
+    items: List[ArticleSearchHit]
+    total: int
+    limit: int
+    offset: int
 
 
 class SitemapItem(BaseModel):
@@ -81,4 +102,10 @@ class SitemapItem(BaseModel):
     priority: Optional[float] = None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class ArticleBatch(BaseModel):
+    """Пакетная выборка: найденные элементы в порядке запроса и не найденные slug'и."""
+    items: List[ArticleOut]
+    missing: List[str] = Field(default_factory=list)
@@ -68,4 +68,11 @@ class PaginatedCaseStudies(BaseModel):
     items: List[CaseStudyOut]
     total: int
     limit: int
-    offset: int
\ No newline at end of file
+    offset: int
+    next_cursor: Optional[str] = None  # курсор следующей страницы; None — страница последняя
+
+
+class CaseStudyBatch(BaseModel):
+    """Пакетная выборка: найденные элементы в порядке запроса и не найденные slug'и."""
+    items: List[CaseStudyOut]
+    missing: List[str] = Field(default_factory=list)
@@ -55,4 +55,10 @@ class CountryOut(BaseModel):
     seo: Optional[SEOMetadataOut] = None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class CountryBatch(BaseModel):
+    """Пакетная выборка: найденные элементы в порядке запроса и не найденные коды."""
+    items: List[CountryOut]
+    missing: List[str] = Field(default_factory=list)
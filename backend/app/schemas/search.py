@@ -0,0 +1,27 @@
+"""
+Pydantic-схемы подсказок поиска (/search/suggest).
+"""
+from __future__ import annotations
+
+from typing import List, Literal, Optional
+from uuid import UUID
+
+from pydantic import BaseModel
+
+
+class SuggestItem(BaseModel):
+    """Подсказка: страна (code), услуга (country_code, service_type) или статья (slug)."""
+    type: Literal["country", "service", "article"]
+    id: UUID
+    title: str
+    title_en: Optional[str] = None
+    code: Optional[str] = None
+    country_code: Optional[str] = None
+    flag_emoji: Optional[str] = None
+    service_type: Optional[str] = None
+    slug: Optional[str] = None
+
+
+class SuggestResults(BaseModel):
+    query: str
+    items: List[SuggestItem]
@@ -0,0 +1,87 @@
+"""
+Полнотекстовый поиск статей (PostgreSQL, конфигурация russian).
+
+Article.search_vector — генерируемая колонка: заголовок с весом A, текст с весом B. Её
+пересчитывает сама БД при каждой записи, поиск идёт по GIN-индексу ix_articles_search_vector,
+а не последовательным ILIKE по всем текстам. Запрос разбирает websearch_to_tsquery: слова
+приводятся к основе («доставки» находит «доставка»), поддерживаются "фразы", or и -исключения.
+
+Выдача упорядочена по ts_rank с поправкой на длину документа (длинные автосгенерированные
+тексты не вытесняют короткие только за счёт объёма). Вместо полного текста — сниппеты
+ts_headline с найденными словами в <mark>…</mark>; HTML-теги из текста удаляются. Сниппеты
+считаются только для строк страницы, а не для всех совпадений.
+"""
+from __future__ import annotations
+
+import hashlib
+import unicodedata
+from typing import Any, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import Select, cast, desc, func, select
+from sqlalchemy.dialects.postgresql import REGCONFIG
+
+from app.core.config import settings
+from app.models.article import Article, ArticleStatus
+
+SEARCH_CONFIG = "russian"  # та же конфигурация, что в выражении Article.search_vector
+HEADLINE_OPTIONS = (
+    "MaxWords=35, MinWords=15, MaxFragments=2, FragmentDelimiter=\" … \", StartSel=<mark>, StopSel=</mark>"
+)
+# ts_rank: ранг делится на 1 + логарифм длины документа
+RANK_NORMALIZATION = 1
+
+
+def normalize_query(raw: str) -> str:
+    """Запрос в каноническом виде: одинаковые по смыслу запросы дают один ключ кэша."""
+    text = unicodedata.normalize("NFKC", raw).lower()
+    return " ".join(text.split())[: settings.SEARCH_MAX_QUERY_LENGTH]
+
+
+def cache_key(query: str, country_id: Optional[UUID], limit: int, offset: int) -> str:
+    digest = hashlib.sha1(query.encode()).hexdigest()[:16]
+    return f"articles:search:{digest}:{country_id}:{limit}:{offset}"
+
+
+def ts_query(query: str) -> Any:
+    return func.websearch_to_tsquery(cast(SEARCH_CONFIG, REGCONFIG), query)
+
+
+def matches(tsquery: Any) -> Any:
+    return Article.search_vector.bool_op("@@")(tsquery)
+
+
+def search_statements(query: str, country_id: Optional[UUID], limit: int, offset: int) -> Tuple[Select, Select]:
+    """(страница: id, slug, title, ..., rank, snippet; число совпадений) — только опубликованные."""
+    tsquery = ts_query(query)
+    conditions = [Article.status == ArticleStatus.published, matches(tsquery)]
+    if country_id:
+        conditions.append(Article.country_id == country_id)
+
+    rank = func.ts_rank(Article.search_vector, tsquery, RANK_NORMALIZATION)
+    ranked = (
+        select(Article.id, rank.label("rank"))
+        .where(*conditions)
+        .order_by(desc("rank"), desc(Article.id))
+        .limit(limit)
+        .offset(offset)
+        .subquery()
+    )
+    plain_content = func.regexp_replace(Article.content, "<[^>]+>", " ", "g")
+    snippet = func.ts_headline(cast(SEARCH_CONFIG, REGCONFIG), plain_content, tsquery, HEADLINE_OPTIONS)
+    page = (
+        select(
+            Article.id,
+            Article.slug,
+            Article.title,
+            Article.seo_description,
+            Article.country_id,
+            Article.published_at,
+            ranked.c.rank,
+            snippet.label("snippet"),
+        )
+        .join(ranked, ranked.c.id == Article.id)
+        .order_by(desc(ranked.c.rank), desc(Article.id))
+    )
+    total = select(func.count()).select_from(Article).where(*conditions)
+    return page, total
@@ -0,0 +1,80 @@
+"""
+Инвалидация кэша публичного контента по тегам.
+
+Каждая запись кэша регистрируется под тегами сущностей (article:{id}, country:{id} ...)
+и списков (articles:list, countries:list ...). Пишущие эндпоинты, админ-мост и Celery-задачи
+вызывают функции этого модуля после commit, поэтому ключи можно держать долго.
+Те же теги обновляют публичные URL в микро-кэше nginx (app.core.edge_cache).
+"""
+from __future__ import annotations
+
+from typing import Iterable, List, Optional
+from uuid import UUID
+
+from app.core.cache import cache_invalidate_tags
+from app.core.database import fence_replica_reads
+from app.core.edge_cache import refresh_tags
+
+# Теги списков
+ARTICLES_LIST = "articles:list"
+ARTICLES_SITEMAP = "articles:sitemap"
+COUNTRIES_LIST = "countries:list"
+SERVICES_LIST = "services:list"
+CASE_STUDIES_LIST = "case_studies:list"
+
+
+def article_tag(article_id: UUID | str) -> str:
+    return f"article:{article_id}"
+
+
+def country_tag(country_id: UUID | str) -> str:
+    return f"country:{country_id}"
+
+
+def service_tag(service_id: UUID | str) -> str:
+    return f"service:{service_id}"
+
+
+def case_study_tag(case_id: UUID | str) -> str:
+    return f"case_study:{case_id}"
+
+
+async def _invalidate(*tags: str) -> int:
+    # Пересборка сразу после записи читает с основной БД: реплика может её ещё не получить
+    fence_replica_reads()
+    removed = await cache_invalidate_tags(*tags)
+    await refresh_tags(tags)
+    return removed
+
+
+def _country_tags(country_ids: Iterable[Optional[UUID | str]]) -> List[str]:
+    return [country_tag(cid) for cid in country_ids if cid]
+
+
+async def invalidate_article(article_id: UUID | str, *country_ids: Optional[UUID | str]) -> int:
+    """Статья влияет на свою страницу, списки, sitemap и счётчики статей у стран."""
+    return await _invalidate(
+        article_tag(article_id),
+        ARTICLES_LIST,
+        ARTICLES_SITEMAP,
+        COUNTRIES_LIST,
+        *_country_tags(country_ids),
+    )
+
+
+async def invalidate_country(country_id: UUID | str) -> int:
+    return await _invalidate(country_tag(country_id), COUNTRIES_LIST)
+
+
+async def invalidate_service(service_id: UUID | str, *country_ids: Optional[UUID | str]) -> int:
+    """Услуги встроены в ответы стран, поэтому сбрасываем и их."""
+    return await _invalidate(
+        service_tag(service_id),
+        SERVICES_LIST,
+        COUNTRIES_LIST,
+        *_country_tags(country_ids),
+    )
+
+
+async def invalidate_case_study(case_id: UUID | str) -> int:
+    return await _invalidate(case_study_tag(case_id), CASE_STUDIES_LIST)
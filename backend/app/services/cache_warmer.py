@@ -0,0 +1,172 @@
+"""
+Прогрев кэша публичного контента.
+
+После деплоя или перезапуска Redis первые посетители платили бы полную цену холодного старта:
+сборку каталога стран, первые страницы статей и компиляцию SQL-выражений SQLAlchemy.
+Прогрев заранее вызывает те же эндпоинты, что и фронтенд (ключи, загрузчики и теги
+остаются в одном месте), не более CACHE_WARM_CONCURRENCY загрузок одновременно,
+чтобы не нагружать Postgres.
+
+- warm_cache(): при старте воркера — пул соединений БД, страны, услуги, списки статей
+  и кейсов по странам, новые и самые читаемые статьи, sitemap;
+- warm_after_publish(): после публикации/автогенерации — страница статьи и затронутые списки.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy import desc, select
+
+from app.core.config import settings
+from app.core.database import BACKGROUND, prewarm_pool, session_for
+from app.models.article import Article, ArticleStatus
+from app.models.country import Country
+
+logger = logging.getLogger("services.cache_warmer")
+
+Job = Tuple[str, Callable[[], Awaitable[Any]]]
+
+# Последний отчёт о прогреве (для админки)
+last_report: Dict[str, Any] = {}
+
+# Фоновые задачи прогрева: держим ссылки, чтобы их не собрал GC до завершения
+_background: Set["asyncio.Task[Any]"] = set()
+
+
+async def _run_jobs(reason: str, jobs: List[Job], started: float, extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    semaphore = asyncio.Semaphore(max(1, settings.CACHE_WARM_CONCURRENCY))
+    failed: List[str] = []
+
+    async def run(name: str, job: Callable[[], Awaitable[Any]]) -> None:
+        async with semaphore:
+            try:
+                await job()
+            except Exception as e:
+                failed.append(name)
+                logger.warning("Cache warmup job %s failed: %s", name, e)
+
+    await asyncio.gather(*(run(name, job) for name, job in jobs))
+    report = {
+        "reason": reason,
+        "finished_at": time.time(),
+        "duration_seconds": round(time.monotonic() - started, 3),
+        "jobs": len(jobs),
+        "failed": failed,
+        **(extra or {}),
+    }
+    last_report.clear()
+    last_report.update(report)
+    logger.info(
+        "Cache warmup (%s) finished in %.2fs: %d jobs, %d failed",
+        reason, report["duration_seconds"], len(jobs), len(failed),
+    )
+    return report
+
+
+def _country_jobs(code: str, country_id: UUID) -> List[Job]:
+    # Ленивый импорт: эндпоинты сами вызывают прогрев после публикации
+    from app.api.v1.endpoints import articles, case_studies, countries, services
+
+    return [
+        (f"country:{code}", lambda: countries.get_country(code)),
+        (f"services:{code}", lambda: services.services_by_country(code)),
+        (
+            f"articles:country:{code}",
+            lambda: articles.list_articles(
+                request=None, status_filter="published", country_id=country_id, limit=6, offset=0, cursor=None, search=None, order_by="created_at"
+            ),
+        ),
+        (
+            f"case_studies:country:{code}",
+            lambda: case_studies.list_case_studies(
+                status_filter="published", country_id=country_id, limit=6, offset=0, cursor=None, order_by="created_at"
+            ),
+        ),
+    ]
+
+
+def _article_list_jobs() -> List[Job]:
+    from app.api.v1.endpoints import articles
+
+    return [
+        # Главная (getArticles(3)) и список по умолчанию
+        (f"articles:list:{limit}", lambda limit=limit: articles.list_articles(
+            request=None, status_filter=None, country_id=None, limit=limit, offset=0, cursor=None, search=None, order_by="created_at"
+        ))
+        for limit in (3, 20)
+    ] + [("articles:sitemap", articles.articles_sitemap)]
+
+
+async def warm_cache(reason: str = "startup") -> Dict[str, Any]:
+    """Полный прогрев: пул БД и всё, что нужно главной, страницам стран и популярным статьям."""
+    from app.api.v1.endpoints import articles, countries, services
+
+    started = time.monotonic()
+    opened = await prewarm_pool()
+
+    async with session_for(BACKGROUND) as db:
+        active = (await db.execute(select(Country.code, Country.id).where(Country.is_active == True))).all()
+        newest = (await db.execute(
+            select(Article.slug).where(Article.status == ArticleStatus.published)
+            .order_by(desc(Article.published_at)).limit(settings.CACHE_WARM_ARTICLES)
+        )).scalars().all()
+        popular = (await db.execute(
+            select(Article.slug).where(Article.status == ArticleStatus.published)
+            .order_by(desc(Article.views_count)).limit(settings.CACHE_WARM_ARTICLES)
+        )).scalars().all()
+
+    jobs: List[Job] = [
+        ("countries:list", countries.list_countries),
+        ("services:list", services.list_services),
+        *_article_list_jobs(),
+    ]
+    for code, country_id in active:
+        jobs.extend(_country_jobs(code, country_id))
+    slugs = list(dict.fromkeys([*newest, *popular]))
+    # Статьи — пакетами: попадания одним MGET, промахи одним SELECT ... WHERE slug IN
+    batch = max(1, settings.BATCH_LOOKUP_MAX_ITEMS)
+    for i in range(0, len(slugs), batch):
+        chunk = ",".join(slugs[i:i + batch])
+        jobs.append((f"articles:batch:{i}", lambda chunk=chunk: articles.get_articles_batch(chunk)))
+
+    return await _run_jobs(reason, jobs, started, {"db_connections": opened, "articles": len(slugs)})
+
+
+async def warm_after_publish(slug: str, country_id: Optional[UUID] = None) -> Dict[str, Any]:
+    """Пересобирает после инвалидации то, что увидят первым: статью, списки, sitemap и страну."""
+    from app.api.v1.endpoints import articles, countries
+
+    started = time.monotonic()
+    jobs: List[Job] = [
+        (f"article:{slug}", lambda: articles.get_article(slug)),
+        ("countries:list", countries.list_countries),
+        *_article_list_jobs(),
+    ]
+    if country_id is not None:
+        async with session_for(BACKGROUND) as db:
+            code = (await db.execute(select(Country.code).where(Country.id == country_id))).scalar()
+        if code:
+            jobs.extend(_country_jobs(code, country_id))
+    return await _run_jobs("publish", jobs, started, {"slug": slug})
+
+
+def background_tasks() -> Set["asyncio.Task[Any]"]:
+    """Прогревы, ещё идущие в фоне (дожидаются при остановке воркера)."""
+    return set(_background)
+
+
+def schedule_warmup(coro: Awaitable[Any]) -> None:
+    """Запускает прогрев в фоне текущего цикла событий (не задерживая старт или ответ)."""
+    task = asyncio.ensure_future(coro)
+    _background.add(task)
+
+    def done(t: "asyncio.Task[Any]") -> None:
+        _background.discard(t)
+        if not t.cancelled() and t.exception() is not None:
+            logger.warning("Cache warmup failed: %s", t.exception())
+
+    task.add_done_callback(done)
@@ -8,13 +8,9 @@ try:
 except Exception:
     OpenAI = None  # Библиотека может быть не установлена пока
 
-try:
-    import redis  # sync redis для глобального rate-limit
-except Exception:
-    redis = None
-
 from app.core.config import settings
-from app.core.database import AsyncSessionLocal
+from app.core.redis_client import call_sync
+from app.core.database import BACKGROUND, session_for
 from app.models.audit_log import AuditLog
 
 
@@ -28,7 +24,6 @@ class OpenAIService:
     def __init__(self, max_per_minute: int = 3):
         self.api_key = settings.OPENAI_API_KEY
         self.client = OpenAI(api_key=self.api_key) if (OpenAI and self.api_key) else None
-        self.redis_client = redis.from_url(settings.effective_redis_url, decode_responses=True) if redis else None
         self.rate_limit_key = "openai:requests"
         self.max_per_minute = max_per_minute
         # Список запрещённых слов (можно переопределить через ENV CONTENT_BLACKLIST="word1,word2")
@@ -38,19 +33,22 @@ class OpenAIService:
 
     def _allow_request(self) -> bool:
         """Глобальный rate-limit: максимум N запросов в минуту (Redis INCR + TTL)."""
-        if self.redis_client is None:
-            # Если Redis недоступен, полагаемся на ограничение воркера Celery и аккуратное использование.
-            return True
         window = int(time.time() // 60)
         key = f"{self.rate_limit_key}:{window}"
-        count = self.redis_client.incr(key)
-        if count == 1:
-            self.redis_client.expire(key, 60)
-        return count <= self.max_per_minute
+
+        def incr(r) -> int:
+            count = r.incr(key)
+            if count == 1:
+                r.expire(key, 60)
+            return count
+
+        # Если Redis недоступен (или разомкнут выключатель), полагаемся на ограничение воркера Celery
+        count = call_sync(incr)
+        return count is None or count <= self.max_per_minute
 
     async def _audit(self, action: str, entity_type: str, details: Dict[str, Any], entity_id: Optional[str] = None) -> None:
         """Сохранение промптов/ответов в AuditLog."""
-        async with AsyncSessionLocal() as session:
+        async with session_for(BACKGROUND) as session:
             log = AuditLog(
                 action=action,
                 entity_type=entity_type,
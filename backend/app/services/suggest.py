@@ -0,0 +1,240 @@
+"""
+Подсказки поисковой строки: страны, услуги и статьи по началу запроса, с учётом опечаток.
+
+Страны и услуги — небольшой справочник: воркер держит его в памяти (CatalogIndex) и отвечает
+без обращения к БД. Снимок справочника лежит в кэше под тегами countries:list и services:list
+и сбрасывается при их изменении; воркер сверяет с ним индекс не чаще раза в
+SEARCH_CATALOG_REFRESH_SECONDS и перестраивает его, только если справочник изменился.
+
+Индекс — отсортированный список слов названий (русских и английских) и кодов стран: слова
+запроса находятся как префиксы бинарным поиском. Если совпадений по префиксу не хватает,
+добавляются названия, где слову запроса с опечаткой соответствует слово с большей частью его
+триграмм (разбивка на триграммы — как в pg_trgm): «казахтан» находит «Казахстан».
+
+Статьи ищутся по заголовку через pg_trgm (GIN-индекс ix_articles_title_trgm): вхождение
+подстроки (ILIKE) или похожее слово (оператор <%, word_similarity), по убыванию сходства.
+Запросы короче SEARCH_SUGGEST_MIN_ARTICLE_CHARS по статьям не ищутся: в них нет триграмм,
+и индекс не помог бы.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import re
+import time
+import unicodedata
+from bisect import bisect_left
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Set
+
+from sqlalchemy import String, desc, func, literal, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import cache_get_or_set
+from app.core.config import settings
+from app.core.database import with_session
+from app.models.article import Article, ArticleStatus
+from app.models.country import Country
+from app.models.service import Service
+from app.schemas.search import SuggestItem
+from app.services.cache_invalidation import COUNTRIES_LIST, SERVICES_LIST
+
+logger = logging.getLogger("services.suggest")
+
+CATALOG_KEY = "search:catalog"
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize(text: str) -> str:
+    """Регистр, ё/е и пунктуация не влияют на совпадение."""
+    text = unicodedata.normalize("NFKC", text).lower().replace("ё", "е")
+    return " ".join(_NON_WORD.sub(" ", text).split())
+
+
+def normalize_query(raw: str) -> str:
+    return normalize(raw[: settings.SEARCH_SUGGEST_MAX_QUERY_LENGTH * 2])[: settings.SEARCH_SUGGEST_MAX_QUERY_LENGTH].strip()
+
+
+def cache_key(query: str, limit: int) -> str:
+    digest = hashlib.sha1(query.encode()).hexdigest()[:16]
+    return f"search:suggest:{digest}:{limit}"
+
+
+def trigrams(text: str, prefix: bool = False) -> Set[str]:
+    """Триграммы как в pg_trgm: слово дополняется двумя пробелами слева и одним справа.
+
+    prefix=True — последнее слово может быть недописано, правый пробел к нему не добавляется.
+    """
+    words = normalize(text).split()
+    grams: Set[str] = set()
+    for i, word in enumerate(words):
+        padded = "  " + word + ("" if prefix and i == len(words) - 1 else " ")
+        grams.update(padded[j:j + 3] for j in range(len(padded) - 2))
+    return grams
+
+
+class CatalogIndex:
+    """Префиксный индекс по словам названий стран и услуг (записи — словари SuggestItem)."""
+
+    def __init__(self, entries: Sequence[Dict[str, Any]]) -> None:
+        self.entries = list(entries)
+        self._names = [(normalize(e["title"]), normalize(e.get("title_en") or "")) for e in self.entries]
+        entry_words = [
+            set(" ".join((*self._names[i], (e.get("code") or "").lower())).split()) for i, e in enumerate(self.entries)
+        ]
+        pairs = sorted((word, i) for i, words in enumerate(entry_words) for word in words)
+        self._words = [word for word, _ in pairs]
+        self._ids = [i for _, i in pairs]
+        # Триграммы каждого слова — для сравнения со словом запроса с опечаткой
+        self._grams: Dict[str, FrozenSet[str]] = {word: frozenset(trigrams(word)) for word in self._words}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _prefixed(self, prefix: str) -> Set[int]:
+        found: Set[int] = set()
+        k = bisect_left(self._words, prefix)
+        while k < len(self._words) and self._words[k].startswith(prefix):
+            found.add(self._ids[k])
+            k += 1
+        return found
+
+    def _similar(self, word: str, last: bool) -> Dict[int, float]:
+        """Записи со словом, в котором есть доля триграмм word не меньше SEARCH_SUGGEST_FUZZY_THRESHOLD."""
+        grams = trigrams(word, prefix=last)
+        found: Dict[int, float] = {}
+        for k, candidate in enumerate(self._words):
+            score = len(grams & self._grams[candidate]) / len(grams)
+            if score >= settings.SEARCH_SUGGEST_FUZZY_THRESHOLD and score > found.get(self._ids[k], 0.0):
+                found[self._ids[k]] = score
+        return found
+
+    def _order(self, i: int, query: str) -> tuple:
+        # Название целиком начинается с запроса, затем страны раньше услуг, затем короткие раньше
+        starts = any(name.startswith(query) for name in self._names[i])
+        return (not starts, self.entries[i]["type"] != "country", len(self._names[i][0]), self._names[i][0])
+
+    def lookup(self, query: str, limit: int) -> List[Dict[str, Any]]:
+        """Записи, где каждое слово запроса — начало слова названия; затем — с опечатками в словах запроса.
+
+        Опечатка допускается в словах не короче 4 символов: у более коротких слишком мало
+        триграмм, и «похожими» оказались бы почти все названия.
+        """
+        words = query.split()
+        if not words or not self.entries:
+            return []
+        exact: Optional[Set[int]] = None
+        fuzzy: Optional[Dict[int, float]] = None
+        for n, word in enumerate(words):
+            prefixed = self._prefixed(word)
+            exact = prefixed if exact is None else exact & prefixed
+            scores = {i: 1.0 for i in prefixed}
+            if len(word) >= 4:
+                for i, score in self._similar(word, last=n == len(words) - 1).items():
+                    scores.setdefault(i, score)
+            fuzzy = scores if fuzzy is None else {i: fuzzy[i] + score for i, score in scores.items() if i in fuzzy}
+        found = sorted(exact, key=lambda i: self._order(i, query))[:limit]
+        if len(found) < limit:
+            similar = sorted((i for i in fuzzy if i not in exact), key=lambda i: (-fuzzy[i], self._order(i, query)))
+            found += similar[: limit - len(found)]
+        return [self.entries[i] for i in found]
+
+
+async def _load_catalog(db: AsyncSession) -> List[Dict[str, Any]]:
+    countries = (await db.execute(select(Country).where(Country.is_active == True))).scalars().all()
+    services = (
+        await db.execute(
+            select(Service, Country.code)
+            .join(Country, Service.country_id == Country.id)
+            .where(Service.is_active == True, Country.is_active == True)
+        )
+    ).all()
+    entries: List[Dict[str, Any]] = [
+        {"type": "country", "id": str(c.id), "title": c.name_ru, "title_en": c.name_en, "code": c.code, "flag_emoji": c.flag_emoji}
+        for c in countries
+    ]
+    entries += [
+        {
+            "type": "service",
+            "id": str(s.id),
+            "title": s.title_ru,
+            "title_en": s.title_en,
+            "country_code": code,
+            "service_type": getattr(s.service_type, "value", s.service_type),
+        }
+        for s, code in services
+    ]
+    return entries
+
+
+class CatalogHolder:
+    """Индекс справочника в памяти воркера; сверяется со снимком в кэше раз в SEARCH_CATALOG_REFRESH_SECONDS."""
+
+    def __init__(self) -> None:
+        self.index = CatalogIndex([])
+        self.rebuilds = 0
+        self._snapshot: Optional[List[Dict[str, Any]]] = None
+        self._checked_at = 0.0
+
+    async def get(self) -> CatalogIndex:
+        now = time.monotonic()
+        if self._snapshot is not None and now - self._checked_at < settings.SEARCH_CATALOG_REFRESH_SECONDS:
+            return self.index
+        try:
+            snapshot = await cache_get_or_set(
+                CATALOG_KEY,
+                with_session(_load_catalog, read=True),
+                ttl_seconds=settings.CACHE_CONTENT_TTL_SECONDS,
+                tags=[COUNTRIES_LIST, SERVICES_LIST],
+            )
+        except Exception as e:
+            if self._snapshot is None:
+                raise
+            # Справочник меняется редко: лучше прежний индекс, чем ошибка в строке поиска
+            logger.warning("Suggest catalog refresh failed, keeping %d entries: %s", len(self.index), e)
+            self._checked_at = now
+            return self.index
+        self._checked_at = now
+        if snapshot != self._snapshot:
+            self.index = CatalogIndex(snapshot)
+            self._snapshot = snapshot
+            self.rebuilds += 1
+        return self.index
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self.index), "rebuilds": self.rebuilds}
+
+
+catalog = CatalogHolder()
+
+
+async def suggest_articles(db: AsyncSession, query: str, limit: int) -> List[SuggestItem]:
+    """Опубликованные статьи, в заголовке которых есть запрос или похожее на него слово."""
+    pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    # Порог оператора <% действует до конца транзакции сессии
+    await db.execute(
+        select(func.set_config("pg_trgm.word_similarity_threshold", str(settings.SEARCH_SUGGEST_ARTICLE_SIMILARITY), True))
+    )
+    rows = await db.execute(
+        select(Article.id, Article.slug, Article.title)
+        .where(
+            Article.status == ArticleStatus.published,
+            or_(Article.title.ilike(pattern, escape="\\"), literal(query, String).bool_op("<%")(Article.title)),
+        )
+        .order_by(desc(func.word_similarity(query, Article.title)), desc(Article.views_count))
+        .limit(limit)
+    )
+    return [SuggestItem(type="article", id=r.id, title=r.title, slug=r.slug) for r in rows]
+
+
+async def suggest(db: AsyncSession, query: str, limit: int) -> List[SuggestItem]:
+    """Половина мест — справочнику, остальное — статьям; незанятые места отдаются другой группе."""
+    index = await catalog.get()
+    places = index.lookup(query, limit)
+    articles: List[SuggestItem] = []
+    if len(query) >= settings.SEARCH_SUGGEST_MIN_ARTICLE_CHARS:
+        articles = await suggest_articles(db, query, limit)
+    head = places[: max((limit + 1) // 2, limit - len(articles))]
+    items = [SuggestItem(**e) for e in head] + articles[: limit - len(head)]
+    items += [SuggestItem(**e) for e in places[len(head): len(head) + limit - len(items)]]
+    return items
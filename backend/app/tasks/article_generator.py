@@ -2,8 +2,7 @@
 Celery-задачи для автогенерации статей и SEO-оптимизации.
 - generate_article_task(country_code, article_type)
 - optimize_article_seo(article_id)
-- generate_daily_article: периодическая задача
-- setup_periodic_tasks: регистрация beat-расписания (10:00 МСК)
+- generate_daily_article: периодическая задача (расписание — beat_schedule в celery_app)
 """
 from __future__ import annotations
 
@@ -14,13 +13,11 @@ from datetime import datetime
 from typing import Any, Dict, List, Optional
 from uuid import UUID
 
-from celery.schedules import crontab
-
 from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.tasks.celery_app import celery_app
-from app.core.database import AsyncSessionLocal
+from app.core.database import BACKGROUND, session_for
 from app.core.cache import cache_get, cache_set
 from app.models.article import Article, ArticleStatus
 from app.models.country import Country
@@ -28,6 +25,8 @@ from app.models.seo_metadata import SEOMetadata, SEOEntityType
 from app.models.audit_log import AuditLog
 from app.services.openai_service import OpenAIService, OpenAIRateLimitError
 from app.services.seo_optimizer import SEOOptimizer
+from app.services.cache_invalidation import invalidate_article
+from app.services.cache_warmer import warm_after_publish
 from app.tasks.notifications import notify_admins_new_article_draft
 
 logger = logging.getLogger("tasks.article_generator")
@@ -56,7 +55,7 @@ async def _ensure_unique_slug(db: AsyncSession, base_slug: str) -> str:
 
 async def _generate_article_async(country_code: str, article_type: str) -> Dict[str, Any]:
     """Основная логика генерации статьи (async)."""
-    async with AsyncSessionLocal() as db:
+    async with session_for(BACKGROUND) as db:
         # 1. Получить данные о стране
         res = await db.execute(select(Country).where(Country.code == country_code, Country.is_active == True))
         country = res.scalars().first()
@@ -115,6 +114,11 @@ async def _generate_article_async(country_code: str, article_type: str) -> Dict[
         db.add(article)
         await db.commit()
         await db.refresh(article)
+        await invalidate_article(article.id, country.id)
+        try:
+            await warm_after_publish(article.slug, country.id)
+        except Exception as e:
+            logger.info("Cache warmup after generation failed (non-critical): %s", e)
 
         # 6. Уведомить админов для проверки (через Celery уведомление)
         try:
@@ -210,7 +214,7 @@ def generate_article_task(self, country_code: str, article_type: str) -> Dict[st
 
 
 async def _optimize_article_async(article_id: UUID) -> Dict[str, Any]:
-    async with AsyncSessionLocal() as db:
+    async with session_for(BACKGROUND) as db:
         res = await db.execute(select(Article).where(Article.id == article_id))
         article = res.scalars().first()
         if not article:
@@ -227,6 +231,7 @@ async def _optimize_article_async(article_id: UUID) -> Dict[str, Any]:
         article.content = OpenAIService().add_internal_links(article.content, related_articles)
         await db.commit()
         await db.refresh(article)
+        await invalidate_article(article.id, article.country_id)
 
         # Обновить SEOMetadata
         meta_title = (article.seo_title or article.title)[:255]
@@ -299,7 +304,7 @@ def optimize_article_seo(self, article_id: str) -> Dict[str, Any]:
 def generate_daily_article() -> Dict[str, Any]:
     """Выбирает случайную активную страну и генерирует обзорную статью."""
     async def _pick_country_code() -> Optional[str]:
-        async with AsyncSessionLocal() as db:
+        async with session_for(BACKGROUND) as db:
             res = await db.execute(select(Country.code).where(Country.is_active == True).order_by(func.random()).limit(1))
             row = res.first()
             return row[0] if row else None
@@ -311,13 +316,3 @@ def generate_daily_article() -> Dict[str, Any]:
 
     result = generate_article_task.delay(code, "country_overview").get(timeout=120)
     return {"ok": True, "article": result}
-
-
-@celery_app.on_after_configure.connect
-def setup_periodic_tasks(sender, **kwargs):
-    # Генерация 1 статьи каждый день в 10:00 МСК
-    sender.add_periodic_task(
-        crontab(hour=10, minute=0),
-        generate_daily_article.s(),
-        name="daily_article_generation",
-    )
\ No newline at end of file
@@ -1,9 +1,16 @@
 """
-Конфигурация Celery: Redis broker/backend, retry и таймауты. Beat настраивается в задачах.
+Конфигурация Celery: Redis broker/backend, retry, таймауты и расписание beat.
+
+Модули задач подключаются через include: их импортирует воркер при старте, а процесс API,
+который только ставит задачи по имени (app.tasks.dispatch), их не загружает.
 """
 from celery import Celery
+from celery.schedules import crontab
+from celery.signals import after_setup_logger, after_setup_task_logger, before_task_publish, task_postrun, task_prerun
 
 from app.core.config import settings
+from app.core.metrics import ensure_sync_publisher, process_metrics
+from app.core.request_context import RequestIdFilter, get_request_id, request_id_var
 
 # Используем единый Redis для брокера и результата
 redis_url = settings.effective_redis_url
@@ -12,6 +19,7 @@ celery_app = Celery(
     "asia_trans_cargo",
     broker=redis_url,
     backend=redis_url,
+    include=["app.tasks.article_generator", "app.tasks.notifications"],
 )
 
 # Базовая конфигурация задач и воркера
@@ -24,9 +32,72 @@ celery_app.conf.update(
     task_default_retry_delay=10,  # секунды
     task_soft_time_limit=180,     # секунды (мягкий таймаут)
     task_time_limit=200,          # секунды (жесткий таймаут)
-    broker_transport_options={"visibility_timeout": 3600},
+    # Брокер читает очередь блокирующим BRPOP, поэтому socket-таймаут у него свой, длиннее общего
+    broker_transport_options={
+        "visibility_timeout": 3600,
+        "socket_timeout": settings.CELERY_REDIS_SOCKET_TIMEOUT_SECONDS,
+        "socket_connect_timeout": settings.REDIS_CONNECT_TIMEOUT_SECONDS,
+        "max_connections": settings.REDIS_MAX_CONNECTIONS,
+    },
+    redis_socket_timeout=settings.CELERY_REDIS_SOCKET_TIMEOUT_SECONDS,
+    redis_socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT_SECONDS,
+    redis_max_connections=settings.REDIS_MAX_CONNECTIONS,
+    # .delay() из API не должен висеть на недоступном брокере: несколько быстрых попыток и ошибка
+    task_publish_retry_policy={"max_retries": 2, "interval_start": 0, "interval_step": 0.2, "interval_max": 0.5},
+    # request id запроса, поставившего задачу, — в каждой строке лога воркера
+    worker_log_format="[%(asctime)s: %(levelname)s/%(processName)s] [%(request_id)s] %(message)s",
+    worker_task_log_format=(
+        "[%(asctime)s: %(levelname)s/%(processName)s] [%(request_id)s] %(task_name)s[%(task_id)s]: %(message)s"
+    ),
+    # По имени задачи: beat не импортирует модули задач
+    beat_schedule={
+        # Генерация 1 статьи каждый день в 10:00 МСК
+        "daily_article_generation": {
+            "task": "generate_daily_article",
+            "schedule": crontab(hour=10, minute=0),
+        },
+    },
 )
 
-# Импорт задач, чтобы Celery их видел
-import app.tasks.article_generator  # noqa: F401
-import app.tasks.notifications  # noqa: F401
\ No newline at end of file
+
+# --------- request id: API -> сообщение задачи -> логи и аудит воркера ---------
+@before_task_publish.connect
+def propagate_request_id(headers=None, **kwargs) -> None:
+    request_id = get_request_id()
+    if request_id and headers is not None:
+        headers.setdefault("request_id", request_id)
+
+
+@task_prerun.connect
+def restore_request_id(task=None, **kwargs) -> None:
+    # Задачи по расписанию (beat) приходят без id запроса — тогда используется id задачи
+    request_id_var.set(getattr(task.request, "request_id", None) or task.request.id)
+
+
+@task_postrun.connect
+def clear_request_id(**kwargs) -> None:
+    request_id_var.set(None)
+
+
+# --------- Метрики задач: снимок процесса уходит в Redis и попадает в /metrics API ---------
+@before_task_publish.connect
+def count_published(sender=None, **kwargs) -> None:
+    process_metrics.task_published(sender or "unknown")
+
+
+@task_prerun.connect
+def start_task_timer(task_id=None, **kwargs) -> None:
+    ensure_sync_publisher()
+    process_metrics.task_started(task_id)
+
+
+@task_postrun.connect
+def record_task(task_id=None, task=None, state=None, **kwargs) -> None:
+    process_metrics.task_finished(task_id, task.name, state or "UNKNOWN")
+
+
+@after_setup_logger.connect
+@after_setup_task_logger.connect
+def add_request_id_filter(logger=None, **kwargs) -> None:
+    for handler in logger.handlers:
+        handler.addFilter(RequestIdFilter())
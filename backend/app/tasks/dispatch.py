@@ -0,0 +1,30 @@
+"""
+Постановка Celery-задач из API по имени.
+
+Процесс API не импортирует модули задач: article_generator тянет за собой OpenAI SDK,
+textstat и саму Celery-обвязку задач, а нужны они только воркеру. Задача отправляется по
+имени (send_task), приложение Celery с настройками брокера (app.tasks.celery_app) импортируется
+при первой отправке. Воркер находит задачи по тем же именам (include в celery_app).
+"""
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Dict, Optional, Sequence
+
+if TYPE_CHECKING:
+    from celery.result import AsyncResult
+
+# Имена задач (name= в декораторах app.tasks.*)
+GENERATE_ARTICLE = "generate_article_task"
+NOTIFY_NEW_LEAD = "notify_admins_new_lead"
+
+
+def send_task(
+    name: str,
+    args: Optional[Sequence[Any]] = None,
+    kwargs: Optional[Dict[str, Any]] = None,
+    **options: Any,
+) -> "AsyncResult":
+    """Ставит задачу в очередь; options — как у apply_async (eta, countdown, ...)."""
+    from app.tasks.celery_app import celery_app
+
+    return celery_app.send_task(name, args=args, kwargs=kwargs, **options)
@@ -0,0 +1,68 @@
+"""
+Конфигурация gunicorn для продакшена: несколько воркеров uvicorn под одним мастером.
+
+Приложение импортируется один раз в мастере (preload_app) и наследуется воркерами через fork:
+страницы памяти с кодом общие, воркер стартует без повторного импорта. Всё, что держит
+соединения, потоки или задачи (Redis, слушатель инвалидации, публикация метрик, прогрев),
+создаётся в lifespan уже в воркере; пул SQLAlchemy, созданный при импорте, воркер сбрасывает
+в post_fork, очередь логов перезапускается в logging_setup (os.register_at_fork).
+
+Число воркеров — BACKEND_WORKERS или, если 0, число CPU, доступных контейнеру (квота cgroup,
+а не CPU хоста). При SIGTERM gunicorn перестаёт принимать соединения, даёт воркерам дообслужить
+запросы до SHUTDOWN_GRACE_SECONDS, затем lifespan дожидается фоновых задач и закрывает пулы.
+"""
+import math
+import os
+
+from app.core.config import settings
+
+
+def container_cpus() -> int:
+    """CPU, доступные контейнеру: квота cgroup v2/v1, иначе привязка процесса к ядрам."""
+    try:
+        available = len(os.sched_getaffinity(0))
+    except AttributeError:
+        available = os.cpu_count() or 1
+    quota = None
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            limit, period = f.read().split()[:2]
+        if limit != "max":
+            quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                limit_us = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period_us = int(f.read())
+            if limit_us > 0:
+                quota = limit_us / period_us
+        except (OSError, ValueError):
+            pass
+    if quota is not None:
+        available = min(available, math.ceil(quota))
+    return max(1, available)
+
+
+bind = f"0.0.0.0:{settings.BACKEND_PORT}"
+workers = settings.BACKEND_WORKERS or container_cpus()
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+
+# SIGTERM: дообслужить текущие запросы, затем lifespan закрывает ресурсы воркера
+graceful_timeout = settings.SHUTDOWN_GRACE_SECONDS
+timeout = 60
+# Простаивающее keep-alive соединение закрывает nginx, а не воркер (иначе гонка и 502)
+keepalive = 75
+
+# Access-лог пишет само приложение (RequestLoggerMiddleware)
+accesslog = None
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    # Соединения пулов, открытые в мастере при импорте, не должны использоваться двумя процессами
+    from app.core.database import all_engines
+
+    for engine in all_engines():
+        engine.sync_engine.dispose(close=False)
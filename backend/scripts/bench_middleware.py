@@ -0,0 +1,202 @@
+"""
+Сравнение пропускной способности стека middleware: BaseHTTPMiddleware (как было) и чистый ASGI.
+
+Приложение вызывается напрямую через ASGI-интерфейс, без сети и HTTP-сервера, поэтому
+разница между прогонами — это цена самих middleware. Для каждого пути сначала делается
+прогревочный запрос, затем N запросов с заданной конкурентностью. Лимит частоты на время
+замера снят.
+
+Запись кэша /api/v1/countries/ перед замером кладётся тем же путём, что и у эндпоинта
+(cached_json_response), но со списком стран из DEV_COUNTRIES_FALLBACK вместо запроса к БД:
+замеряется попадание в кэш независимо от того, что лежит в базе. Если прогревочный запрос
+ответил не X-Cache-Status: HIT, скрипт останавливается — цифра была бы не про кэш.
+
+Запуск из каталога backend с теми же переменными окружения, что и у API:
+
+    python scripts/bench_middleware.py -n 5000 -c 50
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import Request  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from starlette.middleware import Middleware  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+
+from app.api.v1.endpoints.countries import DEV_COUNTRIES_FALLBACK  # noqa: E402
+from app.core import logging_setup, middleware as asgi_middleware, rate_limit  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.core.redis_client import get_redis  # noqa: E402
+from app.core.response_cache import cached_json_response  # noqa: E402
+from app.main import app  # noqa: E402
+from app.schemas.country import CountryOut  # noqa: E402
+from app.services.cache_invalidation import COUNTRIES_LIST  # noqa: E402
+
+DEFAULT_PATHS = ["/health", "/api/v1/countries/"]
+NO_LIMIT = 10 ** 9
+
+
+async def _seed_countries() -> None:
+    async def load() -> List[CountryOut]:
+        return list(DEV_COUNTRIES_FALLBACK)
+
+    # Ключ и теги — как в list_countries
+    await cached_json_response(
+        "countries:list:active", load, List[CountryOut], ttl_seconds=settings.CACHE_CONTENT_TTL_SECONDS, tags=[COUNTRIES_LIST]
+    )
+
+
+# Пути, ответ которых замеряется как попадание в кэш: путь -> наполнение кэша перед замером
+SEEDED_PATHS: Dict[str, Callable[[], Awaitable[None]]] = {"/api/v1/countries/": _seed_countries}
+
+
+# --- Прежние реализации (BaseHTTPMiddleware), только для сравнения ---
+class LegacyRateLimitMiddleware(BaseHTTPMiddleware):
+    def __init__(self, app: Any, limit_per_minute: int):
+        super().__init__(app)
+        self.limit = limit_per_minute
+        self._mem: Dict[str, int] = {}
+
+    async def dispatch(self, request: Request, call_next):
+        ip = request.headers.get("x-forwarded-for") or (request.client.host if request.client else "unknown")
+        key = f"rl:{ip}:{int(time.time() // 60)}"
+        r = get_redis()
+        try:
+            if r is None:
+                raise RuntimeError("no redis")
+            count = await r.incr(key)
+            if count == 1:
+                await r.expire(key, 60)
+        except Exception:
+            count = self._mem.get(key, 0) + 1
+            self._mem[key] = count
+        if count > self.limit:
+            return JSONResponse(status_code=429, content={"detail": "Too Many Requests"})
+        return await call_next(request)
+
+
+class LegacyRequestLoggerMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        start = time.time()
+        ip = request.headers.get("x-forwarded-for") or (request.client.host if request.client else "unknown")
+        response = await call_next(request)
+        duration_ms = int((time.time() - start) * 1000)
+        print(f"{ip} {request.method} {request.url.path} -> {response.status_code} in {duration_ms}ms")
+        return response
+
+
+VARIANTS = {
+    "base_http": (LegacyRateLimitMiddleware, LegacyRequestLoggerMiddleware),
+    "pure_asgi": (asgi_middleware.RateLimitMiddleware, asgi_middleware.RequestLoggerMiddleware),
+}
+
+
+def use_variant(name: str) -> None:
+    """Подменяет оба middleware в стеке приложения и пересобирает его."""
+    rate_cls, logger_cls = VARIANTS[name]
+    rate_kwargs = {"limit_per_minute": NO_LIMIT} if rate_cls is LegacyRateLimitMiddleware else {}
+    stack: List[Middleware] = []
+    for m in app.user_middleware:
+        if m.cls in (asgi_middleware.RateLimitMiddleware, LegacyRateLimitMiddleware):
+            stack.append(Middleware(rate_cls, **rate_kwargs))
+        elif m.cls in (asgi_middleware.RequestLoggerMiddleware, LegacyRequestLoggerMiddleware):
+            stack.append(Middleware(logger_cls))
+        else:
+            stack.append(m)
+    app.user_middleware = stack
+    app.middleware_stack = app.build_middleware_stack()
+
+
+async def request(path: str) -> Tuple[int, Dict[str, str]]:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench"), (b"accept-encoding", b"gzip, br")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+    start: Dict[str, Any] = {}
+
+    async def receive() -> Dict[str, Any]:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Dict[str, Any]) -> None:
+        if message["type"] == "http.response.start":
+            start.update(message)
+
+    await app(scope, receive, send)
+    headers = {k.decode(): v.decode() for k, v in start.get("headers", [])}
+    return start.get("status", 0), headers
+
+
+async def measure(path: str, total: int, concurrency: int) -> float:
+    remaining = total
+
+    async def worker() -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            await request(path)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return total / (time.perf_counter() - started)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--requests", type=int, default=3000, help="запросов на путь и вариант")
+    parser.add_argument("-c", "--concurrency", type=int, default=20)
+    parser.add_argument("-r", "--rounds", type=int, default=3, help="повторов; берётся лучший результат")
+    parser.add_argument("paths", nargs="*", default=DEFAULT_PATHS)
+    args = parser.parse_args()
+    for policy in list(rate_limit.POLICIES.values()):
+        rate_limit.POLICIES[policy.name] = rate_limit.RatePolicy(policy.name, NO_LIMIT)
+
+    results: Dict[Tuple[str, str], float] = {}
+    # Журнал запросов (print прежней версии и поток записи логов новой) уходит в буфер, а не в терминал
+    sink = io.StringIO()
+    if logging_setup._listener is not None:
+        for handler in logging_setup._listener.handlers:
+            handler.setStream(sink)
+    with contextlib.redirect_stdout(sink):
+        for path in args.paths:
+            for variant in VARIANTS:
+                use_variant(variant)
+                if path in SEEDED_PATHS:
+                    await SEEDED_PATHS[path]()
+                status, headers = await request(path)
+                cache = headers.get("x-cache-status", "-")
+                sys.stderr.write(f"{variant:<10} {path}: warm-up {status}, X-Cache-Status {cache}\n")
+                if path in SEEDED_PATHS and (status != 200 or cache != "HIT"):
+                    raise SystemExit(f"{path}: warm-up is not a cache hit ({status}, X-Cache-Status {cache})")
+                best = 0.0
+                for _ in range(args.rounds):
+                    best = max(best, await measure(path, args.requests, args.concurrency))
+                results[(path, variant)] = best
+
+    print(f"{'path':<24} {'base_http rps':>14} {'pure_asgi rps':>14} {'speedup':>8}")
+    for path in args.paths:
+        before, after = results[(path, "base_http")], results[(path, "pure_asgi")]
+        print(f"{path:<24} {before:>14.0f} {after:>14.0f} {after / before:>7.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
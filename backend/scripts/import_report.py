@@ -0,0 +1,108 @@
+"""
+Время импорта и память процесса API: отчёт `python -X importtime` по `import app.main`.
+
+Импорт выполняется в отдельном чистом процессе. В отчёте — суммарное время импорта,
+самые дорогие пакеты верхнего уровня (собственное время всех их модулей) и RSS процесса
+после импорта (столько весит воркер uvicorn до первого запроса). Скрипт завершается с кодом 1,
+если превышен бюджет времени или памяти либо в процесс API попал модуль из FORBIDDEN —
+их должен загружать только воркер Celery (задачи ставятся по имени, app.tasks.dispatch).
+
+Запуск из каталога backend с теми же переменными окружения, что и у API:
+
+    python scripts/import_report.py --budget-ms 2000 --rss-budget-mb 120
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Модули, которым не место в процессе API
+FORBIDDEN = (
+    "celery",
+    "kombu",
+    "openai",
+    "textstat",
+    "pyotp",
+    "app.tasks.celery_app",
+    "app.tasks.article_generator",
+    "app.services.openai_service",
+)
+
+_PROBE = """
+import sys
+import app.main
+rss_kb = 0
+try:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                rss_kb = int(line.split()[1])
+except OSError:
+    import resource
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(rss_kb)
+print(",".join(m for m in sys.modules))
+"""
+
+
+def run_probe() -> Tuple[List[Tuple[int, int, str]], int, List[str]]:
+    """(строки importtime: собственное мкс, накопленное мкс, модуль), RSS в КБ, загруженные модули."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    rows: List[Tuple[int, int, str]] = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(self_us), int(cumulative_us), name.strip()))
+    rss_line, modules_line = proc.stdout.strip().splitlines()[-2:]
+    return rows, int(rss_line), modules_line.split(",")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=2000.0, help="предел времени импорта app.main")
+    parser.add_argument("--rss-budget-mb", type=float, default=0.0, help="предел RSS после импорта (0 — без проверки)")
+    parser.add_argument("--top", type=int, default=15, help="сколько пакетов показать")
+    args = parser.parse_args()
+
+    rows, rss_kb, modules = run_probe()
+    total_ms = next((cum for _, cum, name in rows if name == "app.main"), 0) / 1000
+
+    by_package: Dict[str, int] = defaultdict(int)
+    for self_us, _, name in rows:
+        by_package[name.split(".")[0]] += self_us
+    print(f"{'package':<28} {'self ms':>9}")
+    for package, us in sorted(by_package.items(), key=lambda kv: kv[1], reverse=True)[: args.top]:
+        print(f"{package:<28} {us / 1000:>9.1f}")
+
+    rss_mb = rss_kb / 1024
+    print(f"\nimport app.main: {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms), RSS {rss_mb:.1f} MiB")
+
+    failed = False
+    loaded = sorted(m for m in FORBIDDEN if m in modules)
+    if loaded:
+        print(f"FAIL: loaded in the API process: {', '.join(loaded)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print("FAIL: import time budget exceeded")
+        failed = True
+    if args.rss_budget_mb and rss_mb > args.rss_budget_mb:
+        print("FAIL: RSS budget exceeded")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())